@@ -0,0 +1,67 @@
+#ifndef ALIAS_H
+#define ALIAS_H
+#include "Setting.h"
+#include "Random.h"
+#include <cstdlib>
+#include <vector>
+
+/*=====================================================================================
+Walker/Vose alias table: after an O(n) build, drawing from an arbitrary
+discrete distribution costs one uniform integer and one uniform real.
+The table is read-only once built, so all sampler threads share it and draw
+with their own random state.
+======================================================================================*/
+void freeAliasTable(AliasTable &table) {
+	free(table.prob);
+	free(table.alias);
+	table.prob = NULL;
+	table.alias = NULL;
+	table.size = 0;
+}
+
+void buildAliasTable(AliasTable &table, double *weight, INT size) {
+	freeAliasTable(table);
+	table.size = size;
+	table.prob = (REAL *)calloc(size, sizeof(REAL));
+	table.alias = (INT *)calloc(size, sizeof(INT));
+	double total = 0;
+	for (INT i = 0; i < size; i++)
+		total += weight[i];
+	std::vector<double> scaled(size);
+	std::vector<INT> small, large;
+	for (INT i = 0; i < size; i++) {
+		scaled[i] = weight[i] * size / total;
+		table.alias[i] = i;
+		if (scaled[i] < 1.0)
+			small.push_back(i);
+		else
+			large.push_back(i);
+	}
+	while (!small.empty() && !large.empty()) {
+		INT s = small.back(), l = large.back();
+		small.pop_back();
+		table.prob[s] = scaled[s];
+		table.alias[s] = l;
+		scaled[l] = scaled[l] + scaled[s] - 1.0;
+		if (scaled[l] < 1.0) {
+			large.pop_back();
+			small.push_back(l);
+		}
+	}
+	while (!large.empty()) {
+		table.prob[large.back()] = 1.0;
+		large.pop_back();
+	}
+	while (!small.empty()) {
+		table.prob[small.back()] = 1.0;
+		small.pop_back();
+	}
+}
+
+INT drawAlias(Handle *handle, const AliasTable &table, INT id) {
+	INT i = rand_max(handle, id, table.size);
+	REAL u = (randd(handle, id) >> 40) * (1.0 / (1ULL << 24));
+	return u < table.prob[i] ? i : table.alias[i];
+}
+
+#endif
@@ -0,0 +1,241 @@
+#ifndef APPEND_H
+#define APPEND_H
+#include "Setting.h"
+#include "Triple.h"
+#include "Hash.h"
+#include "Graph.h"
+#include "Storage.h"
+#include "Reader.h"
+#include "Dataset.h"
+#include "Random.h"
+#include <cstdlib>
+#include <cstring>
+#include <algorithm>
+
+/*=====================================================================================
+incremental training triples.
+appendTriples() adds a batch of training triples, and with them new entity and
+relation ids, to an imported or loaded dataset without re-reading or
+re-sorting it. Only the batch is sorted; every existing array is extended by
+one merge: the binary searches cost O(delta log n) and the existing entries
+are moved by sequential copies. The triple set is shifted in place instead of
+rehashed, and the pair counts behind the Bernoulli statistics are updated for
+the relations of the batch only. The next sampling call sees the new triples.
+appendTriples must not run while another thread samples or tests the handle.
+The added triples are also kept as the recent triples: setRecentBias() makes
+the next batches draw a share of their positives from them, so training on a
+grown graph catches up on the new facts first.
+======================================================================================*/
+
+/*
+	the next steps sampled batches draw ratio of their positives uniformly from
+	the recent triples instead of the training order. Once those batches are
+	sampled, the next appendTriples starts a new set of recent triples.
+*/
+extern "C"
+void setRecentBias(Handle *handle, REAL ratio, INT steps) {
+	handle -> recentRatio = ratio;
+	handle -> recentUntil = handle -> batchCounter + steps;
+}
+
+extern "C"
+INT getRecentTotal(Handle *handle) {
+	return handle -> recentTotal;
+}
+
+// triple, or with probability recentRatio a recent triple while batch, the number of the batch being sampled, is in the window
+inline Triple recentPositive(Handle *handle, INT id, unsigned long long batch, Triple triple) {
+	if (handle -> recentTotal > 0 && batch < handle -> recentUntil && randd(handle, id) % 1000 < handle -> recentRatio * 1000)
+		return handle -> recentList[rand_max(handle, id, handle -> recentTotal)];
+	return triple;
+}
+
+void addRecent(Handle *handle, const Triple *list, INT total) {
+	if (handle -> batchCounter >= handle -> recentUntil)
+		handle -> recentTotal = 0;
+	handle -> recentList = (Triple *)realloc(handle -> recentList, (handle -> recentTotal + total + 1) * sizeof(Triple));
+	memcpy(handle -> recentList + handle -> recentTotal, list, total * sizeof(Triple));
+	handle -> recentTotal += total;
+}
+
+/*
+	merge extra into list, both sorted by cmp_head and disjoint, from the back
+	and in place of the grown list; pos[k] gets the index of extra[k] in the
+	returned array, which replaces list
+*/
+template <class T>
+T *mergeTriples(T *list, INT total, const T *extra, INT extraTotal, INT *pos) {
+	T *res = (T *)realloc(list, (total + extraTotal) * sizeof(T));
+	INT end = total;
+	for (INT k = extraTotal - 1; k >= 0; k--) {
+		INT at = std::lower_bound(res, res + end, extra[k], T::cmp_head) - res;
+		memmove(res + at + k + 1, res + at, (end - at) * sizeof(T));
+		res[at + k] = extra[k];
+		pos[k] = at + k;
+		end = at;
+	}
+	return res;
+}
+
+/*
+	move the slots of set to the indexes the merge gave the old triples and add
+	the triples at pos; set.list or set.compactList already holds the merged list
+*/
+template <class T>
+void shiftTripleSet(TripleSet &set, const T *list, INT total, const INT *pos, INT extraTotal) {
+	if ((unsigned long long)total * 2 > set.mask + 1) {
+		free(set.slots);
+		fillTripleSet(set, list, total);
+		return;
+	}
+	// the old triple i was preceded by every new triple k with pos[k] - k <= i
+	INT *before = (INT *)malloc((extraTotal + 1) * sizeof(INT));
+	for (INT k = 0; k < extraTotal; k++)
+		before[k] = pos[k] - k;
+	for (unsigned long long slot = 0; slot <= set.mask; slot++)
+		if (set.slots[slot] != EMPTY_SLOT)
+			set.slots[slot] += std::upper_bound(before, before + extraTotal, (INT)set.slots[slot]) - before;
+	free(before);
+	for (INT k = 0; k < extraTotal; k++) {
+		const T &cur = list[pos[k]];
+		unsigned long long slot = tripleHash(cur.h, cur.r, cur.t) & set.mask;
+		while (set.slots[slot] != EMPTY_SLOT)
+			slot = (slot + 1) & set.mask;
+		set.slots[slot] = pos[k];
+	}
+}
+
+template <class T>
+void growArray(T *&array, INT total, INT size, int fill) {
+	if (array == NULL || size <= total) return;
+	array = (T *)realloc(array, size * sizeof(T));
+	memset(array + total, fill, (size - total) * sizeof(T));
+}
+
+// the per-entity and per-relation arrays for entityTotal and relationTotal ids
+void growIds(Handle *handle, INT entityTotal, INT relationTotal) {
+	INT E = handle -> entityTotal, R = handle -> relationTotal;
+	growArray(handle -> freqEnt, E, entityTotal, 0);
+	growArray(handle -> freqRel, R, relationTotal, 0);
+	growArray(handle -> headPairTotal, R, relationTotal, 0);
+	growArray(handle -> tailPairTotal, R, relationTotal, 0);
+	growArray(handle -> left_mean, R, relationTotal, 0);
+	growArray(handle -> right_mean, R, relationTotal, 0);
+	growArray(handle -> bern_prob, R, relationTotal, 0);
+	growArray(handle -> testLef, R, relationTotal, -1);
+	growArray(handle -> testRig, R, relationTotal, -1);
+	growArray(handle -> validLef, R, relationTotal, -1);
+	growArray(handle -> validRig, R, relationTotal, -1);
+	growArray(handle -> head_lef, R, relationTotal, 0);
+	growArray(handle -> head_rig, R, relationTotal, 0);
+	growArray(handle -> tail_lef, R, relationTotal, 0);
+	growArray(handle -> tail_rig, R, relationTotal, 0);
+	for (INT r = R; r < relationTotal; r++)
+		bernStatistics(handle, r);
+	if (relationTotal > R && handle -> hardCache.keys != NULL) {
+		// hard cache keys are packed with relationTotal
+		pthread_rwlock_wrlock(&handle -> hardCache.lock);
+		memset(handle -> hardCache.keys, 0xff, handle -> hardCache.slotTotal * sizeof(unsigned long long));
+		memset(handle -> hardCache.counts, 0, handle -> hardCache.slotTotal * sizeof(INT));
+		pthread_rwlock_unlock(&handle -> hardCache.lock);
+	}
+	handle -> entityTotal = entityTotal;
+	handle -> relationTotal = relationTotal;
+}
+
+// index = index merged with list over entityTotal rows
+template <class T>
+void mergeInto(CsrIndex &index, INT rows, const T *list, INT total, INT (*row)(const T &), INT (*key)(const T &), INT (*value)(const T &)) {
+	if (index.rowOffset == NULL) return;
+	CsrIndex merged;
+	mergeCsrIndex(merged, index, rows, list, total, row, key, value);
+	free(index.rowOffset);
+	free(index.pairKey);
+	free(index.pairOffset);
+	free(index.neighbor);
+	index = merged;
+}
+
+/*
+	add the total triples (h[i], r[i], t[i]) to the training triples. The
+	entity and relation totals grow to entityTotal and relationTotal, or past
+	the largest id of the batch. Triples already known for training are
+	skipped. Returns the number of triples added, or -1 if the training
+	triples have not been imported or an id is negative.
+*/
+extern "C"
+INT appendTriples(Handle *handle, INT *h, INT *t, INT *r, INT total, INT entityTotal, INT relationTotal) {
+	if (handle -> headIndex.rowOffset == NULL) {
+		printf("Triples can only be appended to imported training triples.\n");
+		return -1;
+	}
+	INT E = std::max(handle -> entityTotal, entityTotal), R = std::max(handle -> relationTotal, relationTotal);
+	for (INT i = 0; i < total; i++) {
+		if (h[i] < 0 || t[i] < 0 || r[i] < 0) return -1;
+		E = std::max(E, std::max(h[i], t[i]) + 1);
+		R = std::max(R, r[i] + 1);
+	}
+	detachDataset(handle);
+	growIds(handle, E, R);
+
+	// the batch, sorted and without the triples already known
+	Triple *extra = (Triple *)calloc(total + 1, sizeof(Triple));
+	for (INT i = 0; i < total; i++) {
+		extra[i].h = h[i];
+		extra[i].r = r[i];
+		extra[i].t = t[i];
+	}
+	std::sort(extra, extra + total, Triple::cmp_head);
+	INT extraTotal = 0;
+	for (INT i = 0; i < total; i++) {
+		if (i > 0 && extra[i].h == extra[i - 1].h && extra[i].r == extra[i - 1].r && extra[i].t == extra[i - 1].t) continue;
+		if (containsTriple(handle -> trainSet, extra[i].h, extra[i].r, extra[i].t)) continue;
+		extra[extraTotal++] = extra[i];
+	}
+
+	addRecent(handle, extra, extraTotal);
+	INT lef, rig;
+	for (INT k = 0; k < extraTotal; k++) {
+		handle -> freqEnt[extra[k].h]++;
+		handle -> freqEnt[extra[k].t]++;
+		handle -> freqRel[extra[k].r]++;
+		if ((k == 0 || extra[k].h != extra[k - 1].h || extra[k].r != extra[k - 1].r) && !findEdges(handle -> headIndex, extra[k].h, extra[k].r, lef, rig))
+			handle -> headPairTotal[extra[k].r]++;
+	}
+	mergeInto(handle -> headIndex, E, extra, extraTotal, tripleHead<Triple>, tripleRel<Triple>, tripleTail<Triple>);
+	mergeInto(handle -> knownIndex, E, extra, extraTotal, tripleHead<Triple>, tripleRel<Triple>, tripleTail<Triple>);
+
+	INT *pos = (INT *)calloc(extraTotal + 1, sizeof(INT));
+	if (handle -> compact) {
+		CompactTriple *compactExtra = compactCopy(extra, extraTotal);
+		handle -> compactTrain = mergeTriples(handle -> compactTrain, handle -> trainTotal, compactExtra, extraTotal, pos);
+		handle -> trainSet.compactList = handle -> compactTrain;
+		shiftTripleSet(handle -> trainSet, handle -> compactTrain, handle -> trainTotal + extraTotal, pos, extraTotal);
+		free(compactExtra);
+	} else {
+		handle -> trainHead = handle -> trainList = mergeTriples(handle -> trainList, handle -> trainTotal, extra, extraTotal, pos);
+		handle -> trainSet.list = handle -> trainList;
+		shiftTripleSet(handle -> trainSet, handle -> trainList, handle -> trainTotal + extraTotal, pos, extraTotal);
+	}
+	free(pos);
+
+	std::sort(extra, extra + extraTotal, Triple::cmp_tail);
+	for (INT k = 0; k < extraTotal; k++)
+		if ((k == 0 || extra[k].t != extra[k - 1].t || extra[k].r != extra[k - 1].r) && !findEdges(handle -> tailIndex, extra[k].t, extra[k].r, lef, rig))
+			handle -> tailPairTotal[extra[k].r]++;
+	mergeInto(handle -> tailIndex, E, extra, extraTotal, tripleTail<Triple>, tripleRel<Triple>, tripleHead<Triple>);
+	mergeInto(handle -> knownTailIndex, E, extra, extraTotal, tripleTail<Triple>, tripleRel<Triple>, tripleHead<Triple>);
+	std::sort(extra, extra + extraTotal, Triple::cmp_rel);
+	mergeInto(handle -> relIndex, E, extra, extraTotal, tripleHead<Triple>, tripleTail<Triple>, tripleRel<Triple>);
+
+	for (INT k = 0; k < extraTotal; k++)
+		bernStatistics(handle, extra[k].r);
+	free(extra);
+	handle -> trainTotal += extraTotal;
+	handle -> tripleTotal += extraTotal;
+	if (handle -> negMode == 1)
+		buildNegTable(handle);
+	return extraTotal;
+}
+
+#endif
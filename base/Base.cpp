@@ -2,50 +2,22 @@
 #include "Random.h"
 #include "Reader.h"
 #include "Corrupt.h"
+#include "Order.h"
 #include "Test.h"
+#include "Dataset.h"
+#include "Ingest.h"
+#include "Append.h"
 #include <cstdlib>
 #include <pthread.h>
 
 extern "C"
-void setInPath(char *path);
+Handle* createHandle();
 
 extern "C"
-void setOutPath(char *path);
-
-extern "C"
-void setWorkThreads(INT threads);
-
-extern "C"
-void setBern(INT con);
-
-extern "C"
-INT getWorkThreads();
-
-extern "C"
-INT getEntityTotal();
-
-extern "C"
-INT getRelationTotal();
-
-extern "C"
-INT getTripleTotal();
-
-extern "C"
-INT getTrainTotal();
-
-extern "C"
-INT getTestTotal();
-
-extern "C"
-INT getValidTotal();
-
-extern "C"
-void randReset();
-
-extern "C"
-void importTrainFiles();
+void destroyHandle(Handle *handle);
 
 struct Parameter {
+	Handle *handle;
 	INT id;
 	INT *batch_h;
 	INT *batch_t;
@@ -54,83 +26,257 @@ struct Parameter {
 	INT batchSize;
 	INT negRate;
 	INT negRelRate;
+	INT nbatches;
+	unsigned long long stream;
 };
 
 void* getBatch(void* con) {
 	Parameter *para = (Parameter *)(con);
+	Handle *handle = para -> handle;
 	INT id = para -> id;
-	INT *batch_h = para -> batch_h;
-	INT *batch_t = para -> batch_t;
-	INT *batch_r = para -> batch_r;
-	REAL *batch_y = para -> batch_y;
 	INT batchSize = para -> batchSize;
 	INT negRate = para -> negRate;
 	INT negRelRate = para -> negRelRate;
+	INT batchSeqSize = batchSize * (1 + negRate + negRelRate);
 	INT lef, rig;
-	if (batchSize % workThreads == 0) {
-		lef = id * (batchSize / workThreads);
-		rig = (id + 1) * (batchSize / workThreads);
+	if (handle -> sampleMode != 0) {
+		orderSlots(handle, id, batchSize, lef, rig);
+	} else if (batchSize % handle -> workThreads == 0) {
+		lef = id * (batchSize / handle -> workThreads);
+		rig = (id + 1) * (batchSize / handle -> workThreads);
 	} else {
-		lef = id * (batchSize / workThreads + 1);
-		rig = (id + 1) * (batchSize / workThreads + 1);
+		lef = id * (batchSize / handle -> workThreads + 1);
+		rig = (id + 1) * (batchSize / handle -> workThreads + 1);
 		if (rig > batchSize) rig = batchSize;
 	}
+	INT *positives = NULL;
+	if (handle -> sampleMode != 0 && lef < rig)
+		positives = (INT *)calloc(rig - lef, sizeof(INT));
 	REAL prob = 500;
-	for (INT batch = lef; batch < rig; batch++) {
-		INT i = rand_max(id, trainTotal);
-		batch_h[batch] = trainList[i].h;
-		batch_t[batch] = trainList[i].t;
-		batch_r[batch] = trainList[i].r;
-		batch_y[batch] = 1;
-		INT last = batchSize;
-		for (INT times = 0; times < negRate; times ++) {
-			if (bernFlag)
-				prob = 1000 * right_mean[trainList[i].r] / (right_mean[trainList[i].r] + left_mean[trainList[i].r]);
-			if (randd(id) % 1000 < prob) {
-				batch_h[batch + last] = trainList[i].h;
-				batch_t[batch + last] = corrupt_head(id, trainList[i].h, trainList[i].r);
-				batch_r[batch + last] = trainList[i].r;
-			} else {
-				batch_h[batch + last] = corrupt_tail(id, trainList[i].t, trainList[i].r);;
-				batch_t[batch + last] = trainList[i].t;
-				batch_r[batch + last] = trainList[i].r;
+	for (INT step = 0; step < para -> nbatches; step++) {
+		INT *batch_h = para -> batch_h + step * batchSeqSize;
+		INT *batch_t = para -> batch_t + step * batchSeqSize;
+		INT *batch_r = para -> batch_r + step * batchSeqSize;
+		REAL *batch_y = para -> batch_y + step * batchSeqSize;
+		if (positives != NULL)
+			nextPositives(handle, id, para -> stream + step, lef, rig, batchSize, positives);
+		for (INT batch = lef; batch < rig; batch++) {
+			randSeek(handle, id, para -> stream + step, batch);
+			INT i = positives == NULL ? rand_max(handle, id, handle -> trainTotal) : positives[batch - lef];
+			Triple triple = recentPositive(handle, id, para -> stream + step, trainTriple(handle, i));
+			batch_h[batch] = triple.h;
+			batch_t[batch] = triple.t;
+			batch_r[batch] = triple.r;
+			batch_y[batch] = 1;
+			INT last = batchSize;
+			if (handle -> bernFlag)
+				prob = handle -> bern_prob[triple.r];
+			for (INT times = 0; times < negRate; times ++) {
+				if (randd(handle, id) % 1000 < prob) {
+					batch_h[batch + last] = triple.h;
+					batch_t[batch + last] = sample_tail(handle, id, triple.h, triple.r);
+					batch_r[batch + last] = triple.r;
+				} else {
+					batch_h[batch + last] = sample_head(handle, id, triple.t, triple.r);
+					batch_t[batch + last] = triple.t;
+					batch_r[batch + last] = triple.r;
+				}
+				batch_y[batch + last] = -1;
+				last += batchSize;
+			}
+			for (INT times = 0; times < negRelRate; times++) {
+				batch_h[batch + last] = triple.h;
+				batch_t[batch + last] = triple.t;
+				batch_r[batch + last] = corrupt_rel(handle, id, triple.h, triple.t);
+				batch_y[batch + last] = -1;
+				last += batchSize;
 			}
-			batch_y[batch + last] = -1;
-			last += batchSize;
 		}
-		for (INT times = 0; times < negRelRate; times++) {
-			batch_h[batch + last] = trainList[i].h;
-			batch_t[batch + last] = trainList[i].t;
-			batch_r[batch + last] = corrupt_rel(id, trainList[i].h, trainList[i].t);
-			batch_y[batch + last] = -1;
-			last += batchSize;
+	}
+	free(positives);
+	return NULL;
+}
+
+/*=====================================================================================
+persistent sampler pool: workThreads workers are created once by startSampler(),
+sleep on a condition variable between batches and are joined by stopSampler().
+======================================================================================*/
+struct SamplerPool {
+	pthread_t *threads;
+	Parameter *para;
+	INT size;
+	INT generation;
+	INT pending;
+	bool stop;
+	pthread_mutex_t lock;
+	pthread_cond_t wake;
+	pthread_cond_t done;
+};
+
+struct Worker {
+	SamplerPool *pool;
+	INT id;
+};
+
+void* samplerWorker(void* con) {
+	Worker *worker = (Worker *)(con);
+	SamplerPool *pool = worker -> pool;
+	INT id = worker -> id;
+	free(worker);
+	INT seen = 0;
+	while (1) {
+		pthread_mutex_lock(&pool -> lock);
+		while (!pool -> stop && pool -> generation == seen)
+			pthread_cond_wait(&pool -> wake, &pool -> lock);
+		if (pool -> stop) {
+			pthread_mutex_unlock(&pool -> lock);
+			break;
 		}
+		seen = pool -> generation;
+		pthread_mutex_unlock(&pool -> lock);
+		getBatch((void*)(pool -> para + id));
+		pthread_mutex_lock(&pool -> lock);
+		pool -> pending--;
+		if (pool -> pending == 0)
+			pthread_cond_signal(&pool -> done);
+		pthread_mutex_unlock(&pool -> lock);
 	}
-	pthread_exit(NULL);
+	return NULL;
+}
+
+extern "C"
+void stopSampler(Handle *handle) {
+	if (handle -> samplerPool == NULL) return;
+	SamplerPool *pool = handle -> samplerPool;
+	pthread_mutex_lock(&pool -> lock);
+	pool -> stop = true;
+	pthread_cond_broadcast(&pool -> wake);
+	pthread_mutex_unlock(&pool -> lock);
+	for (INT threads = 0; threads < pool -> size; threads++)
+		pthread_join(pool -> threads[threads], NULL);
+	pthread_mutex_destroy(&pool -> lock);
+	pthread_cond_destroy(&pool -> wake);
+	pthread_cond_destroy(&pool -> done);
+	free(pool -> threads);
+	free(pool -> para);
+	free(pool);
+	handle -> samplerPool = NULL;
 }
 
 extern "C"
-void sampling(INT *batch_h, INT *batch_t, INT *batch_r, REAL *batch_y, INT batchSize, INT negRate = 1, INT negRelRate = 0) {
-	pthread_t *pt = (pthread_t *)malloc(workThreads * sizeof(pthread_t));
-	Parameter *para = (Parameter *)malloc(workThreads * sizeof(Parameter));
-	for (INT threads = 0; threads < workThreads; threads++) {
-		para[threads].id = threads;
-		para[threads].batch_h = batch_h;
-		para[threads].batch_t = batch_t;
-		para[threads].batch_r = batch_r;
-		para[threads].batch_y = batch_y;
-		para[threads].batchSize = batchSize;
-		para[threads].negRate = negRate;
-		para[threads].negRelRate = negRelRate;
+void startSampler(Handle *handle) {
+	stopSampler(handle);
+	SamplerPool *pool = (SamplerPool *)calloc(1, sizeof(SamplerPool));
+	pool -> size = handle -> workThreads;
+	pool -> threads = (pthread_t *)malloc(handle -> workThreads * sizeof(pthread_t));
+	pool -> para = (Parameter *)calloc(handle -> workThreads, sizeof(Parameter));
+	pthread_mutex_init(&pool -> lock, NULL);
+	pthread_cond_init(&pool -> wake, NULL);
+	pthread_cond_init(&pool -> done, NULL);
+	for (INT threads = 0; threads < handle -> workThreads; threads++) {
+		Worker *worker = (Worker *)malloc(sizeof(Worker));
+		worker -> pool = pool;
+		worker -> id = threads;
+		pthread_create(&pool -> threads[threads], NULL, samplerWorker, (void*)worker);
+	}
+	handle -> samplerPool = pool;
+}
+
+extern "C"
+INT isSamplerRunning(Handle *handle) {
+	return handle -> samplerPool != NULL;
+}
+
+void setParameter(Handle *handle, Parameter *para, INT threads, INT *batch_h, INT *batch_t, INT *batch_r, REAL *batch_y, INT batchSize, INT nbatches, INT negRate, INT negRelRate) {
+	para -> handle = handle;
+	para -> id = threads;
+	para -> stream = handle -> batchCounter;
+	para -> batch_h = batch_h;
+	para -> batch_t = batch_t;
+	para -> batch_r = batch_r;
+	para -> batch_y = batch_y;
+	para -> batchSize = batchSize;
+	para -> nbatches = nbatches;
+	para -> negRate = negRate;
+	para -> negRelRate = negRelRate;
+}
+
+void poolSampling(Handle *handle, INT *batch_h, INT *batch_t, INT *batch_r, REAL *batch_y, INT batchSize, INT nbatches, INT negRate, INT negRelRate) {
+	if (handle -> samplerPool -> size != handle -> workThreads)
+		startSampler(handle);
+	prepareOrder(handle);
+	SamplerPool *pool = handle -> samplerPool;
+	pthread_mutex_lock(&pool -> lock);
+	for (INT threads = 0; threads < pool -> size; threads++)
+		setParameter(handle, pool -> para + threads, threads, batch_h, batch_t, batch_r, batch_y, batchSize, nbatches, negRate, negRelRate);
+	pool -> pending = pool -> size;
+	pool -> generation++;
+	pthread_cond_broadcast(&pool -> wake);
+	while (pool -> pending > 0)
+		pthread_cond_wait(&pool -> done, &pool -> lock);
+	pthread_mutex_unlock(&pool -> lock);
+	handle -> batchCounter += nbatches;
+}
+
+void spawnSampling(Handle *handle, INT *batch_h, INT *batch_t, INT *batch_r, REAL *batch_y, INT batchSize, INT nbatches, INT negRate, INT negRelRate) {
+	prepareOrder(handle);
+	pthread_t *pt = (pthread_t *)malloc(handle -> workThreads * sizeof(pthread_t));
+	Parameter *para = (Parameter *)malloc(handle -> workThreads * sizeof(Parameter));
+	for (INT threads = 0; threads < handle -> workThreads; threads++) {
+		setParameter(handle, para + threads, threads, batch_h, batch_t, batch_r, batch_y, batchSize, nbatches, negRate, negRelRate);
 		pthread_create(&pt[threads], NULL, getBatch, (void*)(para+threads));
 	}
-	for (INT threads = 0; threads < workThreads; threads++)
+	for (INT threads = 0; threads < handle -> workThreads; threads++)
 		pthread_join(pt[threads], NULL);
 	free(pt);
 	free(para);
+	handle -> batchCounter += nbatches;
+}
+
+extern "C"
+void sampling(Handle *handle, INT *batch_h, INT *batch_t, INT *batch_r, REAL *batch_y, INT batchSize, INT negRate = 1, INT negRelRate = 0) {
+	if (handle -> samplerPool != NULL)
+		poolSampling(handle, batch_h, batch_t, batch_r, batch_y, batchSize, 1, negRate, negRelRate);
+	else
+		spawnSampling(handle, batch_h, batch_t, batch_r, batch_y, batchSize, 1, negRate, negRelRate);
+}
+
+/*
+	fill nbatches consecutive batches in one call; batch k occupies
+	[k * batchSize * (1 + negRate + negRelRate), (k + 1) * ...) of every array
+	and has the same layout as the output of sampling().
+*/
+extern "C"
+void samplingEpoch(Handle *handle, INT *batch_h, INT *batch_t, INT *batch_r, REAL *batch_y, INT batchSize, INT nbatches, INT negRate = 1, INT negRelRate = 0) {
+	if (handle -> samplerPool != NULL)
+		poolSampling(handle, batch_h, batch_t, batch_r, batch_y, batchSize, nbatches, negRate, negRelRate);
+	else
+		spawnSampling(handle, batch_h, batch_t, batch_r, batch_y, batchSize, nbatches, negRate, negRelRate);
+}
+
+// stop the samplers and free every allocation of the handle
+extern "C"
+void destroyHandle(Handle *handle) {
+	if (handle == NULL) return;
+	stopSampler(handle);
+	stopRankPool(handle);
+	releaseDataset(handle);
+	free(handle -> next_random);
+	free(handle -> trainOrder);
+	releaseShards(handle);
+	free(handle -> recentList);
+	free(handle -> hardCache.keys);
+	free(handle -> hardCache.entities);
+	free(handle -> hardCache.counts);
+	pthread_rwlock_destroy(&handle -> hardCache.lock);
+	freeIngest(handle);
+	delete handle;
 }
 
 int main() {
-	importTrainFiles();
+	Handle *handle = createHandle();
+	importTrainFiles(handle);
+	startSampler(handle);
+	destroyHandle(handle);
 	return 0;
 }
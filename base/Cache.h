@@ -0,0 +1,135 @@
+#ifndef CACHE_H
+#define CACHE_H
+#include "Setting.h"
+#include "Random.h"
+#include "Hash.h"
+#include "Reader.h"
+#include <cstdlib>
+#include <algorithm>
+#include <vector>
+#include <pthread.h>
+
+/*=====================================================================================
+hard negative cache.
+Each slot holds up to width entities that the model scored as most plausible
+for one query: a tail query (h, r, ?) or a head query (?, r, t). Slots are
+direct-mapped by the hash of the query, so a new query evicts whatever query
+shared its slot and the cache never grows past slotTotal * width entities.
+The cache is refreshed from python (getHardCandidates + updateHardCache)
+and read by the sampler threads, which hold the read lock for one lookup at
+a time, so an update only waits for the lookups in flight.
+======================================================================================*/
+unsigned long long hardKey(INT e, INT r, INT side, INT base) {
+	return (((unsigned long long)e * base + r) << 1) | side;
+}
+
+extern "C"
+void setHardNegatives(Handle *handle, REAL ratio, INT slotTotal, INT width) {
+	pthread_rwlock_wrlock(&handle -> hardCache.lock);
+	free(handle -> hardCache.keys);
+	free(handle -> hardCache.entities);
+	free(handle -> hardCache.counts);
+	handle -> hardRatio = ratio;
+	handle -> hardCache.slotTotal = slotTotal;
+	handle -> hardCache.width = width;
+	handle -> hardCache.keys = (unsigned long long *)malloc(slotTotal * sizeof(unsigned long long));
+	handle -> hardCache.entities = (INT *)calloc(slotTotal * width, sizeof(INT));
+	handle -> hardCache.counts = (INT *)calloc(slotTotal, sizeof(INT));
+	memset(handle -> hardCache.keys, 0xff, slotTotal * sizeof(unsigned long long));
+	handle -> hardCache.lookups = handle -> hardCache.hits = handle -> hardCache.inserts = handle -> hardCache.evictions = 0;
+	pthread_rwlock_unlock(&handle -> hardCache.lock);
+}
+
+/*
+	side 0 asks for a tail of (e = h, r), side 1 for a head of (e = t, r). The
+	read lock is held for this lookup only, so updateHardCache waits for the
+	lookups in flight, not for a whole batch or epoch being sampled.
+*/
+bool lookupHard(Handle *handle, INT id, INT e, INT r, INT side, INT &res) {
+	unsigned long long k = hardKey(e, r, side, handle -> relationTotal);
+	__atomic_fetch_add(&handle -> hardCache.lookups, 1, __ATOMIC_RELAXED);
+	pthread_rwlock_rdlock(&handle -> hardCache.lock);
+	INT slot = hashMix(k) % handle -> hardCache.slotTotal;
+	bool found = handle -> hardCache.keys[slot] == k && handle -> hardCache.counts[slot] != 0;
+	if (found)
+		res = handle -> hardCache.entities[slot * handle -> hardCache.width + rand_max(handle, id, handle -> hardCache.counts[slot])];
+	pthread_rwlock_unlock(&handle -> hardCache.lock);
+	if (found)
+		__atomic_fetch_add(&handle -> hardCache.hits, 1, __ATOMIC_RELAXED);
+	return found;
+}
+
+/*
+	for every query triple i write pool tail candidates (h_i, c, r_i) followed by
+	pool head candidates (c, t_i, r_i) to rows [2 * pool * i, 2 * pool * (i + 1))
+	of ch, ct and cr.
+*/
+extern "C"
+void getHardCandidates(Handle *handle, INT *qh, INT *qt, INT *qr, INT total, INT pool, INT *ch, INT *ct, INT *cr) {
+	for (INT i = 0; i < total; i++) {
+		INT base = 2 * pool * i;
+		for (INT j = 0; j < pool; j++) {
+			ch[base + j] = qh[i];
+			ct[base + j] = rand_max(handle, handle -> mainRand, handle -> entityTotal);
+			cr[base + j] = qr[i];
+			ch[base + pool + j] = rand_max(handle, handle -> mainRand, handle -> entityTotal);
+			ct[base + pool + j] = qt[i];
+			cr[base + pool + j] = qr[i];
+		}
+	}
+}
+
+void insertHard(Handle *handle, INT e, INT r, INT side, std::vector<std::pair<REAL, INT> > &cand) {
+	unsigned long long k = hardKey(e, r, side, handle -> relationTotal);
+	INT slot = hashMix(k) % handle -> hardCache.slotTotal;
+	if (handle -> hardCache.keys[slot] != EMPTY_KEY && handle -> hardCache.keys[slot] != k)
+		handle -> hardCache.evictions++;
+	handle -> hardCache.keys[slot] = k;
+	INT width = std::min((INT)cand.size(), handle -> hardCache.width);
+	std::partial_sort(cand.begin(), cand.begin() + width, cand.end());
+	for (INT j = 0; j < width; j++)
+		handle -> hardCache.entities[slot * handle -> hardCache.width + j] = cand[j].second;
+	handle -> hardCache.counts[slot] = width;
+	handle -> hardCache.inserts++;
+}
+
+/*
+	keep the width lowest-scored (most plausible) candidates of every query;
+	score is the model output for the rows produced by getHardCandidates.
+*/
+extern "C"
+void updateHardCache(Handle *handle, INT *qh, INT *qt, INT *qr, INT total, INT pool, INT *ch, INT *ct, REAL *score) {
+	pthread_rwlock_wrlock(&handle -> hardCache.lock);
+	std::vector<std::pair<REAL, INT> > cand;
+	for (INT i = 0; i < total; i++) {
+		INT base = 2 * pool * i;
+		cand.clear();
+		for (INT j = base; j < base + pool; j++)
+			if (!containsTriple(handle -> trainSet, qh[i], qr[i], ct[j]))
+				cand.push_back(std::make_pair(score[j], ct[j]));
+		insertHard(handle, qh[i], qr[i], 0, cand);
+		cand.clear();
+		for (INT j = base + pool; j < base + 2 * pool; j++)
+			if (!containsTriple(handle -> trainSet, ch[j], qr[i], qt[i]))
+				cand.push_back(std::make_pair(score[j], ch[j]));
+		insertHard(handle, qt[i], qr[i], 1, cand);
+	}
+	pthread_rwlock_unlock(&handle -> hardCache.lock);
+}
+
+// lookups, hits, inserts, evictions, occupied slots
+extern "C"
+void getHardCacheStats(Handle *handle, INT *stats) {
+	pthread_rwlock_rdlock(&handle -> hardCache.lock);
+	INT occupied = 0;
+	for (INT i = 0; i < handle -> hardCache.slotTotal; i++)
+		if (handle -> hardCache.keys[i] != EMPTY_KEY) occupied++;
+	stats[0] = handle -> hardCache.lookups;
+	stats[1] = handle -> hardCache.hits;
+	stats[2] = handle -> hardCache.inserts;
+	stats[3] = handle -> hardCache.evictions;
+	stats[4] = occupied;
+	pthread_rwlock_unlock(&handle -> hardCache.lock);
+}
+
+#endif
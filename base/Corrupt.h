@@ -3,32 +3,29 @@
 #include "Random.h"
 #include "Triple.h"
 #include "Reader.h"
+#include "Cache.h"
 
-INT corrupt_head(INT id, INT h, INT r) {
+// below this many true answers the rank-skip search touches one or two cache lines
+#define REJECT_MIN 16
+
+INT corrupt_head(Handle *handle, INT id, INT h, INT r) {
 	INT lef, rig, mid, ll, rr;
-	lef = lefHead[h] - 1;
-	rig = rigHead[h];
-	while (lef + 1 < rig) {
-		mid = (lef + rig) >> 1;
-		if (trainHead[mid].r >= r) rig = mid; else
-		lef = mid;
-	}
-	ll = rig;
-	lef = lefHead[h];
-	rig = rigHead[h] + 1;
-	while (lef + 1 < rig) {
-		mid = (lef + rig) >> 1;
-		if (trainHead[mid].r <= r) lef = mid; else
-		rig = mid;
+	if (!findEdges(handle -> headIndex, h, r, ll, rr))
+		return rand_max(handle, id, handle -> entityTotal);
+	// hub pairs: rejection needs < 2 draws on average and no search
+	if (rr - ll >= REJECT_MIN && (rr - ll + 1) * 2 <= handle -> entityTotal) {
+		while (1) {
+			INT tmp = rand_max(handle, id, handle -> entityTotal);
+			if (!containsTriple(handle -> trainSet, h, r, tmp)) return tmp;
+		}
 	}
-	rr = lef;
-	INT tmp = rand_max(id, entityTotal - (rr - ll + 1));
-	if (tmp < trainHead[ll].t) return tmp;
-	if (tmp > trainHead[rr].t - rr + ll - 1) return tmp + rr - ll + 1;
+	INT tmp = rand_max(handle, id, handle -> entityTotal - (rr - ll + 1));
+	if (tmp < (INT)handle -> headIndex.neighbor[ll]) return tmp;
+	if (tmp > (INT)handle -> headIndex.neighbor[rr] - rr + ll - 1) return tmp + rr - ll + 1;
 	lef = ll, rig = rr + 1;
 	while (lef + 1 < rig) {
 		mid = (lef + rig) >> 1;
-		if (trainHead[mid].t - mid + ll - 1 < tmp)
+		if ((INT)handle -> headIndex.neighbor[mid] - mid + ll - 1 < tmp)
 			lef = mid;
 		else 
 			rig = mid;
@@ -36,31 +33,23 @@ INT corrupt_head(INT id, INT h, INT r) {
 	return tmp + lef - ll + 1;
 }
 
-INT corrupt_tail(INT id, INT t, INT r) {
+INT corrupt_tail(Handle *handle, INT id, INT t, INT r) {
 	INT lef, rig, mid, ll, rr;
-	lef = lefTail[t] - 1;
-	rig = rigTail[t];
-	while (lef + 1 < rig) {
-		mid = (lef + rig) >> 1;
-		if (trainTail[mid].r >= r) rig = mid; else
-		lef = mid;
-	}
-	ll = rig;
-	lef = lefTail[t];
-	rig = rigTail[t] + 1;
-	while (lef + 1 < rig) {
-		mid = (lef + rig) >> 1;
-		if (trainTail[mid].r <= r) lef = mid; else
-		rig = mid;
+	if (!findEdges(handle -> tailIndex, t, r, ll, rr))
+		return rand_max(handle, id, handle -> entityTotal);
+	if (rr - ll >= REJECT_MIN && (rr - ll + 1) * 2 <= handle -> entityTotal) {
+		while (1) {
+			INT tmp = rand_max(handle, id, handle -> entityTotal);
+			if (!containsTriple(handle -> trainSet, tmp, r, t)) return tmp;
+		}
 	}
-	rr = lef;
-	INT tmp = rand_max(id, entityTotal - (rr - ll + 1));
-	if (tmp < trainTail[ll].h) return tmp;
-	if (tmp > trainTail[rr].h - rr + ll - 1) return tmp + rr - ll + 1;
+	INT tmp = rand_max(handle, id, handle -> entityTotal - (rr - ll + 1));
+	if (tmp < (INT)handle -> tailIndex.neighbor[ll]) return tmp;
+	if (tmp > (INT)handle -> tailIndex.neighbor[rr] - rr + ll - 1) return tmp + rr - ll + 1;
 	lef = ll, rig = rr + 1;
 	while (lef + 1 < rig) {
 		mid = (lef + rig) >> 1;
-		if (trainTail[mid].h - mid + ll - 1 < tmp)
+		if ((INT)handle -> tailIndex.neighbor[mid] - mid + ll - 1 < tmp)
 			lef = mid;
 		else 
 			rig = mid;
@@ -69,31 +58,23 @@ INT corrupt_tail(INT id, INT t, INT r) {
 }
 
 
-INT corrupt_rel(INT id, INT h, INT t) {
+INT corrupt_rel(Handle *handle, INT id, INT h, INT t) {
 	INT lef, rig, mid, ll, rr;
-	lef = lefRel[h] - 1;
-	rig = rigRel[h];
-	while (lef + 1 < rig) {
-		mid = (lef + rig) >> 1;
-		if (trainRel[mid].t >= t) rig = mid; else
-		lef = mid;
-	}
-	ll = rig;
-	lef = lefRel[h];
-	rig = rigRel[h] + 1;
-	while (lef + 1 < rig) {
-		mid = (lef + rig) >> 1;
-		if (trainRel[mid].t <= t) lef = mid; else
-		rig = mid;
+	if (!findEdges(handle -> relIndex, h, t, ll, rr))
+		return rand_max(handle, id, handle -> relationTotal);
+	if (rr - ll >= REJECT_MIN && (rr - ll + 1) * 2 <= handle -> relationTotal) {
+		while (1) {
+			INT tmp = rand_max(handle, id, handle -> relationTotal);
+			if (!containsTriple(handle -> trainSet, h, tmp, t)) return tmp;
+		}
 	}
-	rr = lef;
-	INT tmp = rand_max(id, relationTotal - (rr - ll + 1));
-	if (tmp < trainRel[ll].r) return tmp;
-	if (tmp > trainRel[rr].r - rr + ll - 1) return tmp + rr - ll + 1;
+	INT tmp = rand_max(handle, id, handle -> relationTotal - (rr - ll + 1));
+	if (tmp < (INT)handle -> relIndex.neighbor[ll]) return tmp;
+	if (tmp > (INT)handle -> relIndex.neighbor[rr] - rr + ll - 1) return tmp + rr - ll + 1;
 	lef = ll, rig = rr + 1;
 	while (lef + 1 < rig) {
 		mid = (lef + rig) >> 1;
-		if (trainRel[mid].r - mid + ll - 1 < tmp)
+		if ((INT)handle -> relIndex.neighbor[mid] - mid + ll - 1 < tmp)
 			lef = mid;
 		else 
 			rig = mid;
@@ -101,35 +82,71 @@ INT corrupt_rel(INT id, INT h, INT t) {
 	return tmp + lef - ll + 1;
 }
 
+// attempts at a weighted or type-constrained draw before falling back to the uniform corruption
+#define NEG_TRIES 64
+
+// typeRatio is the share of entity negatives drawn from the relation's type constraint set
+extern "C"
+void setTypeConstrain(Handle *handle, REAL ratio) {
+	handle -> typeRatio = ratio;
+}
+
+// negative tail for the positive (h, r, ?) under the training distribution
+INT sample_tail(Handle *handle, INT id, INT h, INT r) {
+	INT t;
+	if (handle -> hardRatio > 0 && randd(handle, id) % 1000 < handle -> hardRatio * 1000)
+		if (lookupHard(handle, id, h, r, 0, t) && !containsTriple(handle -> trainSet, h, r, t)) return t;
+	if (handle -> typeRatio > 0 && randd(handle, id) % 1000 < handle -> typeRatio * 1000 && handle -> tail_lef[r] < handle -> tail_rig[r])
+		for (INT loop = 0; loop < NEG_TRIES; loop++) {
+			t = handle -> tail_type[handle -> tail_lef[r] + rand_max(handle, id, handle -> tail_rig[r] - handle -> tail_lef[r])];
+			if (!containsTriple(handle -> trainSet, h, r, t)) return t;
+		}
+	if (handle -> negMode == 1)
+		for (INT loop = 0; loop < NEG_TRIES; loop++) {
+			t = drawAlias(handle, handle -> entityAlias, id);
+			if (!containsTriple(handle -> trainSet, h, r, t)) return t;
+		}
+	return corrupt_head(handle, id, h, r);
+}
+
+// negative head for the positive (?, r, t) under the training distribution
+INT sample_head(Handle *handle, INT id, INT t, INT r) {
+	INT h;
+	if (handle -> hardRatio > 0 && randd(handle, id) % 1000 < handle -> hardRatio * 1000)
+		if (lookupHard(handle, id, t, r, 1, h) && !containsTriple(handle -> trainSet, h, r, t)) return h;
+	if (handle -> typeRatio > 0 && randd(handle, id) % 1000 < handle -> typeRatio * 1000 && handle -> head_lef[r] < handle -> head_rig[r])
+		for (INT loop = 0; loop < NEG_TRIES; loop++) {
+			h = handle -> head_type[handle -> head_lef[r] + rand_max(handle, id, handle -> head_rig[r] - handle -> head_lef[r])];
+			if (!containsTriple(handle -> trainSet, h, r, t)) return h;
+		}
+	if (handle -> negMode == 1)
+		for (INT loop = 0; loop < NEG_TRIES; loop++) {
+			h = drawAlias(handle, handle -> entityAlias, id);
+			if (!containsTriple(handle -> trainSet, h, r, t)) return h;
+		}
+	return corrupt_tail(handle, id, t, r);
+}
 
-bool _find(INT h, INT t, INT r) {
-    INT lef = 0;
-    INT rig = tripleTotal - 1;
-    INT mid;
-    while (lef + 1 < rig) {
-        INT mid = (lef + rig) >> 1;
-        if ((tripleList[mid]. h < h) || (tripleList[mid]. h == h && tripleList[mid]. r < r) || (tripleList[mid]. h == h && tripleList[mid]. r == r && tripleList[mid]. t < t)) lef = mid; else rig = mid;
-    }
-    if (tripleList[lef].h == h && tripleList[lef].r == r && tripleList[lef].t == t) return true;
-    if (tripleList[rig].h == h && tripleList[rig].r == r && tripleList[rig].t == t) return true;
-    return false;
+// true if (h, r, t) is a train, valid or test triple
+bool _find(Handle *handle, INT h, INT t, INT r) {
+	return containsEdge(handle -> knownIndex, h, r, t);
 }
 
-INT corrupt(INT h, INT r){
-	INT ll = tail_lef[r];
-	INT rr = tail_rig[r];
+INT corrupt(Handle *handle, INT h, INT r){
+	INT ll = handle -> tail_lef[r];
+	INT rr = handle -> tail_rig[r];
 	INT loop = 0;
 	INT t;
 	while(1) {
-		t = tail_type[rand(ll, rr)];
-		if (not _find(h, t, r)) {
+		t = handle -> tail_type[ll + rand_max(handle, handle -> mainRand, rr - ll)];
+		if (not _find(handle, h, t, r)) {
 		//	printf("r:%ld\tt:%ld\n", r, t);
 			return t;
 		} else {
 			loop ++;
 			if (loop >= 1000){
 			//	printf("drop\n");
-				return corrupt_head(0, h, r);
+				return corrupt_head(handle, handle -> mainRand, h, r);
 			}
 		} 
 	}
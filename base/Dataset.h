@@ -0,0 +1,273 @@
+#ifndef DATASET_H
+#define DATASET_H
+#include "Setting.h"
+#include "Reader.h"
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <fcntl.h>
+#include <unistd.h>
+
+/*=====================================================================================
+compiled datasets.
+compileDataset() parses the text files of inPath once and writes every array
+that importTrainFiles, importTestFiles and importTypeFiles build in the current
+storage mode (the sorted triples, the bernoulli statistics, the CSR indexes,
+the triple set and the type constraints) into one binary file. loadDataset()
+maps that file and points the handle at it, so a run starts without parsing
+or sorting; the mapping is private and copy-on-write, so processes loading
+the same file share its pages until one of them writes.
+======================================================================================*/
+#define DATASET_MAGIC "OPENKEDB"
+#define DATASET_VERSION 5
+#define DATASET_ALIGN 64
+#define DATASET_SECTIONS 48
+
+struct DatasetHeader {
+	char magic[8];
+	INT version;
+	INT intSize, realSize;
+	INT relationTotal, entityTotal, tripleTotal;
+	INT trainTotal, testTotal, validTotal;
+	INT headTypeTotal, tailTypeTotal;
+	INT compact;
+	// pairs and edges of headIndex, tailIndex, relIndex, knownIndex and knownTailIndex
+	INT indexPairs[5], indexEdges[5];
+	unsigned long long setMask;
+	INT sectionTotal;
+	unsigned long long offset[DATASET_SECTIONS];
+	unsigned long long size;
+};
+
+struct Section {
+	void **data;
+	unsigned long long bytes;
+};
+
+// the arrays of a loaded dataset in file order; sizes only depend on the storage mode, the totals and the masks
+INT datasetSections(Handle *handle, Section *sections) {
+	INT total = 0;
+	unsigned long long E = handle -> entityTotal, R = handle -> relationTotal, T = handle -> trainTotal;
+	#define SECTION(field, count, type) sections[total].data = (void **)&handle -> field; sections[total].bytes = (count) * sizeof(type); total++;
+	#define CSR_SECTIONS(index) SECTION(index.rowOffset, handle -> index.rows + 1, INT) SECTION(index.pairKey, handle -> index.pairs, unsigned int) \
+		SECTION(index.pairOffset, handle -> index.pairs + 1, INT) SECTION(index.neighbor, handle -> index.edges, unsigned int)
+	if (handle -> compact) {
+		SECTION(compactTrain, T, CompactTriple)
+	} else {
+		SECTION(trainHead, T, Triple)
+	}
+	SECTION(freqRel, R, INT)
+	SECTION(freqEnt, E, INT)
+	SECTION(headPairTotal, R, INT)
+	SECTION(tailPairTotal, R, INT)
+	SECTION(left_mean, R, REAL)
+	SECTION(right_mean, R, REAL)
+	SECTION(bern_prob, R, REAL)
+	CSR_SECTIONS(headIndex)
+	CSR_SECTIONS(tailIndex)
+	CSR_SECTIONS(relIndex)
+	SECTION(trainSet.slots, handle -> trainSet.mask + 1, unsigned int)
+	SECTION(testList, handle -> testTotal, Triple)
+	SECTION(validList, handle -> validTotal, Triple)
+	CSR_SECTIONS(knownIndex)
+	CSR_SECTIONS(knownTailIndex)
+	SECTION(testLef, R, INT)
+	SECTION(testRig, R, INT)
+	SECTION(validLef, R, INT)
+	SECTION(validRig, R, INT)
+	SECTION(head_lef, handle -> headTypeTotal ? R : 0, INT)
+	SECTION(head_rig, handle -> headTypeTotal ? R : 0, INT)
+	SECTION(tail_lef, handle -> tailTypeTotal ? R : 0, INT)
+	SECTION(tail_rig, handle -> tailTypeTotal ? R : 0, INT)
+	SECTION(head_type, handle -> headTypeTotal, INT)
+	SECTION(tail_type, handle -> tailTypeTotal, INT)
+	#undef CSR_SECTIONS
+	#undef SECTION
+	return total;
+}
+
+unsigned long long alignOffset(unsigned long long offset) {
+	return (offset + DATASET_ALIGN - 1) / DATASET_ALIGN * DATASET_ALIGN;
+}
+
+/*
+	parse inPath and write the compiled dataset to path; type_constrain.txt is
+	included when it exists. The file is written next to path and renamed, so
+	readers never see a partial file. Returns 0 on success.
+*/
+extern "C"
+INT compileDataset(Handle *handle, char *path) {
+	importTrainFiles(handle);
+	importTestFiles(handle);
+	FILE *ftype = fopen((handle -> inPath + "type_constrain.txt").c_str(), "r");
+	if (ftype != NULL) {
+		fclose(ftype);
+		importTypeFiles(handle);
+	}
+
+	DatasetHeader header;
+	memset(&header, 0, sizeof(header));
+	memcpy(header.magic, DATASET_MAGIC, 8);
+	header.version = DATASET_VERSION;
+	header.intSize = sizeof(INT);
+	header.realSize = sizeof(REAL);
+	header.relationTotal = handle -> relationTotal;
+	header.entityTotal = handle -> entityTotal;
+	header.tripleTotal = handle -> tripleTotal;
+	header.trainTotal = handle -> trainTotal;
+	header.testTotal = handle -> testTotal;
+	header.validTotal = handle -> validTotal;
+	header.headTypeTotal = handle -> headTypeTotal;
+	header.tailTypeTotal = handle -> tailTypeTotal;
+	header.compact = handle -> compact;
+	CsrIndex *indexes[5] = {&handle -> headIndex, &handle -> tailIndex, &handle -> relIndex, &handle -> knownIndex, &handle -> knownTailIndex};
+	for (INT i = 0; i < 5; i++) {
+		header.indexPairs[i] = indexes[i] -> pairs;
+		header.indexEdges[i] = indexes[i] -> edges;
+	}
+	header.setMask = handle -> trainSet.mask;
+
+	Section sections[DATASET_SECTIONS];
+	header.sectionTotal = datasetSections(handle, sections);
+	std::string tmpPath = std::string(path) + ".tmp";
+	FILE *fout = fopen(tmpPath.c_str(), "wb");
+	if (fout == NULL) {
+		printf("Cannot write the compiled dataset %s.\n", tmpPath.c_str());
+		return -1;
+	}
+	static const char zeros[DATASET_ALIGN] = {0};
+	unsigned long long offset = alignOffset(sizeof(header));
+	fwrite(&header, sizeof(header), 1, fout);
+	fwrite(zeros, 1, offset - sizeof(header), fout);
+	for (INT i = 0; i < header.sectionTotal; i++) {
+		header.offset[i] = offset;
+		if (sections[i].bytes > 0)
+			fwrite(*sections[i].data, 1, sections[i].bytes, fout);
+		unsigned long long next = alignOffset(offset + sections[i].bytes);
+		fwrite(zeros, 1, next - offset - sections[i].bytes, fout);
+		offset = next;
+	}
+	header.size = offset;
+	fseek(fout, 0, SEEK_SET);
+	fwrite(&header, sizeof(header), 1, fout);
+	INT failed = ferror(fout);
+	fclose(fout);
+	if (failed || rename(tmpPath.c_str(), path) != 0) {
+		printf("Cannot write the compiled dataset %s.\n", path);
+		remove(tmpPath.c_str());
+		return -1;
+	}
+	printf("The compiled dataset is saved to %s (%llu bytes).\n", path, offset);
+	return 0;
+}
+
+/*
+	free the training, test and type arrays of the handle and unmap its
+	compiled dataset, if any; the settings, the samplers and the evaluation
+	counters are kept, so the handle can import or load another dataset
+*/
+extern "C"
+void releaseDataset(Handle *handle) {
+	releaseTrainData(handle);
+	releaseTestData(handle);
+	releaseTypeData(handle);
+	if (handle -> mapping != NULL)
+		munmap(handle -> mapping, handle -> mappingSize);
+	handle -> mapping = NULL;
+	handle -> mappingSize = 0;
+	handle -> detached = 0;
+	handle -> relationTotal = handle -> entityTotal = handle -> tripleTotal = 0;
+}
+
+/*
+	map a file written by compileDataset() in place of importTrainFiles,
+	importTestFiles and importTypeFiles. Returns 0 on success and -1 when the
+	file is missing or was compiled by an incompatible build.
+*/
+extern "C"
+INT loadDataset(Handle *handle, char *path) {
+	INT fd = open(path, O_RDONLY);
+	if (fd < 0) return -1;
+	struct stat info;
+	DatasetHeader header;
+	if (fstat(fd, &info) != 0 || (unsigned long long)info.st_size < sizeof(header) || pread(fd, &header, sizeof(header), 0) != sizeof(header)
+		|| memcmp(header.magic, DATASET_MAGIC, 8) != 0 || header.version != DATASET_VERSION || header.intSize != sizeof(INT)
+		|| header.realSize != sizeof(REAL) || header.size != (unsigned long long)info.st_size) {
+		close(fd);
+		printf("%s is not a compiled dataset of this build.\n", path);
+		return -1;
+	}
+	void *mapping = mmap(NULL, header.size, PROT_READ | PROT_WRITE, MAP_PRIVATE, fd, 0);
+	close(fd);
+	if (mapping == MAP_FAILED) return -1;
+
+	releaseDataset(handle);
+	handle -> mapping = mapping;
+	handle -> mappingSize = header.size;
+	handle -> relationTotal = header.relationTotal;
+	handle -> entityTotal = header.entityTotal;
+	handle -> tripleTotal = header.tripleTotal;
+	handle -> trainTotal = header.trainTotal;
+	handle -> testTotal = header.testTotal;
+	handle -> validTotal = header.validTotal;
+	handle -> headTypeTotal = header.headTypeTotal;
+	handle -> tailTypeTotal = header.tailTypeTotal;
+	handle -> compact = header.compact;
+	CsrIndex *indexes[5] = {&handle -> headIndex, &handle -> tailIndex, &handle -> relIndex, &handle -> knownIndex, &handle -> knownTailIndex};
+	for (INT i = 0; i < 5; i++) {
+		indexes[i] -> rows = header.entityTotal;
+		indexes[i] -> pairs = header.indexPairs[i];
+		indexes[i] -> edges = header.indexEdges[i];
+	}
+	handle -> trainSet.mask = header.setMask;
+	Section sections[DATASET_SECTIONS];
+	INT total = datasetSections(handle, sections);
+	for (INT i = 0; i < total; i++)
+		*sections[i].data = sections[i].bytes > 0 ? (char *)mapping + header.offset[i] : NULL;
+	// trainList is sorted by cmp_head after deduplication, like trainHead
+	if (handle -> compact) {
+		handle -> trainSet.compactList = handle -> compactTrain;
+	} else {
+		handle -> trainList = handle -> trainHead;
+		handle -> trainSet.list = handle -> trainHead;
+	}
+	if (handle -> headTypeTotal > 0 || handle -> tailTypeTotal > 0)
+		handle -> typePath = handle -> inPath;
+	if (handle -> negMode == 1)
+		buildNegTable(handle);
+	printf("The toolkit is mapping the compiled dataset %s.\n", path);
+	printf("The total of relations is %ld.\n", handle -> relationTotal);
+	printf("The total of entities is %ld.\n", handle -> entityTotal);
+	printf("The total of train triples is %ld.\n", handle -> trainTotal);
+	return 0;
+}
+
+/*
+	copy the arrays of a loaded dataset out of the mapping, so they can be
+	grown and reallocated like imported ones. The mapping stays until the
+	handle is destroyed, so the import functions still skip the text files,
+	but its pages are released.
+*/
+void detachDataset(Handle *handle) {
+	if (handle -> mapping == NULL || handle -> detached) return;
+	Section sections[DATASET_SECTIONS];
+	INT total = datasetSections(handle, sections);
+	for (INT i = 0; i < total; i++) {
+		if (sections[i].bytes == 0) continue;
+		void *copy = malloc(sections[i].bytes);
+		memcpy(copy, *sections[i].data, sections[i].bytes);
+		*sections[i].data = copy;
+	}
+	if (handle -> compact) {
+		handle -> trainSet.compactList = handle -> compactTrain;
+	} else {
+		handle -> trainList = handle -> trainHead;
+		handle -> trainSet.list = handle -> trainHead;
+	}
+	madvise(handle -> mapping, handle -> mappingSize, MADV_DONTNEED);
+	handle -> detached = 1;
+}
+
+#endif
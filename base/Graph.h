@@ -0,0 +1,204 @@
+#ifndef GRAPH_H
+#define GRAPH_H
+#include "Setting.h"
+#include "Triple.h"
+#include <cstdlib>
+#include <cstring>
+#include <algorithm>
+
+/*=====================================================================================
+compressed sparse row (CSR) indexes over the triples.
+A CsrIndex groups the edges of a sorted triple list by a row entity and then
+by a key id. The keys of row e are pairKey[rowOffset[e] .. rowOffset[e + 1]),
+in increasing order; the neighbors of pair p are
+neighbor[pairOffset[p] .. pairOffset[p + 1]), in increasing order and without
+duplicates. Degrees are differences of offsets and a (row, key) lookup is a
+binary search over the few keys of one row.
+	headIndex	h -> r -> t over the training triples
+	tailIndex	t -> r -> h over the training triples
+	relIndex	h -> t -> r over the training triples
+	knownIndex	h -> r -> t over the train, valid and test triples (ranking filter)
+	knownTailIndex	t -> r -> h over the train, valid and test triples (ranking filter)
+getGraphIndex() hands the four arrays of an index to Python, which wraps them
+as numpy views without copying.
+======================================================================================*/
+template <class T>
+INT tripleHead(const T &a) {
+	return a.h;
+}
+
+template <class T>
+INT tripleRel(const T &a) {
+	return a.r;
+}
+
+template <class T>
+INT tripleTail(const T &a) {
+	return a.t;
+}
+
+// list must be sorted by (row, key, value); repeated triples are stored once
+template <class T>
+void buildCsrIndex(CsrIndex &index, const T *list, INT total, INT rows, INT (*row)(const T &), INT (*key)(const T &), INT (*value)(const T &)) {
+	index.rows = rows;
+	index.pairs = 0;
+	index.edges = 0;
+	for (INT i = 0; i < total; i++) {
+		if (i > 0 && row(list[i]) == row(list[i - 1]) && key(list[i]) == key(list[i - 1])) {
+			if (value(list[i]) != value(list[i - 1])) index.edges++;
+			continue;
+		}
+		index.pairs++;
+		index.edges++;
+	}
+	index.rowOffset = (INT *)calloc(rows + 1, sizeof(INT));
+	index.pairKey = (unsigned int *)calloc(index.pairs + 1, sizeof(unsigned int));
+	index.pairOffset = (INT *)calloc(index.pairs + 1, sizeof(INT));
+	index.neighbor = (unsigned int *)calloc(index.edges + 1, sizeof(unsigned int));
+	INT pair = -1, edge = 0;
+	for (INT i = 0; i < total; i++) {
+		bool same = i > 0 && row(list[i]) == row(list[i - 1]) && key(list[i]) == key(list[i - 1]);
+		if (same && value(list[i]) == value(list[i - 1])) continue;
+		if (!same) {
+			pair++;
+			index.rowOffset[row(list[i]) + 1]++;
+			index.pairKey[pair] = key(list[i]);
+			index.pairOffset[pair] = edge;
+		}
+		index.neighbor[edge++] = value(list[i]);
+	}
+	index.pairOffset[index.pairs] = edge;
+	for (INT i = 0; i < rows; i++)
+		index.rowOffset[i + 1] += index.rowOffset[i];
+}
+
+/*
+	out gets the edges of index and of list, which is sorted by (row, key, value)
+	like index, over rows >= index.rows rows; triples already in index are
+	stored once and rows of list past rows are skipped. Runs of rows without
+	triples in list are moved with one block copy each.
+*/
+template <class T>
+void mergeCsrIndex(CsrIndex &out, const CsrIndex &index, INT rows, const T *list, INT total, INT (*row)(const T &), INT (*key)(const T &), INT (*value)(const T &)) {
+	out.rows = rows;
+	out.rowOffset = (INT *)calloc(rows + 1, sizeof(INT));
+	out.pairKey = (unsigned int *)malloc((index.pairs + total + 1) * sizeof(unsigned int));
+	out.pairOffset = (INT *)malloc((index.pairs + total + 1) * sizeof(INT));
+	out.neighbor = (unsigned int *)malloc((index.edges + total + 1) * sizeof(unsigned int));
+	INT pair = 0, edge = 0, j = 0;
+	for (INT e = 0; e < rows; e++) {
+		while (j < total && row(list[j]) < e) j++;
+		INT next = std::min(j < total ? row(list[j]) : rows, std::min(rows, index.rows));
+		if (next > e) {
+			// rows e .. next - 1 only have the edges of index
+			INT p0 = index.rowOffset[e], p1 = index.rowOffset[next];
+			INT a = index.pairOffset[p0], b = index.pairOffset[p1];
+			memcpy(out.pairKey + pair, index.pairKey + p0, (p1 - p0) * sizeof(unsigned int));
+			for (INT p = p0; p < p1; p++)
+				out.pairOffset[pair + p - p0] = index.pairOffset[p] - a + edge;
+			memcpy(out.neighbor + edge, index.neighbor + a, (b - a) * sizeof(unsigned int));
+			for (INT f = e; f < next; f++)
+				out.rowOffset[f + 1] = index.rowOffset[f + 1] - p0 + pair;
+			pair += p1 - p0;
+			edge += b - a;
+			e = next - 1;
+			continue;
+		}
+		INT p = e < index.rows ? index.rowOffset[e] : 0;
+		INT stop = e < index.rows ? index.rowOffset[e + 1] : 0;
+		while (p < stop || (j < total && row(list[j]) == e)) {
+			bool fromIndex = p < stop, fromList = j < total && row(list[j]) == e;
+			INT k = fromIndex ? (INT)index.pairKey[p] : key(list[j]);
+			if (fromIndex && fromList && key(list[j]) < k) k = key(list[j]);
+			INT a = 0, b = 0;
+			if (fromIndex && (INT)index.pairKey[p] == k) {
+				a = index.pairOffset[p];
+				b = index.pairOffset[p + 1];
+				p++;
+			}
+			out.pairKey[pair] = k;
+			out.pairOffset[pair] = edge;
+			while (a < b || (j < total && row(list[j]) == e && key(list[j]) == k)) {
+				INT v;
+				if (j < total && row(list[j]) == e && key(list[j]) == k && (a == b || value(list[j]) < (INT)index.neighbor[a]))
+					v = value(list[j++]);
+				else
+					v = index.neighbor[a++];
+				if (edge == out.pairOffset[pair] || (INT)out.neighbor[edge - 1] != v)
+					out.neighbor[edge++] = v;
+			}
+			pair++;
+		}
+		out.rowOffset[e + 1] = pair;
+	}
+	out.pairs = pair;
+	out.edges = edge;
+	out.pairOffset[pair] = edge;
+	out.pairKey = (unsigned int *)realloc(out.pairKey, (pair + 1) * sizeof(unsigned int));
+	out.pairOffset = (INT *)realloc(out.pairOffset, (pair + 1) * sizeof(INT));
+	out.neighbor = (unsigned int *)realloc(out.neighbor, (edge + 1) * sizeof(unsigned int));
+}
+
+void releaseCsrIndex(Handle *handle, CsrIndex &index) {
+	releaseArray(handle, index.rowOffset);
+	releaseArray(handle, index.pairKey);
+	releaseArray(handle, index.pairOffset);
+	releaseArray(handle, index.neighbor);
+	memset(&index, 0, sizeof(CsrIndex));
+}
+
+/*
+	set [lef, rig] to the neighbor range of (row, key); false if the pair has
+	no edges. The range is inclusive, like the ranges the corruption searches.
+*/
+bool findEdges(const CsrIndex &index, INT row, INT key, INT &lef, INT &rig) {
+	if (row < 0 || row >= index.rows) return false;
+	const unsigned int *begin = index.pairKey + index.rowOffset[row];
+	const unsigned int *end = index.pairKey + index.rowOffset[row + 1];
+	const unsigned int *cur = std::lower_bound(begin, end, (unsigned int)key);
+	if (cur == end || *cur != (unsigned int)key) return false;
+	lef = index.pairOffset[cur - index.pairKey];
+	rig = index.pairOffset[cur - index.pairKey + 1] - 1;
+	return true;
+}
+
+bool containsEdge(const CsrIndex &index, INT row, INT key, INT value) {
+	INT lef, rig;
+	if (!findEdges(index, row, key, lef, rig)) return false;
+	return std::binary_search(index.neighbor + lef, index.neighbor + rig + 1, (unsigned int)value);
+}
+
+// number of edges of row
+INT rowDegree(const CsrIndex &index, INT row) {
+	return index.pairOffset[index.rowOffset[row + 1]] - index.pairOffset[index.rowOffset[row]];
+}
+
+// bytes held by the four arrays of index
+INT csrBytes(const CsrIndex &index) {
+	if (index.rowOffset == NULL) return 0;
+	return (index.rows + 1 + index.pairs + 1) * sizeof(INT) + (index.pairs + index.edges) * sizeof(unsigned int);
+}
+
+/*
+	which selects headIndex, tailIndex, relIndex, knownIndex or knownTailIndex
+	(0 to 4). sizes
+	receives rows, pairs and edges, arrays the addresses of rowOffset, pairKey,
+	pairOffset and neighbor. The arrays belong to the handle. Returns -1 if the
+	index has not been built.
+*/
+extern "C"
+INT getGraphIndex(Handle *handle, INT which, INT *sizes, void **arrays) {
+	CsrIndex *indexes[5] = {&handle -> headIndex, &handle -> tailIndex, &handle -> relIndex, &handle -> knownIndex, &handle -> knownTailIndex};
+	if (which < 0 || which > 4 || indexes[which] -> rowOffset == NULL) return -1;
+	const CsrIndex &index = *indexes[which];
+	sizes[0] = index.rows;
+	sizes[1] = index.pairs;
+	sizes[2] = index.edges;
+	arrays[0] = index.rowOffset;
+	arrays[1] = index.pairKey;
+	arrays[2] = index.pairOffset;
+	arrays[3] = index.neighbor;
+	return 0;
+}
+
+#endif
@@ -0,0 +1,77 @@
+#ifndef HASH_H
+#define HASH_H
+#include "Setting.h"
+#include "Triple.h"
+#include <cstdlib>
+
+/*=====================================================================================
+open-addressing hash tables over the training triples.
+TripleSet answers "is (h, r, t) a training triple" with one probe sequence;
+it is built over a Triple or a CompactTriple array.
+======================================================================================*/
+#define EMPTY_KEY 0xffffffffffffffffULL
+
+unsigned long long hashMix(unsigned long long x) {
+	x ^= x >> 30;
+	x *= 0xbf58476d1ce4e5b9ULL;
+	x ^= x >> 27;
+	x *= 0x94d049bb133111ebULL;
+	x ^= x >> 31;
+	return x;
+}
+
+unsigned long long hashCapacity(INT total) {
+	unsigned long long capacity = 16;
+	while (capacity < (unsigned long long)total * 2)
+		capacity <<= 1;
+	return capacity;
+}
+
+unsigned long long tripleHash(INT h, INT r, INT t) {
+	return hashMix(hashMix(((unsigned long long)h << 32) ^ r) + t);
+}
+
+#define EMPTY_SLOT 0xffffffffU
+
+template <class T>
+void fillTripleSet(TripleSet &set, const T *list, INT total) {
+	unsigned long long capacity = hashCapacity(total);
+	set.mask = capacity - 1;
+	set.slots = (unsigned int *)malloc(capacity * sizeof(unsigned int));
+	memset(set.slots, 0xff, capacity * sizeof(unsigned int));
+	for (INT i = 0; i < total; i++) {
+		unsigned long long slot = tripleHash(list[i].h, list[i].r, list[i].t) & set.mask;
+		while (set.slots[slot] != EMPTY_SLOT)
+			slot = (slot + 1) & set.mask;
+		set.slots[slot] = i;
+	}
+}
+
+void buildTripleSet(TripleSet &set, Triple *list, INT total) {
+	set.list = list;
+	set.compactList = NULL;
+	fillTripleSet(set, list, total);
+}
+
+void buildTripleSet(TripleSet &set, CompactTriple *list, INT total) {
+	set.list = NULL;
+	set.compactList = list;
+	fillTripleSet(set, list, total);
+}
+
+bool containsTriple(const TripleSet &set, INT h, INT r, INT t) {
+	unsigned long long slot = tripleHash(h, r, t) & set.mask;
+	while (set.slots[slot] != EMPTY_SLOT) {
+		if (set.compactList != NULL) {
+			const CompactTriple &cur = set.compactList[set.slots[slot]];
+			if (cur.h == h && cur.r == r && cur.t == t) return true;
+		} else {
+			const Triple &cur = set.list[set.slots[slot]];
+			if (cur.h == h && cur.r == r && cur.t == t) return true;
+		}
+		slot = (slot + 1) & set.mask;
+	}
+	return false;
+}
+
+#endif
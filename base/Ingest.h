@@ -0,0 +1,503 @@
+#ifndef INGEST_H
+#define INGEST_H
+#include "Setting.h"
+#include "Triple.h"
+#include "Hash.h"
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <vector>
+#include <algorithm>
+#include <queue>
+#include <functional>
+#include <pthread.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <fcntl.h>
+#include <unistd.h>
+
+/*=====================================================================================
+string triple ingestion.
+ingestTriples() streams a raw "head<TAB>relation<TAB>tail" file into a *2id.txt
+file. The file is mapped and consumed in windows of INGEST_WINDOW bytes; each
+window is split into workThreads line-aligned chunks whose names are hashed and
+inserted by their own thread into two concurrent open-addressing maps, one for
+entities and one for relations. After a window the new names get ids in the
+order of their first occurrence, so the ids do not depend on the thread count
+and equal those of a sequential numbering. The id triples of a window are
+appended to spill files beside the output, partitioned by their hash, so a
+repeated triple always lands in the partition of its first occurrence. Each
+partition is then loaded alone, its repeats are dropped, and the partitions
+are merged back into file order; repeated triples are written once.
+There is one partition per INGEST_PARTITION triples the file can hold (a line
+has at least INGEST_MIN_LINE bytes), so resident memory is one window of the
+file, the distinct names, one stdio buffer per partition and the id triples
+of one partition: about INGEST_PARTITION of 24 bytes each, with their hash
+slots. writeIngestIds() then writes entity2id.txt and relation2id.txt for
+every file ingested through the handle.
+======================================================================================*/
+#define INGEST_WINDOW (1 << 24)
+#define INGEST_CHUNK_MIN (1 << 20)
+#define INGEST_BLOCK (1 << 20)
+#define INGEST_PARTITION (1 << 22)
+#define INGEST_MIN_LINE 6
+
+struct NameSlot {
+	unsigned long long hash;	// 0 while the slot is free
+	const char *name;
+	unsigned int length;
+	unsigned int ready;
+	unsigned long long first;	// position of the first occurrence
+	INT id;
+};
+
+struct NameMap {
+	NameSlot *slots;
+	unsigned long long mask;
+	INT total;
+	std::vector<unsigned long long> order;	// order[id] is the slot of the name with that id
+};
+
+// names are copied into blocks owned by one thread at a time
+struct NameArena {
+	std::vector<char *> blocks;
+	size_t used;
+};
+
+struct IngestState {
+	NameMap maps[2];	// entities, relations
+	std::vector<NameArena> arenas;
+	unsigned long long consumed;
+};
+
+// an id triple and its position among the triples of the file
+struct SpillTriple {
+	CompactTriple triple;
+	unsigned long long index;
+};
+
+// spill files of the id triples, each holding one hash partition in file order
+struct IngestSpill {
+	std::vector<FILE *> parts;
+	std::vector<INT> counts;
+	unsigned long long total;
+};
+
+struct IngestChunk {
+	IngestState *state;
+	NameArena *arena;
+	const char *begin, *end;
+	unsigned long long base;
+	std::vector<unsigned long long> fields;	// slots of the head, relation and tail of every line
+	std::vector<unsigned long long> fresh[2];	// slots this chunk claimed
+	INT skipped;
+};
+
+unsigned long long nameHash(const char *name, unsigned int length) {
+	unsigned long long h = 0xcbf29ce484222325ULL;
+	for (unsigned int i = 0; i < length; i++)
+		h = (h ^ (unsigned char)name[i]) * 0x100000001b3ULL;
+	return hashMix(h) | 1;
+}
+
+const char *copyName(NameArena &arena, const char *name, unsigned int length) {
+	if (arena.blocks.empty() || arena.used + length > INGEST_BLOCK) {
+		arena.blocks.push_back((char *)malloc(length > INGEST_BLOCK ? length : INGEST_BLOCK));
+		arena.used = 0;
+	}
+	char *res = arena.blocks.back() + arena.used;
+	memcpy(res, name, length);
+	arena.used += length;
+	return res;
+}
+
+// slot of name, claimed for it if it is new; position lowers the first occurrence
+unsigned long long insertName(NameMap &map, IngestChunk &chunk, INT side, const char *name, unsigned int length, unsigned long long position) {
+	unsigned long long h = nameHash(name, length);
+	unsigned long long slot = h & map.mask;
+	while (1) {
+		NameSlot &cur = map.slots[slot];
+		unsigned long long seen = __atomic_load_n(&cur.hash, __ATOMIC_ACQUIRE);
+		if (seen == 0) {
+			unsigned long long expected = 0;
+			if (__atomic_compare_exchange_n(&cur.hash, &expected, h, false, __ATOMIC_ACQ_REL, __ATOMIC_ACQUIRE)) {
+				cur.name = copyName(*chunk.arena, name, length);
+				cur.length = length;
+				cur.first = position;
+				cur.id = -1;
+				__atomic_store_n(&cur.ready, 1, __ATOMIC_RELEASE);
+				chunk.fresh[side].push_back(slot);
+				return slot;
+			}
+			seen = expected;
+		}
+		if (seen == h) {
+			while (!__atomic_load_n(&cur.ready, __ATOMIC_ACQUIRE));
+			if (cur.length == length && memcmp(cur.name, name, length) == 0) {
+				unsigned long long first = __atomic_load_n(&cur.first, __ATOMIC_RELAXED);
+				while (position < first && !__atomic_compare_exchange_n(&cur.first, &first, position, false, __ATOMIC_RELAXED, __ATOMIC_RELAXED));
+				return slot;
+			}
+		}
+		slot = (slot + 1) & map.mask;
+	}
+}
+
+// make room for extra more names without rehashing during a window
+void reserveNames(NameMap &map, INT extra) {
+	unsigned long long capacity = hashCapacity(map.total + extra);
+	if (map.slots != NULL && capacity <= map.mask + 1) return;
+	NameSlot *slots = (NameSlot *)calloc(capacity, sizeof(NameSlot));
+	for (INT id = 0; id < map.total; id++) {
+		NameSlot &old = map.slots[map.order[id]];
+		unsigned long long slot = old.hash & (capacity - 1);
+		while (slots[slot].hash != 0)
+			slot = (slot + 1) & (capacity - 1);
+		slots[slot] = old;
+		map.order[id] = slot;
+	}
+	free(map.slots);
+	map.slots = slots;
+	map.mask = capacity - 1;
+}
+
+const char *findTab(const char *p, const char *stop) {
+	return p < stop ? (const char *)memchr(p, '\t', stop - p) : NULL;
+}
+
+void* ingestChunk(void *con) {
+	IngestChunk *chunk = (IngestChunk *)(con);
+	NameMap *maps = chunk -> state -> maps;
+	const char *p = chunk -> begin;
+	while (p < chunk -> end) {
+		const char *line = p;
+		const char *eol = (const char *)memchr(p, '\n', chunk -> end - p);
+		if (eol == NULL) eol = chunk -> end;
+		p = eol + 1;
+		const char *stop = eol;
+		if (stop > line && stop[-1] == '\r') stop--;
+		const char *tab1 = findTab(line, stop);
+		const char *tab2 = tab1 == NULL ? NULL : findTab(tab1 + 1, stop);
+		if (tab2 == NULL) {
+			if (stop > line) chunk -> skipped++;
+			continue;
+		}
+		const char *tab3 = findTab(tab2 + 1, stop);
+		if (tab3 != NULL) stop = tab3;
+		unsigned long long position = chunk -> base + (line - chunk -> begin);
+		chunk -> fields.push_back(insertName(maps[0], *chunk, 0, line, tab1 - line, position * 2));
+		chunk -> fields.push_back(insertName(maps[1], *chunk, 1, tab1 + 1, tab2 - tab1 - 1, position));
+		chunk -> fields.push_back(insertName(maps[0], *chunk, 0, tab2 + 1, stop - tab2 - 1, position * 2 + 1));
+	}
+	return NULL;
+}
+
+bool cmpFirst(const std::pair<unsigned long long, unsigned long long> &a, const std::pair<unsigned long long, unsigned long long> &b) {
+	return a.first < b.first;
+}
+
+// ids for the names claimed in the last window, in the order of their first occurrence
+void assignIds(NameMap &map, std::vector<IngestChunk> &chunks, INT side) {
+	std::vector<std::pair<unsigned long long, unsigned long long> > fresh;
+	for (size_t i = 0; i < chunks.size(); i++)
+		for (size_t j = 0; j < chunks[i].fresh[side].size(); j++) {
+			unsigned long long slot = chunks[i].fresh[side][j];
+			fresh.push_back(std::make_pair(map.slots[slot].first, slot));
+		}
+	std::sort(fresh.begin(), fresh.end(), cmpFirst);
+	for (size_t i = 0; i < fresh.size(); i++) {
+		map.slots[fresh[i].second].id = map.total++;
+		map.order.push_back(fresh[i].second);
+	}
+}
+
+char *appendNumber(char *p, unsigned long long value) {
+	char digits[24];
+	INT total = 0;
+	do {
+		digits[total++] = '0' + value % 10;
+		value /= 10;
+	} while (value > 0);
+	while (total > 0)
+		*p++ = digits[--total];
+	return p;
+}
+
+// first occurrences of list in their order; list is compacted in place
+INT uniqueTriples(SpillTriple *list, INT total) {
+	unsigned long long capacity = hashCapacity(total);
+	unsigned int *slots = (unsigned int *)malloc(capacity * sizeof(unsigned int));
+	memset(slots, 0xff, capacity * sizeof(unsigned int));
+	INT res = 0;
+	for (INT i = 0; i < total; i++) {
+		const CompactTriple &add = list[i].triple;
+		unsigned long long slot = tripleHash(add.h, add.r, add.t) & (capacity - 1);
+		bool seen = false;
+		while (slots[slot] != EMPTY_SLOT) {
+			const CompactTriple &cur = list[slots[slot]].triple;
+			if (cur.h == add.h && cur.r == add.r && cur.t == add.t) {
+				seen = true;
+				break;
+			}
+			slot = (slot + 1) & (capacity - 1);
+		}
+		if (seen) continue;
+		list[res] = list[i];
+		slots[slot] = res++;
+	}
+	free(slots);
+	return res;
+}
+
+void closeSpill(IngestSpill &spill) {
+	for (size_t i = 0; i < spill.parts.size(); i++)
+		fclose(spill.parts[i]);
+	spill.parts.clear();
+}
+
+// parts unnamed spill files beside outPath; they are removed when closed
+bool openSpill(IngestSpill &spill, const char *outPath, INT parts) {
+	std::vector<char> name(strlen(outPath) + 32);
+	for (INT i = 0; i < parts; i++) {
+		snprintf(name.data(), name.size(), "%s.%ld.tmp", outPath, i);
+		FILE *part = fopen(name.data(), "w+b");
+		if (part == NULL) {
+			printf("Cannot write %s.\n", name.data());
+			closeSpill(spill);
+			return false;
+		}
+		unlink(name.data());
+		spill.parts.push_back(part);
+	}
+	spill.counts.assign(parts, 0);
+	spill.total = 0;
+	return true;
+}
+
+// the partition is taken from the high bits, uniqueTriples probes with the low ones
+void spillTriple(IngestSpill &spill, const CompactTriple &triple) {
+	SpillTriple cur;
+	cur.triple = triple;
+	cur.index = spill.total++;
+	INT part = (tripleHash(triple.h, triple.r, triple.t) >> 32) % spill.parts.size();
+	fwrite(&cur, sizeof(SpillTriple), 1, spill.parts[part]);
+	spill.counts[part]++;
+}
+
+// drop the repeats of every partition, rewriting it with its first occurrences
+INT uniqueSpill(IngestSpill &spill) {
+	INT total = 0;
+	std::vector<SpillTriple> list;
+	for (size_t i = 0; i < spill.parts.size(); i++) {
+		FILE *part = spill.parts[i];
+		list.resize(spill.counts[i]);
+		rewind(part);
+		if (fread(list.data(), sizeof(SpillTriple), list.size(), part) != list.size())
+			return -1;
+		spill.counts[i] = uniqueTriples(list.data(), list.size());
+		rewind(part);
+		fwrite(list.data(), sizeof(SpillTriple), spill.counts[i], part);
+		if (fflush(part) != 0 || ferror(part)) return -1;
+		rewind(part);
+		total += spill.counts[i];
+	}
+	return total;
+}
+
+// the partitions merged back into file order, in the train2id.txt layout
+bool writeSpill(IngestSpill &spill, FILE *fout) {
+	typedef std::pair<unsigned long long, INT> Head;
+	std::priority_queue<Head, std::vector<Head>, std::greater<Head> > heads;
+	std::vector<SpillTriple> cur(spill.parts.size());
+	for (size_t i = 0; i < spill.parts.size(); i++)
+		if (spill.counts[i] > 0) {
+			if (fread(&cur[i], sizeof(SpillTriple), 1, spill.parts[i]) != 1) return false;
+			heads.push(Head(cur[i].index, i));
+		}
+	std::vector<char> buffer(INGEST_BLOCK + 64);
+	char *p = buffer.data();
+	while (!heads.empty()) {
+		INT i = heads.top().second;
+		heads.pop();
+		p = appendNumber(p, cur[i].triple.h);
+		*p++ = ' ';
+		p = appendNumber(p, cur[i].triple.t);
+		*p++ = ' ';
+		p = appendNumber(p, cur[i].triple.r);
+		*p++ = '\n';
+		if (p - buffer.data() > INGEST_BLOCK) {
+			fwrite(buffer.data(), 1, p - buffer.data(), fout);
+			p = buffer.data();
+		}
+		if (--spill.counts[i] > 0) {
+			if (fread(&cur[i], sizeof(SpillTriple), 1, spill.parts[i]) != 1) return false;
+			heads.push(Head(cur[i].index, i));
+		}
+	}
+	fwrite(buffer.data(), 1, p - buffer.data(), fout);
+	return true;
+}
+
+void freeIngest(Handle *handle) {
+	IngestState *state = handle -> ingest;
+	if (state == NULL) return;
+	for (INT side = 0; side < 2; side++)
+		free(state -> maps[side].slots);
+	for (size_t i = 0; i < state -> arenas.size(); i++)
+		for (size_t j = 0; j < state -> arenas[i].blocks.size(); j++)
+			free(state -> arenas[i].blocks[j]);
+	delete state;
+	handle -> ingest = NULL;
+}
+
+/*
+	read the raw triples of path and write them to outPath in the train2id.txt
+	layout ("h t r" lines after the count), numbering new names after those of
+	the files ingested before. Returns the number of triples written, or -1
+	if a file cannot be read or written.
+*/
+extern "C"
+INT ingestTriples(Handle *handle, char *path, char *outPath) {
+	if (handle -> ingest == NULL)
+		handle -> ingest = new IngestState();
+	IngestState *state = handle -> ingest;
+	INT threads = handle -> workThreads > 0 ? handle -> workThreads : 1;
+	if ((INT)state -> arenas.size() < threads)
+		state -> arenas.resize(threads);
+
+	INT fd = open(path, O_RDONLY);
+	if (fd < 0) {
+		printf("Cannot read %s.\n", path);
+		return -1;
+	}
+	struct stat info;
+	if (fstat(fd, &info) != 0) {
+		close(fd);
+		return -1;
+	}
+	size_t size = info.st_size;
+	IngestSpill spill;
+	if (!openSpill(spill, outPath, size / ((unsigned long long)INGEST_MIN_LINE * INGEST_PARTITION) + 1)) {
+		close(fd);
+		return -1;
+	}
+	void *mapping = size > 0 ? mmap(NULL, size, PROT_READ, MAP_PRIVATE, fd, 0) : NULL;
+	close(fd);
+	if (mapping == MAP_FAILED) {
+		closeSpill(spill);
+		return -1;
+	}
+	madvise(mapping, size, MADV_SEQUENTIAL);
+	const char *data = (const char *)mapping, *end = data + size;
+
+	INT skipped = 0;
+	size_t page = sysconf(_SC_PAGESIZE);
+	const char *window = data;
+	while (window < end) {
+		const char *stop = end - window > INGEST_WINDOW ? window + INGEST_WINDOW : end;
+		while (stop < end && *stop != '\n') stop++;
+		if (stop < end) stop++;
+		INT lines = std::count(window, stop, '\n') + 1;
+		reserveNames(state -> maps[0], 2 * lines);
+		reserveNames(state -> maps[1], lines);
+
+		size_t bytes = stop - window;
+		INT chunkTotal = bytes / INGEST_CHUNK_MIN + 1 < (size_t)threads ? bytes / INGEST_CHUNK_MIN + 1 : threads;
+		std::vector<IngestChunk> chunks(chunkTotal);
+		const char *begin = window;
+		for (INT i = 0; i < chunkTotal; i++) {
+			const char *split = i + 1 == chunkTotal ? stop : window + bytes / chunkTotal * (i + 1);
+			if (split < begin) split = begin;
+			while (split < stop && split[-1] != '\n') split++;
+			chunks[i].state = state;
+			chunks[i].arena = &state -> arenas[i];
+			chunks[i].begin = begin;
+			chunks[i].end = split;
+			chunks[i].base = state -> consumed + (begin - data);
+			chunks[i].skipped = 0;
+			begin = split;
+		}
+		if (chunkTotal == 1) {
+			ingestChunk(&chunks[0]);
+		} else {
+			pthread_t *pt = (pthread_t *)malloc(chunkTotal * sizeof(pthread_t));
+			for (INT i = 0; i < chunkTotal; i++)
+				pthread_create(&pt[i], NULL, ingestChunk, (void *)&chunks[i]);
+			for (INT i = 0; i < chunkTotal; i++)
+				pthread_join(pt[i], NULL);
+			free(pt);
+		}
+		for (INT side = 0; side < 2; side++)
+			assignIds(state -> maps[side], chunks, side);
+		for (INT i = 0; i < chunkTotal; i++) {
+			const std::vector<unsigned long long> &fields = chunks[i].fields;
+			for (size_t j = 0; j < fields.size(); j += 3) {
+				CompactTriple cur;
+				cur.h = state -> maps[0].slots[fields[j]].id;
+				cur.r = state -> maps[1].slots[fields[j + 1]].id;
+				cur.t = state -> maps[0].slots[fields[j + 2]].id;
+				spillTriple(spill, cur);
+			}
+			skipped += chunks[i].skipped;
+		}
+		// the consumed pages of the window are not needed again
+		size_t release = (stop - data) / page * page;
+		if (release > 0)
+			madvise(mapping, release, MADV_DONTNEED);
+		window = stop;
+	}
+	if (mapping != NULL)
+		munmap(mapping, size);
+	state -> consumed += size + 1;
+
+	INT total = uniqueSpill(spill);
+	if (total < 0) {
+		printf("Cannot spill the triples of %s.\n", path);
+		closeSpill(spill);
+		return -1;
+	}
+	FILE *fout = fopen(outPath, "w");
+	if (fout == NULL) {
+		printf("Cannot write %s.\n", outPath);
+		closeSpill(spill);
+		return -1;
+	}
+	fprintf(fout, "%ld\n", total);
+	bool merged = writeSpill(spill, fout);
+	closeSpill(spill);
+	INT failed = ferror(fout);
+	fclose(fout);
+	if (!merged || failed) return -1;
+	printf("%s: %ld triples, %ld repeated, %ld malformed lines skipped.\n", path, total, (INT)spill.total - total, skipped);
+	return total;
+}
+
+/*
+	write the names of every file ingested through the handle in the
+	entity2id.txt / relation2id.txt layout. Returns 0 on success.
+*/
+extern "C"
+INT writeIngestIds(Handle *handle, char *entityPath, char *relationPath) {
+	if (handle -> ingest == NULL) return -1;
+	char *paths[2] = {entityPath, relationPath};
+	for (INT side = 0; side < 2; side++) {
+		const NameMap &map = handle -> ingest -> maps[side];
+		FILE *fout = fopen(paths[side], "w");
+		if (fout == NULL) {
+			printf("Cannot write %s.\n", paths[side]);
+			return -1;
+		}
+		fprintf(fout, "%ld\n", map.total);
+		for (INT id = 0; id < map.total; id++) {
+			const NameSlot &cur = map.slots[map.order[id]];
+			fwrite(cur.name, 1, cur.length, fout);
+			fprintf(fout, "\t%ld\n", id);
+		}
+		INT failed = ferror(fout);
+		fclose(fout);
+		if (failed) return -1;
+	}
+	return 0;
+}
+
+#endif
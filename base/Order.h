@@ -0,0 +1,144 @@
+#ifndef ORDER_H
+#define ORDER_H
+#include "Setting.h"
+#include "Random.h"
+#include "Reader.h"
+#include <cstdlib>
+
+/*=====================================================================================
+positive sampling order.
+mode 0 draws every positive uniformly with replacement (the original sampler).
+mode 1 walks trainOrder without replacement: the batch is cut into
+ORDER_SHARDS slot ranges, each owning the matching shard of trainOrder, which
+is Fisher-Yates shuffled at the start of each epoch and consumed in order.
+mode 2 keeps trainOrder sorted by (h, r, t) and hands out contiguous blocks
+of a shard in a shuffled block order, so triples in a batch share heads and
+relations and their embedding rows are reused within the step.
+The shards do not follow the threads: every thread fills the slots of whole
+shards and a shard is shuffled from the stream of its own index, so batches
+depend only on the seed, the batch and the slot in every mode. Threads beyond
+ORDER_SHARDS stay idle in modes 1 and 2.
+======================================================================================*/
+extern "C"
+void setSampleMode(Handle *handle, INT mode) {
+	handle -> sampleMode = mode;
+}
+
+extern "C"
+INT getSampleMode(Handle *handle) {
+	return handle -> sampleMode;
+}
+
+// random streams of the epoch shuffles, above every slot of a batch
+#define SHUFFLE_POSITION 0x80000000ULL
+#define ORDER_SHARDS 16
+
+INT shardCount(INT batchSize) {
+	return batchSize < ORDER_SHARDS ? batchSize : ORDER_SHARDS;
+}
+
+// the slots [lef, rig) of the whole shards thread id fills in modes 1 and 2
+void orderSlots(Handle *handle, INT id, INT batchSize, INT &lef, INT &rig) {
+	INT shards = shardCount(batchSize);
+	INT first = id * shards / handle -> workThreads;
+	INT last = (id + 1) * shards / handle -> workThreads;
+	lef = first * batchSize / shards;
+	rig = last * batchSize / shards;
+}
+
+void releaseShards(Handle *handle) {
+	for (INT i = 0; i < handle -> shardTotal; i++)
+		free(handle -> shards[i].blocks);
+	free(handle -> shards);
+	handle -> shards = NULL;
+	handle -> shardTotal = 0;
+}
+
+// called by the sampling entry points before any worker runs
+void prepareOrder(Handle *handle) {
+	if (handle -> sampleMode == 0) return;
+	if (handle -> trainOrder == NULL || handle -> orderTotal != handle -> trainTotal || handle -> orderMode != handle -> sampleMode) {
+		free(handle -> trainOrder);
+		handle -> trainOrder = (INT *)calloc(handle -> trainTotal, sizeof(INT));
+		for (INT i = 0; i < handle -> trainTotal; i++)
+			handle -> trainOrder[i] = i;
+		if (handle -> sampleMode == 1)
+			for (INT i = handle -> trainTotal - 1; i > 0; i--)
+				std::swap(handle -> trainOrder[i], handle -> trainOrder[rand_max(handle, handle -> mainRand, i + 1)]);
+		handle -> orderTotal = handle -> trainTotal;
+		handle -> orderMode = handle -> sampleMode;
+		releaseShards(handle);
+	}
+	if (handle -> shards == NULL) {
+		handle -> shards = (Shard *)calloc(ORDER_SHARDS, sizeof(Shard));
+		for (INT i = 0; i < ORDER_SHARDS; i++)
+			handle -> shards[i].cursor = -1;
+		handle -> shardTotal = ORDER_SHARDS;
+	}
+}
+
+void newEpoch(Handle *handle, INT id, unsigned long long stream, INT index, Shard &shard) {
+	randSeek(handle, id, stream, SHUFFLE_POSITION + index);
+	INT size = shard.hi - shard.lo;
+	INT *order = handle -> trainOrder + shard.lo;
+	if (handle -> sampleMode == 1) {
+		for (INT i = size - 1; i > 0; i--)
+			std::swap(order[i], order[rand_max(handle, id, i + 1)]);
+	} else {
+		INT blockTotal = size / shard.need;
+		if (shard.blockTotal != blockTotal) {
+			free(shard.blocks);
+			shard.blocks = (INT *)calloc(blockTotal, sizeof(INT));
+			shard.blockTotal = blockTotal;
+		}
+		for (INT i = 0; i < blockTotal; i++)
+			shard.blocks[i] = i;
+		for (INT i = blockTotal - 1; i > 0; i--)
+			std::swap(shard.blocks[i], shard.blocks[rand_max(handle, id, i + 1)]);
+		shard.offset = rand_max(handle, id, shard.need);
+	}
+	shard.cursor = 0;
+}
+
+/*
+	write the trainList indices of the positives of shard index, the slots
+	[lef, rig) of batch stream, to out. The shard is [lef, rig) scaled from
+	batchSize to trainTotal, which holds at least nbatches * (rig - lef)
+	triples because batchSize <= trainTotal / nbatches.
+*/
+void shardPositives(Handle *handle, INT id, unsigned long long stream, INT index, INT lef, INT rig, INT batchSize, INT *out) {
+	Shard &shard = handle -> shards[index];
+	INT lo = lef * handle -> trainTotal / batchSize;
+	INT hi = rig * handle -> trainTotal / batchSize;
+	INT need = rig - lef;
+	if (shard.lo != lo || shard.hi != hi || shard.need != need) {
+		shard.lo = lo;
+		shard.hi = hi;
+		shard.need = need;
+		shard.cursor = -1;
+	}
+	if (shard.cursor < 0 || shard.cursor + need > hi - lo)
+		newEpoch(handle, id, stream, index, shard);
+	if (handle -> sampleMode == 1) {
+		for (INT j = 0; j < need; j++)
+			out[j] = handle -> trainOrder[lo + shard.cursor + j];
+	} else {
+		INT start = shard.offset + shard.blocks[shard.cursor / need] * need;
+		for (INT j = 0; j < need; j++)
+			out[j] = handle -> trainOrder[lo + (start + j) % (hi - lo)];
+	}
+	shard.cursor += need;
+}
+
+// the positives of the slots [lef, rig) of orderSlots, shard by shard
+void nextPositives(Handle *handle, INT id, unsigned long long stream, INT lef, INT rig, INT batchSize, INT *out) {
+	INT shards = shardCount(batchSize);
+	for (INT index = 0; index < shards; index++) {
+		INT lo = index * batchSize / shards;
+		INT hi = (index + 1) * batchSize / shards;
+		if (lo >= lef && hi <= rig && lo < hi)
+			shardPositives(handle, id, stream, index, lo, hi, batchSize, out + (lo - lef));
+	}
+}
+
+#endif
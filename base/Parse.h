@@ -0,0 +1,148 @@
+#ifndef PARSE_H
+#define PARSE_H
+#include "Setting.h"
+#include <cstdlib>
+#include <vector>
+#include <algorithm>
+#include <pthread.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <fcntl.h>
+#include <unistd.h>
+
+/*=====================================================================================
+parallel text parser.
+The text files are mapped, split into workThreads line-aligned chunks and the
+integers of every chunk are decoded by its own thread; the per-chunk values
+are concatenated in file order, so the result is the sequence fscanf("%ld")
+would have read. Files below PARSE_CHUNK_MIN bytes are read by one thread.
+======================================================================================*/
+#define PARSE_CHUNK_MIN (1 << 18)
+
+struct ParseChunk {
+	const char *begin, *end;
+	std::vector<INT> values;
+};
+
+void* parseChunk(void *con) {
+	ParseChunk *chunk = (ParseChunk *)(con);
+	const char *p = chunk -> begin, *end = chunk -> end;
+	chunk -> values.reserve((end - p) / 6 + 1);
+	while (p < end) {
+		while (p < end && (*p < '0' || *p > '9') && *p != '-') p++;
+		if (p == end) break;
+		bool negative = *p == '-';
+		if (negative) p++;
+		INT value = 0;
+		while (p < end && *p >= '0' && *p <= '9') {
+			value = value * 10 + (*p - '0');
+			p++;
+		}
+		chunk -> values.push_back(negative ? -value : value);
+	}
+	return NULL;
+}
+
+// all integers of the file at path in order; false if it cannot be read
+bool parseIntegers(Handle *handle, const std::string &path, std::vector<INT> &values) {
+	values.clear();
+	INT fd = open(path.c_str(), O_RDONLY);
+	if (fd < 0) return false;
+	struct stat info;
+	if (fstat(fd, &info) != 0) {
+		close(fd);
+		return false;
+	}
+	size_t size = info.st_size;
+	if (size == 0) {
+		close(fd);
+		return true;
+	}
+	void *mapping = mmap(NULL, size, PROT_READ, MAP_PRIVATE, fd, 0);
+	close(fd);
+	if (mapping == MAP_FAILED) return false;
+	madvise(mapping, size, MADV_SEQUENTIAL);
+	const char *data = (const char *)mapping, *end = data + size;
+
+	INT chunkTotal = size < PARSE_CHUNK_MIN ? 1 : handle -> workThreads;
+	if ((size_t)chunkTotal > size / PARSE_CHUNK_MIN + 1) chunkTotal = size / PARSE_CHUNK_MIN + 1;
+	if (chunkTotal < 1) chunkTotal = 1;
+	std::vector<ParseChunk> chunks(chunkTotal);
+	const char *begin = data;
+	for (INT i = 0; i < chunkTotal; i++) {
+		const char *stop = i + 1 == chunkTotal ? end : data + size / chunkTotal * (i + 1);
+		if (stop < begin) stop = begin;
+		while (stop < end && *stop != '\n') stop++;
+		chunks[i].begin = begin;
+		chunks[i].end = stop;
+		begin = stop;
+	}
+	if (chunkTotal == 1) {
+		parseChunk(&chunks[0]);
+	} else {
+		pthread_t *pt = (pthread_t *)malloc(chunkTotal * sizeof(pthread_t));
+		for (INT i = 0; i < chunkTotal; i++)
+			pthread_create(&pt[i], NULL, parseChunk, (void *)&chunks[i]);
+		for (INT i = 0; i < chunkTotal; i++)
+			pthread_join(pt[i], NULL);
+		free(pt);
+	}
+	munmap(mapping, size);
+
+	size_t total = 0;
+	for (INT i = 0; i < chunkTotal; i++)
+		total += chunks[i].values.size();
+	values.resize(total);
+	total = 0;
+	for (INT i = 0; i < chunkTotal; i++) {
+		std::copy(chunks[i].values.begin(), chunks[i].values.end(), values.begin() + total);
+		total += chunks[i].values.size();
+	}
+	return true;
+}
+
+/*
+	read a *2id.txt file: the triple count followed by "h t r" lines. total is
+	set to the count of the first line and the returned array holds that many
+	triples (zeros past the end of a truncated file).
+*/
+Triple *readTriples(Handle *handle, const std::string &path, INT &total) {
+	std::vector<INT> values;
+	total = 0;
+	if (!parseIntegers(handle, path, values) || values.empty()) {
+		printf("Cannot read %s.\n", path.c_str());
+		return (Triple *)calloc(1, sizeof(Triple));
+	}
+	total = values[0];
+	Triple *list = (Triple *)calloc(total > 0 ? total : 1, sizeof(Triple));
+	INT available = (values.size() - 1) / 3;
+	for (INT i = 0; i < total && i < available; i++) {
+		list[i].h = values[1 + 3 * i];
+		list[i].t = values[2 + 3 * i];
+		list[i].r = values[3 + 3 * i];
+	}
+	return list;
+}
+
+// the first integer of a file, as the header of relation2id.txt or a *2id.txt
+INT readTotal(const std::string &path) {
+	INT total = 0;
+	FILE *fin = fopen(path.c_str(), "r");
+	if (fin == NULL) return 0;
+	if (fscanf(fin, "%ld", &total) != 1) total = 0;
+	fclose(fin);
+	return total;
+}
+
+/*
+	parse path with workThreads threads and return the number of integers read,
+	or -1 if it cannot be read; used to measure the parser.
+*/
+extern "C"
+INT parseTextFile(Handle *handle, char *path) {
+	std::vector<INT> values;
+	if (!parseIntegers(handle, path, values)) return -1;
+	return values.size();
+}
+
+#endif
@@ -3,29 +3,83 @@
 #include "Setting.h"
 #include <cstdlib>
 
-unsigned long long *next_random;
+/*=====================================================================================
+counter-based random numbers (Philox4x32-10).
+A draw is a pure function of (seed, stream, position, counter): the sampler
+uses the global batch index as stream and the slot inside the batch as
+position, so a batch does not depend on how its slots are split between
+workThreads. Each thread only keeps the coordinates of its current stream.
+mainRand is the state reserved for calls made from the python
+thread and is never used by a sampler worker; batchCounter counts
+the batches generated since the last randReset() or setSeed().
+======================================================================================*/
+#define MAIN_STREAM 0xffffffffffffffffULL
+
+// pure function of its arguments; independent blocks can be computed in any order or in parallel
+void philox4x32(const unsigned int *ctr, unsigned long long seed, unsigned int *out) {
+	unsigned int c0 = ctr[0], c1 = ctr[1], c2 = ctr[2], c3 = ctr[3];
+	unsigned int k0 = (unsigned int)seed, k1 = (unsigned int)(seed >> 32);
+	for (INT round = 0; round < 10; round++) {
+		unsigned long long p0 = (unsigned long long)0xD2511F53U * c0;
+		unsigned long long p1 = (unsigned long long)0xCD9E8D57U * c2;
+		unsigned int n0 = (unsigned int)(p1 >> 32) ^ c1 ^ k0;
+		unsigned int n2 = (unsigned int)(p0 >> 32) ^ c3 ^ k1;
+		c1 = (unsigned int)p1;
+		c3 = (unsigned int)p0;
+		c0 = n0;
+		c2 = n2;
+		k0 += 0x9E3779B9U;
+		k1 += 0xBB67AE85U;
+	}
+	out[0] = c0; out[1] = c1; out[2] = c2; out[3] = c3;
+}
+
+// move thread id to the start of the stream for (stream, position)
+void randSeek(Handle *handle, INT id, unsigned long long stream, unsigned long long position) {
+	RandomState &state = handle -> next_random[id];
+	state.stream = stream;
+	state.position = (unsigned int)position;
+	state.counter = 0;
+	state.left = 0;
+}
 
 extern "C"
-void randReset() {
-	next_random = (unsigned long long *)calloc(workThreads, sizeof(unsigned long long));
-	for (INT i = 0; i < workThreads; i++)
-		next_random[i] = rand();
+void randReset(Handle *handle) {
+	if (handle -> next_random == NULL || handle -> mainRand != handle -> workThreads) {
+		free(handle -> next_random);
+		handle -> next_random = (RandomState *)calloc(handle -> workThreads + 1, sizeof(RandomState));
+	} else {
+		memset(handle -> next_random, 0, (handle -> workThreads + 1) * sizeof(RandomState));
+	}
+	handle -> mainRand = handle -> workThreads;
+	handle -> batchCounter = 0;
+	randSeek(handle, handle -> mainRand, MAIN_STREAM, 0);
 }
 
-unsigned long long randd(INT id) {
-	next_random[id] = next_random[id] * (unsigned long long)25214903917 + 11;
-	return next_random[id];
+extern "C"
+void setSeed(Handle *handle, unsigned long long seed) {
+	handle -> randomSeed = seed;
+	handle -> batchCounter = 0;
+	randSeek(handle, handle -> mainRand, MAIN_STREAM, 0);
 }
 
-INT rand_max(INT id, INT x) {
-	INT res = randd(id) % x;
+unsigned long long randd(Handle *handle, INT id) {
+	RandomState &state = handle -> next_random[id];
+	if (state.left == 0) {
+		unsigned int ctr[4] = {state.counter, state.position, (unsigned int)state.stream, (unsigned int)(state.stream >> 32)};
+		philox4x32(ctr, handle -> randomSeed, state.buffer);
+		state.counter++;
+		if (state.counter == 0) state.position++;
+		state.left = 2;
+	}
+	state.left--;
+	return ((unsigned long long)state.buffer[2 * state.left] << 32) | state.buffer[2 * state.left + 1];
+}
+
+INT rand_max(Handle *handle, INT id, INT x) {
+	INT res = randd(handle, id) % x;
 	while (res < 0)
 		res += x;
 	return res;
 }
-
-//[a,b)
-INT rand(INT a, INT b){
-	return (rand() % (b-a))+ a;
-}
 #endif
@@ -2,267 +2,300 @@
 #define READER_H
 #include "Setting.h"
 #include "Triple.h"
+#include "Hash.h"
+#include "Alias.h"
+#include "Parse.h"
+#include "Graph.h"
+#include "Storage.h"
+#include <cmath>
 #include <cstdlib>
 #include <algorithm>
 
-INT *freqRel, *freqEnt;
-INT *lefHead, *rigHead;
-INT *lefTail, *rigTail;
-INT *lefRel, *rigRel;
-REAL *left_mean, *right_mean;
+/*
+	training negatives: negMode 0 replaces entities uniformly, negMode 1 draws
+	them proportionally to freqEnt^negPower from entityAlias
+*/
+void buildNegTable(Handle *handle) {
+	double *weight = (double *)calloc(handle -> entityTotal, sizeof(double));
+	for (INT i = 0; i < handle -> entityTotal; i++)
+		weight[i] = pow((double)handle -> freqEnt[i], (double)handle -> negPower);
+	buildAliasTable(handle -> entityAlias, weight, handle -> entityTotal);
+	free(weight);
+}
+
+extern "C"
+void setNegSampling(Handle *handle, INT mode, REAL power) {
+	handle -> negMode = mode;
+	handle -> negPower = power;
+	if (handle -> negMode == 1 && handle -> freqEnt != NULL)
+		buildNegTable(handle);
+}
+
+// left_mean[r] and right_mean[r] are the triples of r per distinct (h, r) and per distinct (t, r) pair
+void bernStatistics(Handle *handle, INT r) {
+	handle -> left_mean[r] = handle -> freqRel[r] / (REAL)handle -> headPairTotal[r];
+	handle -> right_mean[r] = handle -> freqRel[r] / (REAL)handle -> tailPairTotal[r];
+	handle -> bern_prob[r] = 1000 * handle -> right_mean[r] / (handle -> right_mean[r] + handle -> left_mean[r]);
+}
+
+/*
+	the release functions free what the matching import function allocates,
+	so a handle can import again, or load a compiled dataset, without leaking
+	the previous arrays
+*/
+void releaseTrainData(Handle *handle) {
+	releaseArray(handle, handle -> trainHead);
+	releaseArray(handle, handle -> compactTrain);
+	releaseArray(handle, handle -> freqRel);
+	releaseArray(handle, handle -> freqEnt);
+	releaseArray(handle, handle -> headPairTotal);
+	releaseArray(handle, handle -> tailPairTotal);
+	releaseArray(handle, handle -> left_mean);
+	releaseArray(handle, handle -> right_mean);
+	releaseArray(handle, handle -> bern_prob);
+	releaseArray(handle, handle -> trainSet.slots);
+	handle -> trainList = handle -> trainHead = NULL;
+	handle -> compactTrain = NULL;
+	handle -> freqRel = handle -> freqEnt = NULL;
+	handle -> headPairTotal = handle -> tailPairTotal = NULL;
+	handle -> left_mean = handle -> right_mean = handle -> bern_prob = NULL;
+	memset(&handle -> trainSet, 0, sizeof(TripleSet));
+	releaseCsrIndex(handle, handle -> headIndex);
+	releaseCsrIndex(handle, handle -> tailIndex);
+	releaseCsrIndex(handle, handle -> relIndex);
+	freeAliasTable(handle -> entityAlias);
+	handle -> trainTotal = 0;
+	handle -> recentTotal = 0;
+}
 
-Triple *trainList;
-Triple *trainHead;
-Triple *trainTail;
-Triple *trainRel;
+void releaseTestData(Handle *handle) {
+	releaseArray(handle, handle -> testList);
+	releaseArray(handle, handle -> validList);
+	releaseArray(handle, handle -> testLef);
+	releaseArray(handle, handle -> testRig);
+	releaseArray(handle, handle -> validLef);
+	releaseArray(handle, handle -> validRig);
+	free(handle -> negTestList);
+	free(handle -> negValidList);
+	free(handle -> testAcc);
+	handle -> testList = handle -> validList = NULL;
+	handle -> testLef = handle -> testRig = handle -> validLef = handle -> validRig = NULL;
+	handle -> negTestList = handle -> negValidList = NULL;
+	handle -> testAcc = NULL;
+	releaseCsrIndex(handle, handle -> knownIndex);
+	releaseCsrIndex(handle, handle -> knownTailIndex);
+	for (INT side = 0; side < 2; side++) {
+		free(handle -> queryOffset[side]);
+		free(handle -> queryTriple[side]);
+		free(handle -> queryRanks[side]);
+		handle -> queryOffset[side] = handle -> queryTriple[side] = NULL;
+		handle -> queryRanks[side] = NULL;
+		handle -> queryTotal[side] = handle -> queryRanked[side] = 0;
+	}
+	handle -> testTotal = handle -> validTotal = 0;
+}
+
+void releaseTypeData(Handle *handle) {
+	releaseArray(handle, handle -> head_lef);
+	releaseArray(handle, handle -> head_rig);
+	releaseArray(handle, handle -> tail_lef);
+	releaseArray(handle, handle -> tail_rig);
+	releaseArray(handle, handle -> head_type);
+	releaseArray(handle, handle -> tail_type);
+	handle -> head_lef = handle -> head_rig = handle -> tail_lef = handle -> tail_rig = NULL;
+	handle -> head_type = handle -> tail_type = NULL;
+	handle -> headTypeTotal = handle -> tailTypeTotal = 0;
+	handle -> typePath = "";
+}
 
-INT *testLef, *testRig;
-INT *validLef, *validRig;
+// the head, tail and relation indexes and the triple set over list, the training triples in cmp_head order
+template <class T>
+void buildTrainIndexes(Handle *handle, T *list) {
+	INT total = handle -> trainTotal;
+	buildCsrIndex(handle -> headIndex, list, total, handle -> entityTotal, tripleHead<T>, tripleRel<T>, tripleTail<T>);
+	T *order = (T *)calloc(total, sizeof(T));
+	std::copy(list, list + total, order);
+	std::sort(order, order + total, T::cmp_tail);
+	buildCsrIndex(handle -> tailIndex, order, total, handle -> entityTotal, tripleTail<T>, tripleRel<T>, tripleHead<T>);
+	std::sort(order, order + total, T::cmp_rel);
+	buildCsrIndex(handle -> relIndex, order, total, handle -> entityTotal, tripleHead<T>, tripleTail<T>, tripleRel<T>);
+	free(order);
+	buildTripleSet(handle -> trainSet, list, total);
+}
 
 extern "C"
-void importTrainFiles() {
+void importTrainFiles(Handle *handle) {
+	if (handle -> mapping != NULL) return;
+	releaseTrainData(handle);
 
 	printf("The toolkit is importing datasets.\n");
-	FILE *fin;
-	int tmp;
+	INT tmp;
 
-	fin = fopen((inPath + "relation2id.txt").c_str(), "r");
-	tmp = fscanf(fin, "%ld", &relationTotal);
-	printf("The total of relations is %ld.\n", relationTotal);
-	fclose(fin);
+	handle -> relationTotal = readTotal(handle -> inPath + "relation2id.txt");
+	printf("The total of relations is %ld.\n", handle -> relationTotal);
 
-	fin = fopen((inPath + "entity2id.txt").c_str(), "r");
-	tmp = fscanf(fin, "%ld", &entityTotal);
-	printf("The total of entities is %ld.\n", entityTotal);
-	fclose(fin);
+	handle -> entityTotal = readTotal(handle -> inPath + "entity2id.txt");
+	printf("The total of entities is %ld.\n", handle -> entityTotal);
 
-	fin = fopen((inPath + "train2id.txt").c_str(), "r");
-	tmp = fscanf(fin, "%ld", &trainTotal);
-	trainList = (Triple *)calloc(trainTotal, sizeof(Triple));
-	trainHead = (Triple *)calloc(trainTotal, sizeof(Triple));
-	trainTail = (Triple *)calloc(trainTotal, sizeof(Triple));
-	trainRel = (Triple *)calloc(trainTotal, sizeof(Triple));
-	freqRel = (INT *)calloc(relationTotal, sizeof(INT));
-	freqEnt = (INT *)calloc(entityTotal, sizeof(INT));
-	for (INT i = 0; i < trainTotal; i++) {
-		tmp = fscanf(fin, "%ld", &trainList[i].h);
-		tmp = fscanf(fin, "%ld", &trainList[i].t);
-		tmp = fscanf(fin, "%ld", &trainList[i].r);
-	}
-	fclose(fin);
-	std::sort(trainList, trainList + trainTotal, Triple::cmp_head);
-	tmp = trainTotal; trainTotal = 1;
-	trainHead[0] = trainTail[0] = trainRel[0] = trainList[0];
-	freqEnt[trainList[0].t] += 1;
-	freqEnt[trainList[0].h] += 1;
-	freqRel[trainList[0].r] += 1;
+	handle -> trainList = readTriples(handle, handle -> inPath + "train2id.txt", handle -> trainTotal);
+	handle -> freqRel = (INT *)calloc(handle -> relationTotal, sizeof(INT));
+	handle -> freqEnt = (INT *)calloc(handle -> entityTotal, sizeof(INT));
+	std::sort(handle -> trainList, handle -> trainList + handle -> trainTotal, Triple::cmp_head);
+	tmp = handle -> trainTotal; handle -> trainTotal = 1;
+	handle -> freqEnt[handle -> trainList[0].t] += 1;
+	handle -> freqEnt[handle -> trainList[0].h] += 1;
+	handle -> freqRel[handle -> trainList[0].r] += 1;
 	for (INT i = 1; i < tmp; i++)
-		if (trainList[i].h != trainList[i - 1].h || trainList[i].r != trainList[i - 1].r || trainList[i].t != trainList[i - 1].t) {
-			trainHead[trainTotal] = trainTail[trainTotal] = trainRel[trainTotal] = trainList[trainTotal] = trainList[i];
-			trainTotal++;
-			freqEnt[trainList[i].t]++;
-			freqEnt[trainList[i].h]++;
-			freqRel[trainList[i].r]++;
+		if (handle -> trainList[i].h != handle -> trainList[i - 1].h || handle -> trainList[i].r != handle -> trainList[i - 1].r || handle -> trainList[i].t != handle -> trainList[i - 1].t) {
+			handle -> trainList[handle -> trainTotal] = handle -> trainList[i];
+			handle -> trainTotal++;
+			handle -> freqEnt[handle -> trainList[i].t]++;
+			handle -> freqEnt[handle -> trainList[i].h]++;
+			handle -> freqRel[handle -> trainList[i].r]++;
 		}
+	// the deduplicated list is already in cmp_head order
+	handle -> trainHead = handle -> trainList;
+	printf("The total of train triples is %ld.\n", handle -> trainTotal);
 
-	std::sort(trainHead, trainHead + trainTotal, Triple::cmp_head);
-	std::sort(trainTail, trainTail + trainTotal, Triple::cmp_tail);
-	std::sort(trainRel, trainRel + trainTotal, Triple::cmp_rel);
-	printf("The total of train triples is %ld.\n", trainTotal);
-
-	lefHead = (INT *)calloc(entityTotal, sizeof(INT));
-	rigHead = (INT *)calloc(entityTotal, sizeof(INT));
-	lefTail = (INT *)calloc(entityTotal, sizeof(INT));
-	rigTail = (INT *)calloc(entityTotal, sizeof(INT));
-	lefRel = (INT *)calloc(entityTotal, sizeof(INT));
-	rigRel = (INT *)calloc(entityTotal, sizeof(INT));
-	memset(rigHead, -1, sizeof(INT)*entityTotal);
-	memset(rigTail, -1, sizeof(INT)*entityTotal);
-	memset(rigRel, -1, sizeof(INT)*entityTotal);
-	for (INT i = 1; i < trainTotal; i++) {
-		if (trainTail[i].t != trainTail[i - 1].t) {
-			rigTail[trainTail[i - 1].t] = i - 1;
-			lefTail[trainTail[i].t] = i;
-		}
-		if (trainHead[i].h != trainHead[i - 1].h) {
-			rigHead[trainHead[i - 1].h] = i - 1;
-			lefHead[trainHead[i].h] = i;
-		}
-		if (trainRel[i].h != trainRel[i - 1].h) {
-			rigRel[trainRel[i - 1].h] = i - 1;
-			lefRel[trainRel[i].h] = i;
-		}
-	}
-	lefHead[trainHead[0].h] = 0;
-	rigHead[trainHead[trainTotal - 1].h] = trainTotal - 1;
-	lefTail[trainTail[0].t] = 0;
-	rigTail[trainTail[trainTotal - 1].t] = trainTotal - 1;
-	lefRel[trainRel[0].h] = 0;
-	rigRel[trainRel[trainTotal - 1].h] = trainTotal - 1;
-
-	left_mean = (REAL *)calloc(relationTotal,sizeof(REAL));
-	right_mean = (REAL *)calloc(relationTotal,sizeof(REAL));
-	for (INT i = 0; i < entityTotal; i++) {
-		for (INT j = lefHead[i] + 1; j <= rigHead[i]; j++)
-			if (trainHead[j].r != trainHead[j - 1].r)
-				left_mean[trainHead[j].r] += 1.0;
-		if (lefHead[i] <= rigHead[i])
-			left_mean[trainHead[lefHead[i]].r] += 1.0;
-		for (INT j = lefTail[i] + 1; j <= rigTail[i]; j++)
-			if (trainTail[j].r != trainTail[j - 1].r)
-				right_mean[trainTail[j].r] += 1.0;
-		if (lefTail[i] <= rigTail[i])
-			right_mean[trainTail[lefTail[i]].r] += 1.0;
-	}
-	for (INT i = 0; i < relationTotal; i++) {
-		left_mean[i] = freqRel[i] / left_mean[i];
-		right_mean[i] = freqRel[i] / right_mean[i];
+	handle -> left_mean = (REAL *)calloc(handle -> relationTotal,sizeof(REAL));
+	handle -> right_mean = (REAL *)calloc(handle -> relationTotal,sizeof(REAL));
+	if (handle -> compact) {
+		handle -> compactTrain = compactCopy(handle -> trainList, handle -> trainTotal);
+		free(handle -> trainList);
+		handle -> trainList = handle -> trainHead = NULL;
+		buildTrainIndexes(handle, handle -> compactTrain);
+	} else {
+		buildTrainIndexes(handle, handle -> trainHead);
 	}
+	handle -> headPairTotal = (INT *)calloc(handle -> relationTotal, sizeof(INT));
+	handle -> tailPairTotal = (INT *)calloc(handle -> relationTotal, sizeof(INT));
+	for (INT i = 0; i < handle -> headIndex.pairs; i++)
+		handle -> headPairTotal[handle -> headIndex.pairKey[i]]++;
+	for (INT i = 0; i < handle -> tailIndex.pairs; i++)
+		handle -> tailPairTotal[handle -> tailIndex.pairKey[i]]++;
+	handle -> bern_prob = (REAL *)calloc(handle -> relationTotal,sizeof(REAL));
+	for (INT i = 0; i < handle -> relationTotal; i++)
+		bernStatistics(handle, i);
+	if (handle -> negMode == 1)
+		buildNegTable(handle);
 }
 
-Triple *testList;
-Triple *validList;
-Triple *tripleList;
-
+/*
+	the filter indexes knownIndex and knownTailIndex are the training headIndex
+	and tailIndex merged with the valid and test triples, so the training files
+	are only read here when importTrainFiles has not run.
+*/
 extern "C"
-void importTestFiles() {
-    FILE *fin;
-    INT tmp;
-    
-	fin = fopen((inPath + "relation2id.txt").c_str(), "r");
-    tmp = fscanf(fin, "%ld", &relationTotal);
-    fclose(fin);
+void importTestFiles(Handle *handle) {
+    if (handle -> mapping != NULL) return;
+    releaseTestData(handle);
+    bool trained = handle -> headIndex.rowOffset != NULL;
 
-	fin = fopen((inPath + "entity2id.txt").c_str(), "r");
-    tmp = fscanf(fin, "%ld", &entityTotal);
-    fclose(fin);
-
-    FILE* f_kb1 = fopen((inPath + "test2id.txt").c_str(), "r");
-    FILE* f_kb2 = fopen((inPath + "train2id.txt").c_str(), "r");
-    FILE* f_kb3 = fopen((inPath + "valid2id.txt").c_str(), "r");
-    tmp = fscanf(f_kb1, "%ld", &testTotal);
-    tmp = fscanf(f_kb2, "%ld", &trainTotal);
-    tmp = fscanf(f_kb3, "%ld", &validTotal);
-    tripleTotal = testTotal + trainTotal + validTotal;
-    testList = (Triple *)calloc(testTotal, sizeof(Triple));
-    validList = (Triple *)calloc(validTotal, sizeof(Triple));
-    tripleList = (Triple *)calloc(tripleTotal, sizeof(Triple));
-    for (INT i = 0; i < testTotal; i++) {
-        tmp = fscanf(f_kb1, "%ld", &testList[i].h);
-        tmp = fscanf(f_kb1, "%ld", &testList[i].t);
-        tmp = fscanf(f_kb1, "%ld", &testList[i].r);
-        tripleList[i] = testList[i];
-    }
-    for (INT i = 0; i < trainTotal; i++) {
-        tmp = fscanf(f_kb2, "%ld", &tripleList[i + testTotal].h);
-        tmp = fscanf(f_kb2, "%ld", &tripleList[i + testTotal].t);
-        tmp = fscanf(f_kb2, "%ld", &tripleList[i + testTotal].r);
+    if (!trained) {
+        handle -> relationTotal = readTotal(handle -> inPath + "relation2id.txt");
+        handle -> entityTotal = readTotal(handle -> inPath + "entity2id.txt");
     }
-    for (INT i = 0; i < validTotal; i++) {
-        tmp = fscanf(f_kb3, "%ld", &tripleList[i + testTotal + trainTotal].h);
-        tmp = fscanf(f_kb3, "%ld", &tripleList[i + testTotal + trainTotal].t);
-        tmp = fscanf(f_kb3, "%ld", &tripleList[i + testTotal + trainTotal].r);
-        validList[i] = tripleList[i + testTotal + trainTotal];
+
+    handle -> testList = readTriples(handle, handle -> inPath + "test2id.txt", handle -> testTotal);
+    handle -> validList = readTriples(handle, handle -> inPath + "valid2id.txt", handle -> validTotal);
+    INT trainLines = trained ? handle -> trainTotal : 0;
+    Triple *trainLinesList = trained ? NULL : readTriples(handle, handle -> inPath + "train2id.txt", trainLines);
+    handle -> tripleTotal = handle -> testTotal + trainLines + handle -> validTotal;
+    INT extraTotal = trained ? handle -> testTotal + handle -> validTotal : handle -> tripleTotal;
+    Triple *extraList = (Triple *)calloc(extraTotal + 1, sizeof(Triple));
+    std::copy(handle -> testList, handle -> testList + handle -> testTotal, extraList);
+    std::copy(handle -> validList, handle -> validList + handle -> validTotal, extraList + handle -> testTotal);
+    if (!trained) {
+        std::copy(trainLinesList, trainLinesList + trainLines, extraList + handle -> testTotal + handle -> validTotal);
+        free(trainLinesList);
     }
-    fclose(f_kb1);
-    fclose(f_kb2);
-    fclose(f_kb3);
 
-    std::sort(tripleList, tripleList + tripleTotal, Triple::cmp_head);
-    std::sort(testList, testList + testTotal, Triple::cmp_rel2);
-    std::sort(validList, validList + validTotal, Triple::cmp_rel2);
-    printf("The total of test triples is %ld.\n", testTotal);
-    printf("The total of valid triples is %ld.\n", validTotal);
+    std::sort(extraList, extraList + extraTotal, Triple::cmp_head);
+    if (trained)
+        mergeCsrIndex(handle -> knownIndex, handle -> headIndex, handle -> entityTotal, extraList, extraTotal, tripleHead<Triple>, tripleRel<Triple>, tripleTail<Triple>);
+    else
+        buildCsrIndex(handle -> knownIndex, extraList, extraTotal, handle -> entityTotal, tripleHead<Triple>, tripleRel<Triple>, tripleTail<Triple>);
+    std::sort(extraList, extraList + extraTotal, Triple::cmp_tail);
+    if (trained)
+        mergeCsrIndex(handle -> knownTailIndex, handle -> tailIndex, handle -> entityTotal, extraList, extraTotal, tripleTail<Triple>, tripleRel<Triple>, tripleHead<Triple>);
+    else
+        buildCsrIndex(handle -> knownTailIndex, extraList, extraTotal, handle -> entityTotal, tripleTail<Triple>, tripleRel<Triple>, tripleHead<Triple>);
+    free(extraList);
+    std::sort(handle -> testList, handle -> testList + handle -> testTotal, Triple::cmp_rel2);
+    std::sort(handle -> validList, handle -> validList + handle -> validTotal, Triple::cmp_rel2);
+    printf("The total of test triples is %ld.\n", handle -> testTotal);
+    printf("The total of valid triples is %ld.\n", handle -> validTotal);
 
-    testLef = (INT *)calloc(relationTotal, sizeof(INT));
-	testRig = (INT *)calloc(relationTotal, sizeof(INT));
-	memset(testLef, -1, sizeof(INT)*relationTotal);
-	memset(testRig, -1, sizeof(INT)*relationTotal);
-	for (INT i = 1; i < testTotal; i++) {
-		if (testList[i].r != testList[i-1].r) {
-			testRig[testList[i-1].r] = i - 1;
-			testLef[testList[i].r] = i;
+    handle -> testLef = (INT *)calloc(handle -> relationTotal, sizeof(INT));
+	handle -> testRig = (INT *)calloc(handle -> relationTotal, sizeof(INT));
+	memset(handle -> testLef, -1, sizeof(INT)*handle -> relationTotal);
+	memset(handle -> testRig, -1, sizeof(INT)*handle -> relationTotal);
+	for (INT i = 1; i < handle -> testTotal; i++) {
+		if (handle -> testList[i].r != handle -> testList[i-1].r) {
+			handle -> testRig[handle -> testList[i-1].r] = i - 1;
+			handle -> testLef[handle -> testList[i].r] = i;
 		}
 	}
-	testLef[testList[0].r] = 0;
-	testRig[testList[testTotal - 1].r] = testTotal - 1;
+	handle -> testLef[handle -> testList[0].r] = 0;
+	handle -> testRig[handle -> testList[handle -> testTotal - 1].r] = handle -> testTotal - 1;
 
 
-	validLef = (INT *)calloc(relationTotal, sizeof(INT));
-	validRig = (INT *)calloc(relationTotal, sizeof(INT));
-	memset(validLef, -1, sizeof(INT)*relationTotal);
-	memset(validRig, -1, sizeof(INT)*relationTotal);
-	for (INT i = 1; i < validTotal; i++) {
-		if (validList[i].r != validList[i-1].r) {
-			validRig[validList[i-1].r] = i - 1;
-			validLef[validList[i].r] = i;
+	handle -> validLef = (INT *)calloc(handle -> relationTotal, sizeof(INT));
+	handle -> validRig = (INT *)calloc(handle -> relationTotal, sizeof(INT));
+	memset(handle -> validLef, -1, sizeof(INT)*handle -> relationTotal);
+	memset(handle -> validRig, -1, sizeof(INT)*handle -> relationTotal);
+	for (INT i = 1; i < handle -> validTotal; i++) {
+		if (handle -> validList[i].r != handle -> validList[i-1].r) {
+			handle -> validRig[handle -> validList[i-1].r] = i - 1;
+			handle -> validLef[handle -> validList[i].r] = i;
 		}
 	}
-	validLef[validList[0].r] = 0;
-	validRig[validList[validTotal - 1].r] = validTotal - 1;
+	handle -> validLef[handle -> validList[0].r] = 0;
+	handle -> validRig[handle -> validList[handle -> validTotal - 1].r] = handle -> validTotal - 1;
 }
 
-INT* head_lef;
-INT* head_rig;
-INT* tail_lef;
-INT* tail_rig;
-INT* head_type;
-INT* tail_type;
-
+// typePath is the folder whose type_constrain.txt is loaded; training and testing share one copy
 extern "C"
-void importTypeFiles() {
+void importTypeFiles(Handle *handle) {
+	if (handle -> typePath == handle -> inPath) return;
+	releaseTypeData(handle);
+	handle -> typePath = handle -> inPath;
 
-	head_lef = (INT *)calloc(relationTotal, sizeof(INT));
-	head_rig = (INT *)calloc(relationTotal, sizeof(INT));
-	tail_lef = (INT *)calloc(relationTotal, sizeof(INT));
-	tail_rig = (INT *)calloc(relationTotal, sizeof(INT));
+	handle -> head_lef = (INT *)calloc(handle -> relationTotal, sizeof(INT));
+	handle -> head_rig = (INT *)calloc(handle -> relationTotal, sizeof(INT));
+	handle -> tail_lef = (INT *)calloc(handle -> relationTotal, sizeof(INT));
+	handle -> tail_rig = (INT *)calloc(handle -> relationTotal, sizeof(INT));
 
+	// one pass over the values: the relation count, then per relation a head line and a tail line of "rel tot e_1 ... e_tot"
+	std::vector<INT> values;
+	if (!parseIntegers(handle, handle -> inPath + "type_constrain.txt", values))
+		printf("Cannot read %s.\n", (handle -> inPath + "type_constrain.txt").c_str());
+	handle -> head_type = (INT *)calloc(values.size() + 1, sizeof(INT));
+	handle -> tail_type = (INT *)calloc(values.size() + 1, sizeof(INT));
 	INT total_lef = 0;
-    INT total_rig = 0;
-    FILE* f_type = fopen((inPath + "type_constrain.txt").c_str(),"r");
-    INT tmp;
-    tmp = fscanf(f_type, "%ld", &tmp);
-    for (INT i = 0; i < relationTotal; i++) {
-        INT rel, tot;
-        tmp = fscanf(f_type, "%ld %ld", &rel, &tot);
-        for (INT j = 0; j < tot; j++) {
-            tmp = fscanf(f_type, "%ld", &tmp);
-            total_lef++;
-        }
-        tmp = fscanf(f_type, "%ld%ld", &rel, &tot);
-        for (INT j = 0; j < tot; j++) {
-            tmp = fscanf(f_type, "%ld", &tmp);
-            total_rig++;
-        }
-    }
-    fclose(f_type);
-
-	head_type = (INT *)calloc(total_lef, sizeof(INT));
-	tail_type = (INT *)calloc(total_rig, sizeof(INT));
-	total_lef = 0;
-    total_rig = 0;
-    f_type = fopen((inPath + "type_constrain.txt").c_str(),"r");
-    tmp = fscanf(f_type, "%ld", &tmp);
-    for (INT i = 0; i < relationTotal; i++) {
-        INT rel, tot;
-        tmp = fscanf(f_type, "%ld%ld", &rel, &tot);
-        head_lef[rel] = total_lef;
-        for (INT j = 0; j < tot; j++) {
-            tmp = fscanf(f_type, "%ld", &head_type[total_lef]);
-            total_lef++;
-        }
-        head_rig[rel] = total_lef;
-        std::sort(head_type + head_lef[rel], head_type + head_rig[rel]);
-        tmp = fscanf(f_type, "%ld%ld", &rel, &tot);
-        tail_lef[rel] = total_rig;
-        for (INT j = 0; j < tot; j++) {
-            tmp = fscanf(f_type, "%ld", &tail_type[total_rig]);
-            total_rig++;
-        }
-        tail_rig[rel] = total_rig;
-        std::sort(tail_type + tail_lef[rel], tail_type + tail_rig[rel]);
-    }
-    fclose(f_type);
+	INT total_rig = 0;
+	size_t pos = 1;
+	for (INT i = 0; i < handle -> relationTotal && pos + 1 < values.size(); i++) {
+		for (INT side = 0; side < 2 && pos + 1 < values.size(); side++) {
+			INT rel = values[pos], tot = values[pos + 1];
+			pos += 2;
+			if (tot > (INT)(values.size() - pos)) tot = values.size() - pos;
+			INT *type = side == 0 ? handle -> head_type : handle -> tail_type;
+			INT &total = side == 0 ? total_lef : total_rig;
+			INT lef = total;
+			std::copy(values.begin() + pos, values.begin() + pos + tot, type + total);
+			total += tot;
+			pos += tot;
+			std::sort(type + lef, type + total);
+			if (rel < 0 || rel >= handle -> relationTotal) continue;
+			(side == 0 ? handle -> head_lef : handle -> tail_lef)[rel] = lef;
+			(side == 0 ? handle -> head_rig : handle -> tail_rig)[rel] = total;
+		}
+	}
+	handle -> head_type = (INT *)realloc(handle -> head_type, (total_lef + 1) * sizeof(INT));
+	handle -> tail_type = (INT *)realloc(handle -> tail_type, (total_rig + 1) * sizeof(INT));
+	handle -> headTypeTotal = total_lef;
+	handle -> tailTypeTotal = total_rig;
 }
 
 
@@ -4,94 +4,259 @@
 #define REAL float
 #include <cstring>
 #include <cstdio>
+#include <cstdlib>
 #include <string>
+#include <pthread.h>
+#include "Triple.h"
 
-std::string inPath = "../data/FB15K/";
-std::string outPath = "../data/FB15K/";
+/*=====================================================================================
+state of one dataset, its samplers and its evaluation.
+Every exported function takes the Handle returned by createHandle() as its
+first argument, so several datasets can be loaded, sampled and evaluated in
+one process, concurrently from different threads.
+======================================================================================*/
+// Graph.h: edges grouped by a row entity, then by a key id
+struct CsrIndex {
+	INT rows, pairs, edges;
+	INT *rowOffset;
+	unsigned int *pairKey;
+	INT *pairOffset;
+	unsigned int *neighbor;
+};
+
+struct TripleSet {
+	Triple *list;
+	CompactTriple *compactList;
+	unsigned int *slots;
+	unsigned long long mask;
+};
+
+struct AliasTable {
+	REAL *prob;
+	INT *alias;
+	INT size;
+};
+
+struct RandomState {
+	unsigned long long stream;
+	unsigned int position;
+	unsigned int counter;
+	unsigned int buffer[4];
+	INT left;
+};
+
+struct HardCache {
+	unsigned long long *keys;
+	INT *entities;
+	INT *counts;
+	INT slotTotal;
+	INT width;
+	unsigned long long lookups, hits, inserts, evictions;
+	pthread_rwlock_t lock;
+};
+
+struct Shard {
+	INT lo, hi, need;
+	INT cursor;
+	INT offset;
+	INT *blocks;
+	INT blockTotal;
+};
+
+// hit@10, hit@3, hit@1, rank and reciprocal rank sums of one ranking setting
+struct RankStats {
+	REAL tot, tot3, tot1, rank, reci_rank;
+};
+
+struct SamplerPool;
+struct RankPool;
+struct IngestState;
+
+struct Handle {
+	std::string inPath;
+	std::string outPath;
+	INT workThreads;
+
+	INT relationTotal;
+	INT entityTotal;
+	INT tripleTotal;
+	INT testTotal;
+	INT trainTotal;
+	INT validTotal;
+
+	INT bernFlag;
+
+	// Random.h
+	RandomState *next_random;
+	INT mainRand;
+	unsigned long long randomSeed;
+	unsigned long long batchCounter;
+
+	// Reader.h
+	INT *freqRel, *freqEnt;
+	INT *headPairTotal, *tailPairTotal;
+	REAL *left_mean, *right_mean;
+	REAL *bern_prob;
+	Triple *trainList;
+	Triple *trainHead;
+	// Storage.h, compact mode: compactTrain replaces trainHead
+	INT compact;
+	CompactTriple *compactTrain;
+	INT *testLef, *testRig;
+	INT *validLef, *validRig;
+	CsrIndex headIndex, tailIndex, relIndex, knownIndex, knownTailIndex;
+	TripleSet trainSet;
+	INT negMode;
+	REAL negPower;
+	AliasTable entityAlias;
+	Triple *testList;
+	Triple *validList;
+	INT *head_lef, *head_rig;
+	INT *tail_lef, *tail_rig;
+	INT *head_type, *tail_type;
+	INT headTypeTotal, tailTypeTotal;
+	std::string typePath;
+
+	// Append.h, the triples appended since the last bias window ended
+	Triple *recentList;
+	INT recentTotal;
+	REAL recentRatio;
+	unsigned long long recentUntil;
+
+	// Ingest.h, the names of the raw files ingested so far
+	IngestState *ingest;
+
+	// Dataset.h, the compiled dataset the arrays above point into, if any
+	void *mapping;
+	unsigned long long mappingSize;
+	INT detached;
+
+	// Corrupt.h and Cache.h
+	REAL typeRatio;
+	REAL hardRatio;
+	HardCache hardCache;
+
+	// Order.h
+	INT sampleMode;
+	INT *trainOrder;
+	INT orderTotal;
+	INT orderMode;
+	Shard *shards;
+	INT shardTotal;
+
+	// Test.h, link prediction: linkStats[side][constrain][filter], side 0 ranks heads
+	INT lastHead, lastTail;
+	RankStats linkStats[2][2][2];
+	// Test.h, deduplicated link prediction: the test triples asking unique query q of a side are
+	// queryTriple[side][queryOffset[side][q] .. queryOffset[side][q + 1]); their ranks wait in
+	// queryRanks[side] until all queryRanked[side] of them are known
+	INT queryTotal[2], queryRanked[2];
+	INT *queryOffset[2], *queryTriple[2];
+	INT (*queryRanks[2])[2][2];
+	RankPool *rankPool;
+	Triple *negTestList;
+	Triple *negValidList;
+	REAL *testAcc;
+
+	// Base.cpp
+	SamplerPool *samplerPool;
+};
 
 extern "C"
-void setInPath(char *path) {
+Handle* createHandle() {
+	Handle *handle = new Handle();
+	handle -> inPath = "../data/FB15K/";
+	handle -> outPath = "../data/FB15K/";
+	handle -> workThreads = 1;
+	handle -> negPower = 0.75;
+	// writers first: the sampler threads keep reading while updateHardCache waits
+	pthread_rwlockattr_t attr;
+	pthread_rwlockattr_init(&attr);
+	pthread_rwlockattr_setkind_np(&attr, PTHREAD_RWLOCK_PREFER_WRITER_NONRECURSIVE_NP);
+	pthread_rwlock_init(&handle -> hardCache.lock, &attr);
+	pthread_rwlockattr_destroy(&attr);
+	return handle;
+}
+
+// free an array of the handle; arrays inside a mapped compiled dataset (Dataset.h) go with the mapping
+void releaseArray(Handle *handle, void *data) {
+	char *p = (char *)data, *base = (char *)handle -> mapping;
+	if (base != NULL && p >= base && p < base + handle -> mappingSize) return;
+	free(data);
+}
+
+extern "C"
+void setInPath(Handle *handle, char *path) {
 	INT len = strlen(path);
-	inPath = "";
+	handle -> inPath = "";
 	for (INT i = 0; i < len; i++)
-		inPath = inPath + path[i];
-	printf("Input Files Path : %s\n", inPath.c_str());
+		handle -> inPath = handle -> inPath + path[i];
+	printf("Input Files Path : %s\n", handle -> inPath.c_str());
 }
 
 extern "C"
-void setOutPath(char *path) {
+void setOutPath(Handle *handle, char *path) {
 	INT len = strlen(path);
-	outPath = "";
+	handle -> outPath = "";
 	for (INT i = 0; i < len; i++)
-		outPath = outPath + path[i];
-	printf("Output Files Path : %s\n", outPath.c_str());
+		handle -> outPath = handle -> outPath + path[i];
+	printf("Output Files Path : %s\n", handle -> outPath.c_str());
 }
 
 /*
 ============================================================
 */
 
-INT workThreads = 1;
-
 extern "C"
-void setWorkThreads(INT threads) {
-	workThreads = threads;
+void setWorkThreads(Handle *handle, INT threads) {
+	handle -> workThreads = threads;
 }
 
 extern "C"
-INT getWorkThreads() {
-	return workThreads;
+INT getWorkThreads(Handle *handle) {
+	return handle -> workThreads;
 }
 
 /*
 ============================================================
 */
 
-INT relationTotal = 0;
-INT entityTotal = 0;
-INT tripleTotal = 0;
-INT testTotal = 0;
-INT trainTotal = 0;
-INT validTotal = 0;
-
 extern "C"
-INT getEntityTotal() {
-	return entityTotal;
+INT getEntityTotal(Handle *handle) {
+	return handle -> entityTotal;
 }
 
 extern "C"
-INT getRelationTotal() {
-	return relationTotal;
+INT getRelationTotal(Handle *handle) {
+	return handle -> relationTotal;
 }
 
 extern "C"
-INT getTripleTotal() {
-	return tripleTotal;
+INT getTripleTotal(Handle *handle) {
+	return handle -> tripleTotal;
 }
 
 extern "C"
-INT getTrainTotal() {
-	return trainTotal;
+INT getTrainTotal(Handle *handle) {
+	return handle -> trainTotal;
 }
 
 extern "C"
-INT getTestTotal() {
-	return testTotal;
+INT getTestTotal(Handle *handle) {
+	return handle -> testTotal;
 }
 
 extern "C"
-INT getValidTotal() {
-	return validTotal;
+INT getValidTotal(Handle *handle) {
+	return handle -> validTotal;
 }
 /*
 ============================================================
 */
 
-INT bernFlag = 0;
-
 extern "C"
-void setBern(INT con) {
-	bernFlag = con;
+void setBern(Handle *handle, INT con) {
+	handle -> bernFlag = con;
 }
 
 #endif
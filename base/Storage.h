@@ -0,0 +1,84 @@
+#ifndef STORAGE_H
+#define STORAGE_H
+#include "Setting.h"
+#include "Triple.h"
+#include "Graph.h"
+
+/*=====================================================================================
+training triple storage.
+In the default (wide) mode the training triples are kept as one Triple array,
+trainHead sorted by cmp_head, which trainList shares. In compact mode
+(setCompactStorage(1) before importTrainFiles) ids are 32 bit and
+compactTrain replaces it. The orderings by tail and by relation live in the
+CSR indexes of Graph.h in both modes; trainTriple() returns the same values
+in both modes, so sampling and evaluation results do not depend on the mode.
+getMemoryReport() measures the loaded storage and getBaselineMemoryReport()
+what the original layout, four train copies and a tripleList, would hold.
+======================================================================================*/
+extern "C"
+void setCompactStorage(Handle *handle, INT flag) {
+	handle -> compact = flag;
+}
+
+extern "C"
+INT getCompactStorage(Handle *handle) {
+	return handle -> compact;
+}
+
+// i-th training triple in cmp_head order
+inline Triple trainTriple(Handle *handle, INT i) {
+	if (handle -> compact) {
+		const CompactTriple &cur = handle -> compactTrain[i];
+		Triple res = {cur.h, cur.r, cur.t};
+		return res;
+	}
+	return handle -> trainHead[i];
+}
+
+CompactTriple *compactCopy(const Triple *list, INT total) {
+	CompactTriple *res = (CompactTriple *)calloc(total > 0 ? total : 1, sizeof(CompactTriple));
+	for (INT i = 0; i < total; i++) {
+		res[i].h = list[i].h;
+		res[i].r = list[i].r;
+		res[i].t = list[i].t;
+	}
+	return res;
+}
+
+/*
+	bytes held by the triple storage, in order: training triples, the head,
+	tail and relation CSR indexes, the training triple set, the filter indexes
+	(knownIndex and knownTailIndex) and their total.
+*/
+extern "C"
+void getMemoryReport(Handle *handle, INT *bytes) {
+	for (INT i = 0; i < 5; i++)
+		bytes[i] = 0;
+	if (handle -> compact)
+		bytes[0] = handle -> compactTrain != NULL ? handle -> trainTotal * sizeof(CompactTriple) : 0;
+	else
+		bytes[0] = handle -> trainHead != NULL ? handle -> trainTotal * sizeof(Triple) : 0;
+	bytes[1] = csrBytes(handle -> headIndex) + csrBytes(handle -> tailIndex) + csrBytes(handle -> relIndex);
+	if (handle -> trainSet.slots != NULL)
+		bytes[2] = (handle -> trainSet.mask + 1) * sizeof(unsigned int);
+	bytes[3] = csrBytes(handle -> knownIndex) + csrBytes(handle -> knownTailIndex);
+	for (INT i = 0; i < 4; i++)
+		bytes[4] += bytes[i];
+}
+
+/*
+	the getMemoryReport rows of the original layout for the loaded dataset:
+	trainList, trainHead, trainTail and trainRel as full Triple copies, the
+	lefHead .. rigRel ranges over entities, no triple set and tripleList, a
+	fifth copy of the train triples with the valid and test ones.
+*/
+extern "C"
+void getBaselineMemoryReport(Handle *handle, INT *bytes) {
+	bytes[0] = 4 * handle -> trainTotal * sizeof(Triple);
+	bytes[1] = 6 * handle -> entityTotal * sizeof(INT);
+	bytes[2] = 0;
+	bytes[3] = (handle -> trainTotal + handle -> validTotal + handle -> testTotal) * sizeof(Triple);
+	bytes[4] = bytes[0] + bytes[1] + bytes[2] + bytes[3];
+}
+
+#endif
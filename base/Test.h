@@ -3,319 +3,555 @@
 #include "Setting.h"
 #include "Reader.h"
 #include "Corrupt.h"
+#include <algorithm>
+#include <vector>
+#include <pthread.h>
 
 /*=====================================================================================
 link prediction
 ======================================================================================*/
-INT lastHead = 0;
-INT lastTail = 0;
-REAL l1_filter_tot = 0, l1_tot = 0, r1_tot = 0, r1_filter_tot = 0, l_tot = 0, r_tot = 0, l_filter_rank = 0, l_rank = 0, l_filter_reci_rank = 0, l_reci_rank = 0;
-REAL l3_filter_tot = 0, l3_tot = 0, r3_tot = 0, r3_filter_tot = 0, l_filter_tot = 0, r_filter_tot = 0, r_filter_rank = 0, r_rank = 0, r_filter_reci_rank = 0, r_reci_rank = 0;
+void addRank(RankStats &stats, INT s) {
+    if (s < 10) stats.tot += 1;
+    if (s < 3) stats.tot3 += 1;
+    if (s < 1) stats.tot1 += 1;
+    stats.rank += (1+s);
+    stats.reci_rank += 1.0/(1+s);
+}
+
+RankStats meanRank(const RankStats &stats, INT total) {
+    RankStats res = stats;
+    res.tot /= total;
+    res.tot3 /= total;
+    res.tot1 /= total;
+    res.rank /= total;
+    res.reci_rank /= total;
+    return res;
+}
+
+// start a new link prediction run: testHead and testTail begin again at the first test triple
+extern "C"
+void resetLinkPrediction(Handle *handle) {
+    handle -> lastHead = 0;
+    handle -> lastTail = 0;
+    memset(handle -> linkStats, 0, sizeof(handle -> linkStats));
+    handle -> queryRanked[0] = handle -> queryRanked[1] = 0;
+}
 
-REAL l1_filter_tot_constrain = 0, l1_tot_constrain = 0, r1_tot_constrain = 0, r1_filter_tot_constrain = 0, l_tot_constrain = 0, r_tot_constrain = 0, l_filter_rank_constrain = 0, l_rank_constrain = 0, l_filter_reci_rank_constrain = 0, l_reci_rank_constrain = 0;
-REAL l3_filter_tot_constrain = 0, l3_tot_constrain = 0, r3_tot_constrain = 0, r3_filter_tot_constrain = 0, l_filter_tot_constrain = 0, r_filter_tot_constrain = 0, r_filter_rank_constrain = 0, r_rank_constrain = 0, r_filter_reci_rank_constrain = 0, r_reci_rank_constrain = 0;
+// linkStats[side][constrain][filter] as 40 values: hit@10, hit@3, hit@1, rank and
+// reciprocal rank sums of each setting, divided by the number of ranked triples
 extern "C"
-void getHeadBatch(INT *ph, INT *pt, INT *pr) {
-    for (INT i = 0; i < entityTotal; i++) {
+void getLinkStats(Handle *handle, REAL *out) {
+    for (INT side = 0; side < 2; side++)
+        for (INT constrain = 0; constrain < 2; constrain++)
+            for (INT filter = 0; filter < 2; filter++) {
+                INT total = side ? handle -> lastTail : handle -> lastHead;
+                RankStats res = total ? meanRank(handle -> linkStats[side][constrain][filter], total) : RankStats();
+                REAL *cur = out + ((side * 2 + constrain) * 2 + filter) * 5;
+                cur[0] = res.tot, cur[1] = res.tot3, cur[2] = res.tot1, cur[3] = res.rank, cur[4] = res.reci_rank;
+            }
+}
+
+extern "C"
+void getHeadBatch(Handle *handle, INT *ph, INT *pt, INT *pr) {
+    for (INT i = 0; i < handle -> entityTotal; i++) {
         ph[i] = i;
-        pt[i] = testList[lastHead].t;
-        pr[i] = testList[lastHead].r;
+        pt[i] = handle -> testList[handle -> lastHead].t;
+        pr[i] = handle -> testList[handle -> lastHead].r;
     }
 }
 
 extern "C"
-void getTailBatch(INT *ph, INT *pt, INT *pr) {
-    for (INT i = 0; i < entityTotal; i++) {
-        ph[i] = testList[lastTail].h;
+void getTailBatch(Handle *handle, INT *ph, INT *pt, INT *pr) {
+    for (INT i = 0; i < handle -> entityTotal; i++) {
+        ph[i] = handle -> testList[handle -> lastTail].h;
         pt[i] = i;
-        pr[i] = testList[lastTail].r;
+        pr[i] = handle -> testList[handle -> lastTail].r;
     }
 }
 
-extern "C"
-void testHead(REAL *con) {
-    INT h = testList[lastHead].h;
-    INT t = testList[lastHead].t;
-    INT r = testList[lastHead].r;
-    INT lef = head_lef[r], rig = head_rig[r];
+/*
+	the known true answers of a query that outscore its true entity. The raw
+	scan ranks against every entity; answers are the train, valid and test
+	entities of the same (h, r) or (r, t) pair, from knownIndex or
+	knownTailIndex, and type[lef, rig) is the sorted type constraint of r. The
+	filtered ranks are the raw ones less these counts, so the filter costs
+	O(answers) per query instead of a lookup per better candidate.
+*/
+void countAnswers(const CsrIndex &index, INT row, INT r, INT truth, REAL *con, INT *type, INT lef, INT rig, INT better[2]) {
+    better[0] = better[1] = 0;
+    INT ll, rr;
+    if (!findEdges(index, row, r, ll, rr)) return;
+    REAL minimal = con[truth];
+    for (INT k = ll; k <= rr; k++) {
+        INT j = index.neighbor[k];
+        if (j == truth || !(con[j] < minimal)) continue;
+        better[0] += 1;
+        if (std::binary_search(type + lef, type + rig, j))
+            better[1] += 1;
+    }
+}
 
+// raw and filtered ranks of the true head of query among all entities, without and with the type constraint
+void rankHead(Handle *handle, const Triple &query, REAL *con, INT s[2][2]) {
+    INT h = query.h, t = query.t, r = query.r;
+    INT lef = handle -> head_lef[r], rig = handle -> head_rig[r];
     REAL minimal = con[h];
-    INT l_s = 0;
-    INT l_filter_s = 0;
-    INT l_s_constrain = 0;
-    INT l_filter_s_constrain = 0;
-
-    for (INT j = 0; j < entityTotal; j++) {
+    s[0][0] = s[1][0] = 0;
+    for (INT j = 0; j < handle -> entityTotal; j++) {
         if (j != h) {
             REAL value = con[j];
-            if (value < minimal) {
-                l_s += 1;
-                if (not _find(j, t, r))
-                    l_filter_s += 1;
-            }
-            while (lef < rig && head_type[lef] < j) lef ++;
-            if (lef < rig && j == head_type[lef]) {
-                if (value < minimal) {
-                    l_s_constrain += 1;
-                    if (not _find(j, t, r)) {
-                        l_filter_s_constrain += 1;
-                    }
-                }  
-            }
+            if (value < minimal)
+                s[0][0] += 1;
+            while (lef < rig && handle -> head_type[lef] < j) lef ++;
+            if (lef < rig && j == handle -> head_type[lef] && value < minimal)
+                s[1][0] += 1;
         }
     }
-
-    if (l_filter_s < 10) l_filter_tot += 1;
-    if (l_s < 10) l_tot += 1;
-    if (l_filter_s < 3) l3_filter_tot += 1;
-    if (l_s < 3) l3_tot += 1;
-    if (l_filter_s < 1) l1_filter_tot += 1;
-    if (l_s < 1) l1_tot += 1;
-
-    if (l_filter_s_constrain < 10) l_filter_tot_constrain += 1;
-    if (l_s_constrain < 10) l_tot_constrain += 1;
-    if (l_filter_s_constrain < 3) l3_filter_tot_constrain += 1;
-    if (l_s_constrain < 3) l3_tot_constrain += 1;
-    if (l_filter_s_constrain < 1) l1_filter_tot_constrain += 1;
-    if (l_s_constrain < 1) l1_tot_constrain += 1;
-
-    l_filter_rank += (l_filter_s+1);
-    l_rank += (1+l_s);
-    l_filter_reci_rank += 1.0/(l_filter_s+1);
-    l_reci_rank += 1.0/(l_s+1);
-
-    l_filter_rank_constrain += (l_filter_s_constrain+1);
-    l_rank_constrain += (1+l_s_constrain);
-    l_filter_reci_rank_constrain += 1.0/(l_filter_s_constrain+1);
-    l_reci_rank_constrain += 1.0/(l_s_constrain+1);
-
-    lastHead++;
-
-    printf("l_filter_s: %ld\n", l_filter_s);
-    printf("%f %f %f %f \n", l_tot / lastHead, l_filter_tot / lastHead, l_rank / lastHead, l_filter_rank / lastHead);
+    INT better[2];
+    countAnswers(handle -> knownTailIndex, t, r, h, con, handle -> head_type, handle -> head_lef[r], handle -> head_rig[r], better);
+    s[0][1] = s[0][0] - better[0];
+    s[1][1] = s[1][0] - better[1];
 }
 
-extern "C"
-void testTail(REAL *con) {
-    INT h = testList[lastTail].h;
-    INT t = testList[lastTail].t;
-    INT r = testList[lastTail].r;
-    INT lef = tail_lef[r], rig = tail_rig[r];
+void rankTail(Handle *handle, const Triple &query, REAL *con, INT s[2][2]) {
+    INT h = query.h, t = query.t, r = query.r;
+    INT lef = handle -> tail_lef[r], rig = handle -> tail_rig[r];
     REAL minimal = con[t];
-    INT r_s = 0;
-    INT r_filter_s = 0;
-    INT r_s_constrain = 0;
-    INT r_filter_s_constrain = 0;
-    for (INT j = 0; j < entityTotal; j++) {
+    s[0][0] = s[1][0] = 0;
+    for (INT j = 0; j < handle -> entityTotal; j++) {
         if (j != t) {
             REAL value = con[j];
-            if (value < minimal) {
-                r_s += 1;
-                if (not _find(h, j, r))
-                    r_filter_s += 1;
-            }
-            while (lef < rig && tail_type[lef] < j) lef ++;
-            if (lef < rig && j == tail_type[lef]) {
-                    if (value < minimal) {
-                        r_s_constrain += 1;
-                        if (not _find(h, j ,r)) {
-                            r_filter_s_constrain += 1;
-                        }
-                    }
-            }
+            if (value < minimal)
+                s[0][0] += 1;
+            while (lef < rig && handle -> tail_type[lef] < j) lef ++;
+            if (lef < rig && j == handle -> tail_type[lef] && value < minimal)
+                s[1][0] += 1;
         }
-        
     }
+    INT better[2];
+    countAnswers(handle -> knownIndex, h, r, t, con, handle -> tail_type, handle -> tail_lef[r], handle -> tail_rig[r], better);
+    s[0][1] = s[0][0] - better[0];
+    s[1][1] = s[1][0] - better[1];
+}
+
+void addRanks(RankStats stats[2][2], INT s[2][2]) {
+    for (INT constrain = 0; constrain < 2; constrain++)
+        for (INT filter = 0; filter < 2; filter++)
+            addRank(stats[constrain][filter], s[constrain][filter]);
+}
+
+extern "C"
+void testHead(Handle *handle, REAL *con) {
+    INT s[2][2];
+    rankHead(handle, handle -> testList[handle -> lastHead], con, s);
+    RankStats (*stats)[2] = handle -> linkStats[0];
+    addRanks(stats, s);
+
+    handle -> lastHead++;
+
+    printf("l_filter_s: %ld\n", s[0][1]);
+    printf("%f %f %f %f \n", stats[0][0].tot / handle -> lastHead, stats[0][1].tot / handle -> lastHead, stats[0][0].rank / handle -> lastHead, stats[0][1].rank / handle -> lastHead);
+}
+
+extern "C"
+void testTail(Handle *handle, REAL *con) {
+    INT s[2][2];
+    rankTail(handle, handle -> testList[handle -> lastTail], con, s);
+    RankStats (*stats)[2] = handle -> linkStats[1];
+    addRanks(stats, s);
+
+    handle -> lastTail++;
+    printf("r_filter_s: %ld\n", s[0][1]);
+    printf("%f %f %f %f\n", stats[0][0].tot /handle -> lastTail, stats[0][1].tot /handle -> lastTail, stats[0][0].rank /handle -> lastTail, stats[0][1].rank /handle -> lastTail);
+}
+
+// the test triples in the order testHead and testTail rank them
+extern "C"
+void getTestTriples(Handle *handle, INT *ph, INT *pt, INT *pr) {
+    for (INT i = 0; i < handle -> testTotal; i++) {
+        ph[i] = handle -> testList[i].h;
+        pt[i] = handle -> testList[i].t;
+        pr[i] = handle -> testList[i].r;
+    }
+}
+
+/*
+	one thread's share of a ranking batch: the score rows [begin, end). Without
+	offset, row i ranks the test triple first + i into ranks[i]; with it, row i
+	ranks every test triple asking query first + i into ranks[triple].
+*/
+struct RankChunk {
+    Handle *handle;
+    INT side, first, begin, end;
+    REAL *con;
+    INT *offset, *triple;
+    INT (*ranks)[2][2];
+};
+
+void rankTriple(Handle *handle, INT side, INT id, REAL *con, INT s[2][2]) {
+    if (side)
+        rankTail(handle, handle -> testList[id], con, s);
+    else
+        rankHead(handle, handle -> testList[id], con, s);
+}
+
+void* rankChunk(void *con) {
+    RankChunk *chunk = (RankChunk *)con;
+    Handle *handle = chunk -> handle;
+    for (INT i = chunk -> begin; i < chunk -> end; i++) {
+        REAL *row = chunk -> con + i * handle -> entityTotal;
+        if (chunk -> offset == NULL) {
+            rankTriple(handle, chunk -> side, chunk -> first + i, row, chunk -> ranks[i]);
+            continue;
+        }
+        for (INT k = chunk -> offset[chunk -> first + i]; k < chunk -> offset[chunk -> first + i + 1]; k++)
+            rankTriple(handle, chunk -> side, chunk -> triple[k], row, chunk -> ranks[chunk -> triple[k]]);
+    }
+    return NULL;
+}
 
-    if (r_filter_s < 10) r_filter_tot += 1;
-    if (r_s < 10) r_tot += 1;
-    if (r_filter_s < 3) r3_filter_tot += 1;
-    if (r_s < 3) r3_tot += 1;
-    if (r_filter_s < 1) r1_filter_tot += 1;
-    if (r_s < 1) r1_tot += 1;
-
-    if (r_filter_s_constrain < 10) r_filter_tot_constrain += 1;
-    if (r_s_constrain < 10) r_tot_constrain += 1;
-    if (r_filter_s_constrain < 3) r3_filter_tot_constrain += 1;
-    if (r_s_constrain < 3) r3_tot_constrain += 1;
-    if (r_filter_s_constrain < 1) r1_filter_tot_constrain += 1;
-    if (r_s_constrain < 1) r1_tot_constrain += 1;
-
-    r_filter_rank += (1+r_filter_s);
-    r_rank += (1+r_s);
-    r_filter_reci_rank += 1.0/(1+r_filter_s);
-    r_reci_rank += 1.0/(1+r_s);
-
-    r_filter_rank_constrain += (1+r_filter_s_constrain);
-    r_rank_constrain += (1+r_s_constrain);
-    r_filter_reci_rank_constrain += 1.0/(1+r_filter_s_constrain);
-    r_reci_rank_constrain += 1.0/(1+r_s_constrain);
-
-    lastTail++;
-    printf("r_filter_s: %ld\n", r_filter_s);
-    printf("%f %f %f %f\n", r_tot /lastTail, r_filter_tot /lastTail, r_rank /lastTail, r_filter_rank /lastTail);
+/*
+	persistent rank workers: workThreads workers are created by the first
+	rankRows call that splits its rows, sleep on a condition variable between
+	score batches and are joined by stopRankPool() or destroyHandle(), so small
+	test batches do not pay a thread start per batch.
+*/
+struct RankPool {
+    pthread_t *threads;
+    RankChunk *chunks;
+    INT size;
+    INT active;
+    INT generation;
+    INT pending;
+    bool stop;
+    pthread_mutex_t lock;
+    pthread_cond_t wake;
+    pthread_cond_t done;
+};
+
+struct RankWorker {
+    RankPool *pool;
+    INT id;
+};
+
+void* rankWorker(void *con) {
+    RankWorker *worker = (RankWorker *)con;
+    RankPool *pool = worker -> pool;
+    INT id = worker -> id;
+    free(worker);
+    INT seen = 0;
+    while (1) {
+        pthread_mutex_lock(&pool -> lock);
+        while (!pool -> stop && pool -> generation == seen)
+            pthread_cond_wait(&pool -> wake, &pool -> lock);
+        if (pool -> stop) {
+            pthread_mutex_unlock(&pool -> lock);
+            break;
+        }
+        seen = pool -> generation;
+        bool busy = id < pool -> active;
+        pthread_mutex_unlock(&pool -> lock);
+        if (!busy) continue;
+        rankChunk(&pool -> chunks[id]);
+        pthread_mutex_lock(&pool -> lock);
+        pool -> pending--;
+        if (pool -> pending == 0)
+            pthread_cond_signal(&pool -> done);
+        pthread_mutex_unlock(&pool -> lock);
+    }
+    return NULL;
+}
+
+extern "C"
+void stopRankPool(Handle *handle) {
+    RankPool *pool = handle -> rankPool;
+    if (pool == NULL) return;
+    pthread_mutex_lock(&pool -> lock);
+    pool -> stop = true;
+    pthread_cond_broadcast(&pool -> wake);
+    pthread_mutex_unlock(&pool -> lock);
+    for (INT i = 0; i < pool -> size; i++)
+        pthread_join(pool -> threads[i], NULL);
+    pthread_mutex_destroy(&pool -> lock);
+    pthread_cond_destroy(&pool -> wake);
+    pthread_cond_destroy(&pool -> done);
+    free(pool -> threads);
+    free(pool -> chunks);
+    free(pool);
+    handle -> rankPool = NULL;
+}
+
+RankPool *startRankPool(Handle *handle) {
+    stopRankPool(handle);
+    RankPool *pool = (RankPool *)calloc(1, sizeof(RankPool));
+    pool -> size = handle -> workThreads;
+    pool -> threads = (pthread_t *)malloc(pool -> size * sizeof(pthread_t));
+    pool -> chunks = (RankChunk *)calloc(pool -> size, sizeof(RankChunk));
+    pthread_mutex_init(&pool -> lock, NULL);
+    pthread_cond_init(&pool -> wake, NULL);
+    pthread_cond_init(&pool -> done, NULL);
+    for (INT i = 0; i < pool -> size; i++) {
+        RankWorker *worker = (RankWorker *)malloc(sizeof(RankWorker));
+        worker -> pool = pool;
+        worker -> id = i;
+        pthread_create(&pool -> threads[i], NULL, rankWorker, (void *)worker);
+    }
+    handle -> rankPool = pool;
+    return pool;
+}
+
+// rank the total score rows of con, split across the workThreads rank workers
+void rankRows(Handle *handle, INT side, REAL *con, INT first, INT total, INT *offset, INT *triple, INT (*ranks)[2][2]) {
+    INT chunkTotal = handle -> workThreads < total ? handle -> workThreads : total;
+    if (chunkTotal < 1) chunkTotal = 1;
+    RankChunk single;
+    RankPool *pool = NULL;
+    if (chunkTotal > 1) {
+        pool = handle -> rankPool;
+        if (pool == NULL || pool -> size != handle -> workThreads)
+            pool = startRankPool(handle);
+    }
+    RankChunk *chunks = pool == NULL ? &single : pool -> chunks;
+    for (INT i = 0; i < chunkTotal; i++) {
+        chunks[i].handle = handle;
+        chunks[i].side = side;
+        chunks[i].first = first;
+        chunks[i].begin = total * i / chunkTotal;
+        chunks[i].end = total * (i + 1) / chunkTotal;
+        chunks[i].con = con;
+        chunks[i].offset = offset;
+        chunks[i].triple = triple;
+        chunks[i].ranks = ranks;
+    }
+    if (pool == NULL) {
+        rankChunk(&single);
+        return;
+    }
+    pthread_mutex_lock(&pool -> lock);
+    pool -> active = chunkTotal;
+    pool -> pending = chunkTotal;
+    pool -> generation++;
+    pthread_cond_broadcast(&pool -> wake);
+    while (pool -> pending > 0)
+        pthread_cond_wait(&pool -> done, &pool -> lock);
+    pthread_mutex_unlock(&pool -> lock);
+}
+
+// rank the next total test triples from a total x entityTotal score matrix whose
+// row i scores every entity as the head (side 0) or the tail (side 1) of the i-th one.
+// The queries are split across workThreads; each thread keeps the integer ranks of its
+// queries and they are added to linkStats in query order, so the sums are the ones
+// testHead and testTail would reach.
+extern "C"
+void testLinkBatch(Handle *handle, INT side, REAL *con, INT total) {
+    INT &last = side ? handle -> lastTail : handle -> lastHead;
+    if (total > handle -> testTotal - last) total = handle -> testTotal - last;
+    if (total <= 0) return;
+    INT (*ranks)[2][2] = (INT (*)[2][2])malloc(total * sizeof(INT[2][2]));
+    rankRows(handle, side, con, last, total, NULL, NULL, ranks);
+    for (INT i = 0; i < total; i++)
+        addRanks(handle -> linkStats[side], ranks[i]);
+    free(ranks);
+    last += total;
 }
 
+/*
+	group the test triples by the query of a side, (?, r, t) for heads (side 0)
+	and (h, r, ?) for tails (side 1), and write the unique queries to ph, pt
+	and pr, which hold testTotal ids; the id being predicted is the one of the
+	first triple asking the query. Returns the number of unique queries.
+*/
 extern "C"
-void test_link_prediction() {
-    l_rank /= testTotal;
-    r_rank /= testTotal;
-    l_reci_rank /= testTotal;
-    r_reci_rank /= testTotal;
- 
-    l_tot /= testTotal;
-    l3_tot /= testTotal;
-    l1_tot /= testTotal;
- 
-    r_tot /= testTotal;
-    r3_tot /= testTotal;
-    r1_tot /= testTotal;
-
-    // with filter
-    l_filter_rank /= testTotal;
-    r_filter_rank /= testTotal;
-    l_filter_reci_rank /= testTotal;
-    r_filter_reci_rank /= testTotal;
- 
-    l_filter_tot /= testTotal;
-    l3_filter_tot /= testTotal;
-    l1_filter_tot /= testTotal;
- 
-    r_filter_tot /= testTotal;
-    r3_filter_tot /= testTotal;
-    r1_filter_tot /= testTotal;
-
-    printf("no type constraint results:\n");
-    
-    printf("metric:\t\t\t MRR \t\t MR \t\t hit@10 \t hit@3  \t hit@1 \n");
-    printf("l(raw):\t\t\t %f \t %f \t %f \t %f \t %f \n", l_reci_rank, l_rank, l_tot, l3_tot, l1_tot);
-    printf("r(raw):\t\t\t %f \t %f \t %f \t %f \t %f \n", r_reci_rank, r_rank, r_tot, r3_tot, r1_tot);
-    printf("averaged(raw):\t\t %f \t %f \t %f \t %f \t %f \n",
-            (l_reci_rank+r_reci_rank)/2, (l_rank+r_rank)/2, (l_tot+r_tot)/2, (l3_tot+r3_tot)/2, (l1_tot+r1_tot)/2);
-    printf("\n");
-    printf("l(filter):\t\t %f \t %f \t %f \t %f \t %f \n", l_filter_reci_rank, l_filter_rank, l_filter_tot, l3_filter_tot, l1_filter_tot);
-    printf("r(filter):\t\t %f \t %f \t %f \t %f \t %f \n", r_filter_reci_rank, r_filter_rank, r_filter_tot, r3_filter_tot, r1_filter_tot);
-    printf("averaged(filter):\t %f \t %f \t %f \t %f \t %f \n",
-            (l_filter_reci_rank+r_filter_reci_rank)/2, (l_filter_rank+r_filter_rank)/2, (l_filter_tot+r_filter_tot)/2, (l3_filter_tot+r3_filter_tot)/2, (l1_filter_tot+r1_filter_tot)/2);
-
-    //type constrain
-    l_rank_constrain /= testTotal;
-    r_rank_constrain /= testTotal;
-    l_reci_rank_constrain /= testTotal;
-    r_reci_rank_constrain /= testTotal;
- 
-    l_tot_constrain /= testTotal;
-    l3_tot_constrain /= testTotal;
-    l1_tot_constrain /= testTotal;
- 
-    r_tot_constrain /= testTotal;
-    r3_tot_constrain /= testTotal;
-    r1_tot_constrain /= testTotal;
-
-    // with filter
-    l_filter_rank_constrain /= testTotal;
-    r_filter_rank_constrain /= testTotal;
-    l_filter_reci_rank_constrain /= testTotal;
-    r_filter_reci_rank_constrain /= testTotal;
- 
-    l_filter_tot_constrain /= testTotal;
-    l3_filter_tot_constrain /= testTotal;
-    l1_filter_tot_constrain /= testTotal;
- 
-    r_filter_tot_constrain /= testTotal;
-    r3_filter_tot_constrain /= testTotal;
-    r1_filter_tot_constrain /= testTotal;
-
-    printf("type constraint results:\n");
-    
-    printf("metric:\t\t\t MRR \t\t MR \t\t hit@10 \t hit@3  \t hit@1 \n");
-    printf("l(raw):\t\t\t %f \t %f \t %f \t %f \t %f \n", l_reci_rank_constrain, l_rank_constrain, l_tot_constrain, l3_tot_constrain, l1_tot_constrain);
-    printf("r(raw):\t\t\t %f \t %f \t %f \t %f \t %f \n", r_reci_rank_constrain, r_rank_constrain, r_tot_constrain, r3_tot_constrain, r1_tot_constrain);
-    printf("averaged(raw):\t\t %f \t %f \t %f \t %f \t %f \n",
-            (l_reci_rank_constrain+r_reci_rank_constrain)/2, (l_rank_constrain+r_rank_constrain)/2, (l_tot_constrain+r_tot_constrain)/2, (l3_tot_constrain+r3_tot_constrain)/2, (l1_tot_constrain+r1_tot_constrain)/2);
-    printf("\n");
-    printf("l(filter):\t\t %f \t %f \t %f \t %f \t %f \n", l_filter_reci_rank_constrain, l_filter_rank_constrain, l_filter_tot_constrain, l3_filter_tot_constrain, l1_filter_tot_constrain);
-    printf("r(filter):\t\t %f \t %f \t %f \t %f \t %f \n", r_filter_reci_rank_constrain, r_filter_rank_constrain, r_filter_tot_constrain, r3_filter_tot_constrain, r1_filter_tot_constrain);
-    printf("averaged(filter):\t %f \t %f \t %f \t %f \t %f \n",
-            (l_filter_reci_rank_constrain+r_filter_reci_rank_constrain)/2, (l_filter_rank_constrain+r_filter_rank_constrain)/2, (l_filter_tot_constrain+r_filter_tot_constrain)/2, (l3_filter_tot_constrain+r3_filter_tot_constrain)/2, (l1_filter_tot_constrain+r1_filter_tot_constrain)/2);
+INT groupLinkQueries(Handle *handle, INT side, INT *ph, INT *pt, INT *pr) {
+    INT total = handle -> testTotal;
+    Triple *list = handle -> testList;
+    // ((r, known entity), triple) in query order, ties in test order
+    std::vector<std::pair<std::pair<INT, INT>, INT> > order(total);
+    for (INT i = 0; i < total; i++)
+        order[i] = std::make_pair(std::make_pair(list[i].r, side ? list[i].h : list[i].t), i);
+    std::sort(order.begin(), order.end());
+    INT *triple = (INT *)realloc(handle -> queryTriple[side], (total + 1) * sizeof(INT));
+    for (INT i = 0; i < total; i++)
+        triple[i] = order[i].second;
+    INT *offset = (INT *)realloc(handle -> queryOffset[side], (total + 1) * sizeof(INT));
+    INT queries = 0;
+    for (INT k = 0; k < total; k++) {
+        const Triple &cur = list[triple[k]];
+        if (k > 0) {
+            const Triple &prev = list[triple[k - 1]];
+            if (cur.r == prev.r && (side ? cur.h == prev.h : cur.t == prev.t)) continue;
+        }
+        offset[queries] = k;
+        ph[queries] = cur.h;
+        pt[queries] = cur.t;
+        pr[queries] = cur.r;
+        queries++;
+    }
+    offset[queries] = total;
+    handle -> queryTriple[side] = triple;
+    handle -> queryOffset[side] = offset;
+    handle -> queryTotal[side] = queries;
+    handle -> queryRanks[side] = (INT (*)[2][2])realloc(handle -> queryRanks[side], (total + 1) * sizeof(INT[2][2]));
+    handle -> queryRanked[side] = 0;
+    return queries;
+}
+
+/*
+	rank every test triple asking the unique queries first .. first + total - 1
+	of groupLinkQueries from a total x entityTotal score matrix, one row per
+	query. Each triple is filtered with its own true entity. Once all test
+	triples of the side are ranked their ranks are added to linkStats in test
+	order, so the metrics are the ones of testLinkBatch.
+*/
+extern "C"
+void testLinkQueries(Handle *handle, INT side, REAL *con, INT first, INT total) {
+    if (first < 0 || handle -> queryOffset[side] == NULL) return;
+    if (total > handle -> queryTotal[side] - first) total = handle -> queryTotal[side] - first;
+    if (total <= 0) return;
+    rankRows(handle, side, con, first, total, handle -> queryOffset[side], handle -> queryTriple[side], handle -> queryRanks[side]);
+    handle -> queryRanked[side] += handle -> queryOffset[side][first + total] - handle -> queryOffset[side][first];
+    INT &last = side ? handle -> lastTail : handle -> lastHead;
+    if (handle -> queryRanked[side] < handle -> testTotal || last != 0) return;
+    for (INT i = 0; i < handle -> testTotal; i++)
+        addRanks(handle -> linkStats[side], handle -> queryRanks[side][i]);
+    last = handle -> testTotal;
+}
+
+// the validation triples in validList order
+extern "C"
+void getValidTriples(Handle *handle, INT *ph, INT *pt, INT *pr) {
+    for (INT i = 0; i < handle -> validTotal; i++) {
+        ph[i] = handle -> validList[i].h;
+        pt[i] = handle -> validList[i].t;
+        pr[i] = handle -> validList[i].r;
+    }
+}
+
+/*
+	filtered ranks, counted from 0, of the total queries (ph[i], pt[i], pr[i])
+	with the head (side 0) or the tail (side 1) missing. Without candidates row
+	i of con scores every entity; with candTotal candidates row i holds the
+	score of the true entity followed by those of cand[0 .. candTotal - 1] and
+	the rank is taken among them. Known true answers other than the query's
+	own are skipped in both cases.
+*/
+extern "C"
+void rankQueries(Handle *handle, INT side, INT *ph, INT *pt, INT *pr, INT total, REAL *con, INT *cand, INT candTotal, INT *ranks) {
+    const CsrIndex &index = side ? handle -> knownIndex : handle -> knownTailIndex;
+    for (INT i = 0; i < total; i++) {
+        INT truth = side ? pt[i] : ph[i], row = side ? ph[i] : pt[i];
+        ranks[i] = 0;
+        if (cand == NULL || candTotal <= 0) {
+            REAL *cur = con + i * handle -> entityTotal;
+            for (INT j = 0; j < handle -> entityTotal; j++)
+                if (j != truth && cur[j] < cur[truth]) ranks[i]++;
+            INT better[2];
+            countAnswers(index, row, pr[i], truth, cur, NULL, 0, 0, better);
+            ranks[i] -= better[0];
+            continue;
+        }
+        REAL *cur = con + i * (candTotal + 1);
+        for (INT j = 0; j < candTotal; j++)
+            if (cand[j] != truth && cur[j + 1] < cur[0] && !containsEdge(index, row, pr[i], cand[j])) ranks[i]++;
+    }
+}
+
+extern "C"
+void test_link_prediction(Handle *handle) {
+    for (INT constrain = 0; constrain < 2; constrain++) {
+        RankStats l = meanRank(handle -> linkStats[0][constrain][0], handle -> testTotal);
+        RankStats r = meanRank(handle -> linkStats[1][constrain][0], handle -> testTotal);
+        RankStats l_filter = meanRank(handle -> linkStats[0][constrain][1], handle -> testTotal);
+        RankStats r_filter = meanRank(handle -> linkStats[1][constrain][1], handle -> testTotal);
+
+        printf(constrain ? "type constraint results:\n" : "no type constraint results:\n");
+        
+        printf("metric:\t\t\t MRR \t\t MR \t\t hit@10 \t hit@3  \t hit@1 \n");
+        printf("l(raw):\t\t\t %f \t %f \t %f \t %f \t %f \n", l.reci_rank, l.rank, l.tot, l.tot3, l.tot1);
+        printf("r(raw):\t\t\t %f \t %f \t %f \t %f \t %f \n", r.reci_rank, r.rank, r.tot, r.tot3, r.tot1);
+        printf("averaged(raw):\t\t %f \t %f \t %f \t %f \t %f \n",
+                (l.reci_rank+r.reci_rank)/2, (l.rank+r.rank)/2, (l.tot+r.tot)/2, (l.tot3+r.tot3)/2, (l.tot1+r.tot1)/2);
+        printf("\n");
+        printf("l(filter):\t\t %f \t %f \t %f \t %f \t %f \n", l_filter.reci_rank, l_filter.rank, l_filter.tot, l_filter.tot3, l_filter.tot1);
+        printf("r(filter):\t\t %f \t %f \t %f \t %f \t %f \n", r_filter.reci_rank, r_filter.rank, r_filter.tot, r_filter.tot3, r_filter.tot1);
+        printf("averaged(filter):\t %f \t %f \t %f \t %f \t %f \n",
+                (l_filter.reci_rank+r_filter.reci_rank)/2, (l_filter.rank+r_filter.rank)/2, (l_filter.tot+r_filter.tot)/2, (l_filter.tot3+r_filter.tot3)/2, (l_filter.tot1+r_filter.tot1)/2);
+    }
 }
 
 /*=====================================================================================
 triple classification
 ======================================================================================*/
-Triple *negTestList;
 extern "C"
-void getNegTest() {
-    negTestList = (Triple *)calloc(testTotal, sizeof(Triple));
-    for (INT i = 0; i < testTotal; i++) {
-        negTestList[i] = testList[i];
-        negTestList[i].t = corrupt(testList[i].h, testList[i].r);
+void getNegTest(Handle *handle) {
+    handle -> negTestList = (Triple *)realloc(handle -> negTestList, (handle -> testTotal + 1) * sizeof(Triple));
+    for (INT i = 0; i < handle -> testTotal; i++) {
+        handle -> negTestList[i] = handle -> testList[i];
+        handle -> negTestList[i].t = corrupt(handle, handle -> testList[i].h, handle -> testList[i].r);
     }
-    FILE* fout = fopen((inPath + "test_neg.txt").c_str(), "w");
-    for (INT i = 0; i < testTotal; i++) {
-        fprintf(fout, "%ld\t%ld\t%ld\t%ld\n", testList[i].h, testList[i].t, testList[i].r, INT(1));
-        fprintf(fout, "%ld\t%ld\t%ld\t%ld\n", negTestList[i].h, negTestList[i].t, negTestList[i].r, INT(-1));
+    FILE* fout = fopen((handle -> inPath + "test_neg.txt").c_str(), "w");
+    for (INT i = 0; i < handle -> testTotal; i++) {
+        fprintf(fout, "%ld\t%ld\t%ld\t%ld\n", handle -> testList[i].h, handle -> testList[i].t, handle -> testList[i].r, INT(1));
+        fprintf(fout, "%ld\t%ld\t%ld\t%ld\n", handle -> negTestList[i].h, handle -> negTestList[i].t, handle -> negTestList[i].r, INT(-1));
     }
     fclose(fout);
 }
 
-Triple *negValidList;
 extern "C"
-void getNegValid() {
-    negValidList = (Triple *)calloc(validTotal, sizeof(Triple));
-    for (INT i = 0; i < validTotal; i++) {
-        negValidList[i] = validList[i];
-        negValidList[i].t = corrupt(validList[i].h, validList[i].r);
+void getNegValid(Handle *handle) {
+    handle -> negValidList = (Triple *)realloc(handle -> negValidList, (handle -> validTotal + 1) * sizeof(Triple));
+    for (INT i = 0; i < handle -> validTotal; i++) {
+        handle -> negValidList[i] = handle -> validList[i];
+        handle -> negValidList[i].t = corrupt(handle, handle -> validList[i].h, handle -> validList[i].r);
     }
-    FILE* fout = fopen((inPath + "valid_neg.txt").c_str(), "w");
-    for (INT i = 0; i < validTotal; i++) {
-        fprintf(fout, "%ld\t%ld\t%ld\t%ld\n", validList[i].h, validList[i].t, validList[i].r, INT(1));
-        fprintf(fout, "%ld\t%ld\t%ld\t%ld\n", negValidList[i].h, negValidList[i].t, negValidList[i].r, INT(-1));
+    FILE* fout = fopen((handle -> inPath + "valid_neg.txt").c_str(), "w");
+    for (INT i = 0; i < handle -> validTotal; i++) {
+        fprintf(fout, "%ld\t%ld\t%ld\t%ld\n", handle -> validList[i].h, handle -> validList[i].t, handle -> validList[i].r, INT(1));
+        fprintf(fout, "%ld\t%ld\t%ld\t%ld\n", handle -> negValidList[i].h, handle -> negValidList[i].t, handle -> negValidList[i].r, INT(-1));
     }
     fclose(fout);
         
 }
 
 extern "C"
-void getTestBatch(INT *ph, INT *pt, INT *pr, INT *nh, INT *nt, INT *nr) {
-    getNegTest();
-    for (INT i = 0; i < testTotal; i++) {
-        ph[i] = testList[i].h;
-        pt[i] = testList[i].t;
-        pr[i] = testList[i].r;
-        nh[i] = negTestList[i].h;
-        nt[i] = negTestList[i].t;
-        nr[i] = negTestList[i].r;
+void getTestBatch(Handle *handle, INT *ph, INT *pt, INT *pr, INT *nh, INT *nt, INT *nr) {
+    getNegTest(handle);
+    for (INT i = 0; i < handle -> testTotal; i++) {
+        ph[i] = handle -> testList[i].h;
+        pt[i] = handle -> testList[i].t;
+        pr[i] = handle -> testList[i].r;
+        nh[i] = handle -> negTestList[i].h;
+        nt[i] = handle -> negTestList[i].t;
+        nr[i] = handle -> negTestList[i].r;
     }
 }
 
 extern "C"
-void getValidBatch(INT *ph, INT *pt, INT *pr, INT *nh, INT *nt, INT *nr) {
-    getNegValid();
-    for (INT i = 0; i < validTotal; i++) {
-        ph[i] = validList[i].h;
-        pt[i] = validList[i].t;
-        pr[i] = validList[i].r;
-        nh[i] = negValidList[i].h;
-        nt[i] = negValidList[i].t;
-        nr[i] = negValidList[i].r;
+void getValidBatch(Handle *handle, INT *ph, INT *pt, INT *pr, INT *nh, INT *nt, INT *nr) {
+    getNegValid(handle);
+    for (INT i = 0; i < handle -> validTotal; i++) {
+        ph[i] = handle -> validList[i].h;
+        pt[i] = handle -> validList[i].t;
+        pr[i] = handle -> validList[i].r;
+        nh[i] = handle -> negValidList[i].h;
+        nt[i] = handle -> negValidList[i].t;
+        nr[i] = handle -> negValidList[i].r;
     }
 }
 //REAL* relThresh;
-REAL threshEntire;
 extern "C"
-void getBestThreshold(REAL *relThresh, REAL *score_pos, REAL *score_neg) {
+void getBestThreshold(Handle *handle, REAL *relThresh, REAL *score_pos, REAL *score_neg) {
     REAL interval = 0.01;
     REAL min_score, max_score, bestThresh, tmpThresh, bestAcc, tmpAcc;
     INT n_interval, correct, total;
-    for (INT r = 0; r < relationTotal; r++) {
-        if (validLef[r] == -1) continue;
-        total = (validRig[r] - validLef[r] + 1) * 2;
-        min_score = score_pos[validLef[r]];
-        if (score_neg[validLef[r]] < min_score) min_score = score_neg[validLef[r]];
-        max_score = score_pos[validLef[r]];
-        if (score_neg[validLef[r]] > max_score) max_score = score_neg[validLef[r]];
-        for (INT i = validLef[r]+1; i <= validRig[r]; i++) {
+    for (INT r = 0; r < handle -> relationTotal; r++) {
+        if (handle -> validLef[r] == -1) continue;
+        total = (handle -> validRig[r] - handle -> validLef[r] + 1) * 2;
+        min_score = score_pos[handle -> validLef[r]];
+        if (score_neg[handle -> validLef[r]] < min_score) min_score = score_neg[handle -> validLef[r]];
+        max_score = score_pos[handle -> validLef[r]];
+        if (score_neg[handle -> validLef[r]] > max_score) max_score = score_neg[handle -> validLef[r]];
+        for (INT i = handle -> validLef[r]+1; i <= handle -> validRig[r]; i++) {
             if(score_pos[i] < min_score) min_score = score_pos[i];
             if(score_pos[i] > max_score) max_score = score_pos[i];
             if(score_neg[i] < min_score) min_score = score_neg[i];
@@ -325,7 +561,7 @@ void getBestThreshold(REAL *relThresh, REAL *score_pos, REAL *score_neg) {
         for (INT i = 0; i <= n_interval; i++) {
             tmpThresh = min_score + i * interval;
             correct = 0;
-            for (INT j = validLef[r]; j <= validRig[r]; j++) {
+            for (INT j = handle -> validLef[r]; j <= handle -> validRig[r]; j++) {
                 if (score_pos[j] <= tmpThresh) correct ++;
                 if (score_neg[j] > tmpThresh) correct ++;
             }
@@ -342,22 +578,21 @@ void getBestThreshold(REAL *relThresh, REAL *score_pos, REAL *score_neg) {
     }
 }
 
-REAL *testAcc;
-REAL aveAcc;
 extern "C"
-void test_triple_classification(REAL *relThresh, REAL *score_pos, REAL *score_neg) {
-    testAcc = (REAL *)calloc(relationTotal, sizeof(REAL));
+void test_triple_classification(Handle *handle, REAL *relThresh, REAL *score_pos, REAL *score_neg) {
+    handle -> testAcc = (REAL *)realloc(handle -> testAcc, (handle -> relationTotal + 1) * sizeof(REAL));
+    memset(handle -> testAcc, 0, handle -> relationTotal * sizeof(REAL));
     INT aveCorrect = 0, aveTotal = 0;
     REAL aveAcc;
-    for (INT r = 0; r < relationTotal; r++) {
-        if (validLef[r] == -1 || testLef[r] ==-1) continue;
+    for (INT r = 0; r < handle -> relationTotal; r++) {
+        if (handle -> validLef[r] == -1 || handle -> testLef[r] ==-1) continue;
         INT correct = 0, total = 0;
-        for (INT i = testLef[r]; i <= testRig[r]; i++) {
+        for (INT i = handle -> testLef[r]; i <= handle -> testRig[r]; i++) {
             if (score_pos[i] <= relThresh[r]) correct++;
             if (score_neg[i] > relThresh[r]) correct++;
             total += 2;
         }
-        testAcc[r] = 1.0 * correct / total;
+        handle -> testAcc[r] = 1.0 * correct / total;
         aveCorrect += correct; 
         aveTotal += total;
     }
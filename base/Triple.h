@@ -33,4 +33,23 @@ struct Triple {
 
 };
 
+// a triple with 32-bit ids, the element of the compact storage mode
+struct CompactTriple {
+
+	unsigned int h, r, t;
+
+	static bool cmp_head(const CompactTriple &a, const CompactTriple &b) {
+		return (a.h < b.h)||(a.h == b.h && a.r < b.r)||(a.h == b.h && a.r == b.r && a.t < b.t);
+	}
+
+	static bool cmp_tail(const CompactTriple &a, const CompactTriple &b) {
+		return (a.t < b.t)||(a.t == b.t && a.r < b.r)||(a.t == b.t && a.r == b.r && a.h < b.h);
+	}
+
+	static bool cmp_rel(const CompactTriple &a, const CompactTriple &b) {
+		return (a.h < b.h)||(a.h == b.h && a.t < b.t)||(a.h == b.h && a.t == b.t && a.r < b.r);
+	}
+
+};
+
 #endif
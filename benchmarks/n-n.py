@@ -0,0 +1,107 @@
+#coding:utf-8
+#Write type_constrain.txt, the 1-1/1-n/n-1/n-n splits of test2id.txt and test2id_all.txt of a dataset folder.
+#Usage, from the repository root or inside a dataset folder:
+#	python benchmarks/n-n.py ./benchmarks/FB15K/ ./benchmarks/WN18/
+#	cd benchmarks/FB15K && python ../n-n.py
+#Relations are 1-n when their triples average more than 1.5 tails per (head, relation) pair
+#and n-1 when they average more than 1.5 heads per (relation, tail) pair, counted over
+#train2id.txt, valid2id.txt and test2id.txt.
+import os
+import sys
+import numpy as np
+
+def read_triples(path):
+	r'''
+	the h, t, r rows of a *2id.txt file as an int64 array
+	'''
+	with open(path, "r") as f:
+		total = int(f.readline())
+	return np.loadtxt(path, dtype = np.int64, skiprows = 1, max_rows = total, ndmin = 2).reshape(-1, 3)
+
+def first_order(keys):
+	r'''
+	the distinct keys in the order of their first occurrence
+	'''
+	unique, first = np.unique(keys, return_index = True)
+	return unique[np.argsort(first, kind = "stable")]
+
+def relation_entities(triples):
+	r'''
+	the relations in the order they first occur and, for heads and for tails,
+	the entities seen with each relation in the order they first occur: the
+	entities of the i-th relation are entities[bounds[i]:bounds[i + 1]]
+	'''
+	h, t, r = triples[:, 0], triples[:, 1], triples[:, 2]
+	base = int(triples[:, :2].max()) + 1
+	relations = first_order(r)
+	rank = np.zeros(int(r.max()) + 1, dtype = np.int64)
+	rank[relations] = np.arange(len(relations))
+	sides = []
+	for entity in [h, t]:
+		pairs = first_order(rank[r] * base + entity)
+		pairs = pairs[np.argsort(pairs // base, kind = "stable")]
+		bounds = np.searchsorted(pairs // base, np.arange(len(relations) + 1))
+		sides.append((pairs % base, bounds))
+	return relations, sides
+
+def write_type_constrain(path, relations, sides):
+	r'''
+	per relation a line of its heads and a line of its tails: "rel count e_1 ... e_count"
+	'''
+	sides = [(entities.tolist(), bounds.tolist()) for entities, bounds in sides]
+	with open(path, "w") as f:
+		f.write("%d\n" % (len(relations)))
+		for i, rel in enumerate(relations.tolist()):
+			for entities, bounds in sides:
+				lef, rig = bounds[i], bounds[i + 1]
+				f.write("%d\t%d" % (rel, rig - lef))
+				if rig > lef:
+					f.write("\t" + "\t".join(map(str, entities[lef:rig])))
+				f.write("\n")
+
+def relation_categories(triples, relations, sides):
+	r'''
+	the category of every relation id: 0 for 1-1, 1 for 1-n, 2 for n-1 and 3 for n-n.
+	The distinct (h, r) pairs of a relation are its heads in the type constraint.
+	'''
+	size = int(relations.max()) + 1
+	count = np.bincount(triples[:, 2], minlength = size).astype(np.float64)
+	head_pairs = np.ones(size)
+	tail_pairs = np.ones(size)
+	head_pairs[relations] = np.diff(sides[0][1])
+	tail_pairs[relations] = np.diff(sides[1][1])
+	tph = count / head_pairs
+	hpt = count / tail_pairs
+	return (tph > 1.5) * 1 + (hpt > 1.5) * 2
+
+def write_splits(folder, categories):
+	r'''
+	copy the lines of test2id.txt into 1-1.txt, 1-n.txt, n-1.txt and n-n.txt and,
+	prefixed with their category, into test2id_all.txt
+	'''
+	with open(os.path.join(folder, "test2id.txt"), "r") as f:
+		total = int(f.readline())
+		lines = [f.readline() for i in range(total)]
+	rels = np.array([int(line.split()[2]) for line in lines], dtype = np.int64)
+	cats = categories[rels].tolist()
+	names = ["1-1.txt", "1-n.txt", "n-1.txt", "n-n.txt"]
+	outs = [open(os.path.join(folder, name), "w") for name in names]
+	for i, out in enumerate(outs):
+		out.write("%d\n" % (cats.count(i)))
+	with open(os.path.join(folder, "test2id_all.txt"), "w") as fall:
+		fall.write("%d\n" % (total))
+		for line, cat in zip(lines, cats):
+			outs[cat].write(line)
+			fall.write("%d\t%s" % (cat, line))
+	for out in outs:
+		out.close()
+
+def main(folder):
+	triples = np.concatenate([read_triples(os.path.join(folder, name)) for name in ["train2id.txt", "valid2id.txt", "test2id.txt"]])
+	relations, sides = relation_entities(triples)
+	write_type_constrain(os.path.join(folder, "type_constrain.txt"), relations, sides)
+	write_splits(folder, relation_categories(triples, relations, sides))
+
+if __name__ == "__main__":
+	for folder in sys.argv[1:] or ["."]:
+		main(folder)
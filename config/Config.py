@@ -6,23 +6,22 @@ import time
 import datetime
 import ctypes
 import json
+import threading
+try:
+	import queue
+except ImportError:
+	import Queue as queue
+from .Handle import Handle
 
 class Config(object):
 	'''
 	use ctypes to call C functions from python and set essential parameters.
 	'''
+	sampling_modes = {"uniform": 0, "shuffle": 1, "locality": 2}
+	neg_sampling_modes = {"uniform": 0, "degree": 1}
+
 	def __init__(self):
-		base_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../release/Base.so'))
-		self.lib = ctypes.cdll.LoadLibrary(base_file)
-		self.lib.sampling.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int64, ctypes.c_int64, ctypes.c_int64]
-		self.lib.getHeadBatch.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
-		self.lib.getTailBatch.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
-		self.lib.testHead.argtypes = [ctypes.c_void_p]
-		self.lib.testTail.argtypes = [ctypes.c_void_p]
-		self.lib.getTestBatch.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
-		self.lib.getValidBatch.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
-		self.lib.getBestThreshold.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
-		self.lib.test_triple_classification.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
+		self.lib = Handle()
 		self.test_flag = False
 		self.in_path = None
 		self.out_path = None
@@ -36,6 +35,23 @@ class Config(object):
 		self.negative_ent = 1
 		self.negative_rel = 0
 		self.workThreads = 1
+		self.sampler_pool = True
+		self.prefetch = 0
+		self.epoch_sampling = False
+		self.sampling_mode = "uniform"
+		self.neg_sampling = "uniform"
+		self.neg_power = 0.75
+		self.hard_ratio = 0.0
+		self.hard_refresh_steps = 100
+		self.hard_pool = 32
+		self.hard_slots = 100000
+		self.hard_width = 8
+		self.seed = None
+		self.type_ratio = 0.0
+		self.dataset_file = None
+		self.compact_storage = False
+		self.recent_ratio = 0.0
+		self.recent_steps = 0
 		self.alpha = 0.001
 		self.lmbda = 0.000
 		self.log_on = 1
@@ -45,6 +61,14 @@ class Config(object):
 		self.opt_method = "SGD"
 		self.optimizer = None
 		self.test_link_prediction = False
+		self.test_batch_size = 0
+		self.valid_size = 1000
+		self.valid_candidates = 0
+		self.valid_epochs = 0
+		self.valid_bootstrap = 1000
+		self.valid_confidence = 0.95
+		self.valid_sample = None
+		self.valid_history = []
 		self.test_triple_classification = False
 	def init_link_prediction(self):
 		r'''
@@ -101,28 +125,53 @@ class Config(object):
 			self.lib.setInPath(ctypes.create_string_buffer(self.in_path.encode(), len(self.in_path) * 2))
 			self.lib.setBern(self.bern)
 			self.lib.setWorkThreads(self.workThreads)
+			self.lib.setCompactStorage(1 if self.compact_storage else 0)
+			self.lib.setNegSampling(self.neg_sampling_modes[self.neg_sampling], self.neg_power)
 			self.lib.randReset()
-			self.lib.importTrainFiles()
+			if self.seed != None:
+				self.lib.setSeed(self.seed)
+			if self.dataset_file != None:
+				dataset_file = ctypes.create_string_buffer(self.dataset_file.encode(), len(self.dataset_file) * 2)
+				if self.lib.loadDataset(dataset_file) != 0:
+					self.lib.compileDataset(dataset_file)
+			else:
+				self.lib.importTrainFiles()
+			self.lib.setSampleMode(self.sampling_modes[self.sampling_mode])
+			if self.type_ratio > 0:
+				self.lib.importTypeFiles()
+				self.lib.setTypeConstrain(self.type_ratio)
+			if self.hard_ratio > 0:
+				self.lib.setHardNegatives(self.hard_ratio, self.hard_slots, self.hard_width)
+			if self.sampler_pool:
+				self.lib.startSampler()
 			self.relTotal = self.lib.getRelationTotal()
 			self.entTotal = self.lib.getEntityTotal()
 			self.trainTotal = self.lib.getTrainTotal()
 			self.testTotal = self.lib.getTestTotal()
 			self.validTotal = self.lib.getValidTotal()
-			self.batch_size = int(self.lib.getTrainTotal() / self.nbatches)
-			self.batch_seq_size = self.batch_size * (1 + self.negative_ent + self.negative_rel)
-			self.batch_h = np.zeros(self.batch_size * (1 + self.negative_ent + self.negative_rel), dtype = np.int64)
-			self.batch_t = np.zeros(self.batch_size * (1 + self.negative_ent + self.negative_rel), dtype = np.int64)
-			self.batch_r = np.zeros(self.batch_size * (1 + self.negative_ent + self.negative_rel), dtype = np.int64)
-			self.batch_y = np.zeros(self.batch_size * (1 + self.negative_ent + self.negative_rel), dtype = np.float32)
-			self.batch_h_addr = self.batch_h.__array_interface__['data'][0]
-			self.batch_t_addr = self.batch_t.__array_interface__['data'][0]
-			self.batch_r_addr = self.batch_r.__array_interface__['data'][0]
-			self.batch_y_addr = self.batch_y.__array_interface__['data'][0]
+			self.init_batches()
 		if self.test_link_prediction:
 			self.init_link_prediction()
 		if self.test_triple_classification:
 			self.init_triple_classification()
 
+	# batch_size and the sample buffers for the current training triples
+	def init_batches(self):
+		self.batch_size = int(self.lib.getTrainTotal() / self.nbatches)
+		self.batch_seq_size = self.batch_size * (1 + self.negative_ent + self.negative_rel)
+		self.batch_h = np.zeros(self.batch_size * (1 + self.negative_ent + self.negative_rel), dtype = np.int64)
+		self.batch_t = np.zeros(self.batch_size * (1 + self.negative_ent + self.negative_rel), dtype = np.int64)
+		self.batch_r = np.zeros(self.batch_size * (1 + self.negative_ent + self.negative_rel), dtype = np.int64)
+		self.batch_y = np.zeros(self.batch_size * (1 + self.negative_ent + self.negative_rel), dtype = np.float32)
+		self.batch_h_addr = self.batch_h.__array_interface__['data'][0]
+		self.batch_t_addr = self.batch_t.__array_interface__['data'][0]
+		self.batch_r_addr = self.batch_r.__array_interface__['data'][0]
+		self.batch_y_addr = self.batch_y.__array_interface__['data'][0]
+		if self.epoch_sampling:
+			self.sample_buffer = self.new_sample_buffer()
+		else:
+			self.sample_buffer = [self.batch_h, self.batch_t, self.batch_r, self.batch_y]
+
 	def get_ent_total(self):
 		return self.entTotal
 
@@ -141,6 +190,30 @@ class Config(object):
 	def set_test_link_prediction(self, flag):
 		self.test_link_prediction = flag
 
+	def set_test_batch_size(self, size):
+		r'''
+		rank size test queries per session run in link prediction, scoring them
+		against all entities as one (size, entities) matrix; test triples that
+		ask the same (?, r, t) or (h, r, ?) query share its scores. 0 scores one
+		triple per run. The metrics are the same, the per-triple log lines are
+		not printed.
+		'''
+		self.test_batch_size = size
+
+	def set_fast_validation(self, size = 1000, candidates = 0, epochs = 0, bootstrap = 1000, confidence = 0.95):
+		r'''
+		settings of fast_validation: size validation triples drawn by relation,
+		ranked against all entities or, with candidates > 0, against that many
+		sampled entities, and bootstrap resamples for confidence intervals.
+		With epochs > 0 run() validates every epochs epochs and keeps the
+		results in valid_history.
+		'''
+		self.valid_size = size
+		self.valid_candidates = candidates
+		self.valid_epochs = epochs
+		self.valid_bootstrap = bootstrap
+		self.valid_confidence = confidence
+
 	def set_test_triple_classification(self, flag):
 		self.test_triple_classification = flag
 
@@ -182,6 +255,108 @@ class Config(object):
 	def set_work_threads(self, threads):
 		self.workThreads = threads
 
+	def set_seed(self, seed):
+		r'''
+		seed the native sampler; batches depend only on the seed and the
+		batch index, not on the number of work threads
+		'''
+		self.seed = seed
+
+	def set_sampler_pool(self, flag):
+		self.sampler_pool = flag
+
+	def stop_sampler(self):
+		r'''
+		join the persistent sampler threads started by init()
+		'''
+		self.lib.stopSampler()
+
+	def close(self):
+		r'''
+		close the TensorFlow session and free the native handle with every
+		array it holds; the Config cannot be used afterwards
+		'''
+		if getattr(self, "sess", None) != None:
+			self.sess.close()
+			self.sess = None
+		self.lib.close()
+
+	def set_prefetch(self, depth):
+		r'''
+		sample up to depth batches ahead in a background thread while
+		the current batch trains (0 samples synchronously)
+		'''
+		self.prefetch = depth
+
+	def set_epoch_sampling(self, flag):
+		r'''
+		sample all nbatches batches of an epoch with one native call and
+		train on views into the epoch arrays
+		'''
+		self.epoch_sampling = flag
+
+	def set_sampling_mode(self, mode):
+		r'''
+		"uniform" draws positives with replacement, "shuffle" visits every
+		training triple once per epoch, "locality" also groups triples that
+		share a head and relation into the same batch. The last two split the
+		triples into a fixed number of shards, walked by up to that many work
+		threads.
+		'''
+		self.sampling_mode = mode
+
+	def set_neg_sampling(self, mode, power = 0.75):
+		r'''
+		"uniform" replaces entities uniformly, "degree" draws replacements
+		proportionally to their training frequency raised to power
+		'''
+		self.neg_sampling = mode
+		self.neg_power = power
+
+	def set_hard_negatives(self, ratio, refresh_steps = 100, pool = 32, slots = 100000, width = 8):
+		r'''
+		draw a ratio of the entity negatives from a cache of model-scored hard
+		negatives; every refresh_steps steps, pool random candidates per side
+		of each positive in the batch are scored and the width most plausible
+		kept, in at most slots cached queries
+		'''
+		self.hard_ratio = ratio
+		self.hard_refresh_steps = refresh_steps
+		self.hard_pool = pool
+		self.hard_slots = slots
+		self.hard_width = width
+
+	def set_type_constrain(self, ratio):
+		r'''
+		draw a ratio of the entity negatives from the heads or tails that
+		type_constrain.txt allows for the relation
+		'''
+		self.type_ratio = ratio
+
+	def set_dataset_file(self, path):
+		r'''
+		map the binary dataset at path instead of parsing the text files of
+		in_path; if it does not exist yet it is compiled from in_path first
+		'''
+		self.dataset_file = path
+
+	def set_compact_storage(self, flag):
+		r'''
+		keep the training and filter triples with 32-bit ids and a single full
+		copy of the training triples; sampling and evaluation results are the
+		same as with the default storage. A compiled dataset keeps the mode it
+		was compiled with.
+		'''
+		self.compact_storage = flag
+
+	def set_recent_bias(self, ratio, steps):
+		r'''
+		after append_triples, draw a ratio of the positives of the next steps
+		batches from the appended triples
+		'''
+		self.recent_ratio = ratio
+		self.recent_steps = steps
+
 	def set_ent_neg_rate(self, rate):
 		self.negative_ent = rate
 
@@ -201,6 +376,137 @@ class Config(object):
 	def sampling(self):
 		self.lib.sampling(self.batch_h_addr, self.batch_t_addr, self.batch_r_addr, self.batch_y_addr, self.batch_size, self.negative_ent, self.negative_rel)
 
+	def new_sample_buffer(self):
+		size = self.batch_seq_size
+		if self.epoch_sampling:
+			size *= self.nbatches
+		return [np.zeros(size, dtype = np.int64),
+			np.zeros(size, dtype = np.int64),
+			np.zeros(size, dtype = np.int64),
+			np.zeros(size, dtype = np.float32)]
+
+	def sampling_into(self, buf):
+		addr = [x.__array_interface__['data'][0] for x in buf]
+		if self.epoch_sampling:
+			self.lib.samplingEpoch(addr[0], addr[1], addr[2], addr[3], self.batch_size, self.nbatches, self.negative_ent, self.negative_rel)
+		else:
+			self.lib.sampling(addr[0], addr[1], addr[2], addr[3], self.batch_size, self.negative_ent, self.negative_rel)
+
+	# fill free buffers in the background; ctypes releases the GIL during sampling
+	def prefetch_loop(self, total):
+		for i in range(total):
+			buf = self.free_buffers.get()
+			if buf is None:
+				return
+			self.sampling_into(buf)
+			self.ready_buffers.put(buf)
+
+	def start_prefetch(self, total):
+		self.free_buffers = queue.Queue()
+		self.ready_buffers = queue.Queue()
+		self.free_buffers.put(self.sample_buffer)
+		for i in range(self.prefetch):
+			self.free_buffers.put(self.new_sample_buffer())
+		self.prefetch_thread = threading.Thread(target = self.prefetch_loop, args = (total,))
+		self.prefetch_thread.daemon = True
+		self.prefetch_thread.start()
+
+	def stop_prefetch(self):
+		self.free_buffers.put(None)
+		self.prefetch_thread.join()
+
+	# a buffer holds one batch, or a whole epoch of batches with epoch sampling
+	def next_buffer(self):
+		if self.prefetch > 0:
+			return self.ready_buffers.get()
+		self.sampling_into(self.sample_buffer)
+		return self.sample_buffer
+
+	def release_buffer(self, buf):
+		if self.prefetch > 0:
+			self.free_buffers.put(buf)
+
+	def refresh_hard_negatives(self, batch_h, batch_t, batch_r):
+		query = [np.ascontiguousarray(x, dtype = np.int64) for x in (batch_h, batch_t, batch_r)]
+		size = len(batch_h) * 2 * self.hard_pool
+		cand = [np.zeros(size, dtype = np.int64) for i in range(3)]
+		query_addr = [x.__array_interface__['data'][0] for x in query]
+		cand_addr = [x.__array_interface__['data'][0] for x in cand]
+		self.lib.getHardCandidates(query_addr[0], query_addr[1], query_addr[2], len(batch_h), self.hard_pool, cand_addr[0], cand_addr[1], cand_addr[2])
+		score = np.ascontiguousarray(self.test_step(cand[0], cand[1], cand[2]).reshape(-1), dtype = np.float32)
+		self.lib.updateHardCache(query_addr[0], query_addr[1], query_addr[2], len(batch_h), self.hard_pool, cand_addr[0], cand_addr[1], score.__array_interface__['data'][0])
+
+	def get_hard_negative_stats(self):
+		stats = np.zeros(5, dtype = np.int64)
+		self.lib.getHardCacheStats(stats.__array_interface__['data'][0])
+		lookups, hits, inserts, evictions, occupied = [int(x) for x in stats]
+		return {"lookups": lookups, "hits": hits, "hit_rate": float(hits) / max(lookups, 1), \
+			"inserts": inserts, "evictions": evictions, "occupied": occupied, "slots": self.hard_slots}
+
+	def append_triples(self, h, t, r, ent_total = 0, rel_total = 0):
+		r'''
+		add training triples to the loaded dataset without importing it again;
+		entity and relation ids past the current totals are added with them and
+		the totals grow to at least ent_total and rel_total. Triples that are
+		already training triples are skipped. If a model is set, its variables
+		grow with the totals (see grow_model) and the next run() continues
+		training it, biased towards the new triples by set_recent_bias. Call it
+		between runs, while no batch is being sampled. Returns the number of
+		triples added.
+		'''
+		h, t, r = [np.ascontiguousarray(x, dtype = np.int64) for x in (h, t, r)]
+		added = self.lib.appendTriples(h.__array_interface__['data'][0], t.__array_interface__['data'][0], r.__array_interface__['data'][0], len(h), ent_total, rel_total)
+		if added < 0:
+			raise ValueError("triples can only be appended to imported training triples with non-negative ids")
+		self.relTotal = self.lib.getRelationTotal()
+		self.entTotal = self.lib.getEntityTotal()
+		self.trainTotal = self.lib.getTrainTotal()
+		if self.recent_ratio > 0:
+			self.lib.setRecentBias(self.recent_ratio, self.recent_steps)
+		if self.trainModel != None:
+			self.grow_model()
+		return added
+
+	def grow_model(self):
+		r'''
+		rebuild the model for the current entity and relation totals and batch
+		size. Every variable, optimizer slots included, keeps its values; the
+		rows of new ids get the initializer's values and fresh slots.
+		'''
+		with self.graph.as_default():
+			variables = tf.global_variables()
+			values = dict(zip([var.name for var in variables], self.sess.run(variables)))
+		self.sess.close()
+		if self.optimizer_built:
+			self.optimizer = None
+		self.init_batches()
+		if self.test_link_prediction:
+			self.test_h = np.zeros(self.entTotal, dtype = np.int64)
+			self.test_t = np.zeros(self.entTotal, dtype = np.int64)
+			self.test_r = np.zeros(self.entTotal, dtype = np.int64)
+			self.test_h_addr = self.test_h.__array_interface__['data'][0]
+			self.test_t_addr = self.test_t.__array_interface__['data'][0]
+			self.test_r_addr = self.test_r.__array_interface__['data'][0]
+		if self.test_triple_classification:
+			self.relThresh = np.zeros(self.relTotal, dtype = np.float32)
+			self.relThresh_addr = self.relThresh.__array_interface__['data'][0]
+		self.set_model(self.model)
+		with self.graph.as_default():
+			with self.sess.as_default():
+				for var in tf.global_variables():
+					if var.name not in values:
+						continue
+					old = values[var.name]
+					value = self.sess.run(var)
+					if old.shape[1:] != value.shape[1:] or (old.ndim > 0 and old.shape[0] > value.shape[0]):
+						raise ValueError("%s cannot grow from %s to %s" % (var.name, old.shape, value.shape))
+					if old.ndim > 0:
+						value[:old.shape[0]] = old
+					else:
+						value = old
+					holder = tf.placeholder(var.dtype.base_dtype, value.shape)
+					self.sess.run(tf.assign(var, holder), {holder: value})
+
 	# save model
 	def save_tensorflow(self):
 		with self.graph.as_default():
@@ -276,6 +582,7 @@ class Config(object):
 				initializer = tf.contrib.layers.xavier_initializer(uniform = True)
 				with tf.variable_scope("model", reuse=None, initializer = initializer):
 					self.trainModel = self.model(config = self)
+					self.optimizer_built = self.optimizer == None
 					if self.optimizer != None:
 						pass
 					elif self.opt_method == "Adagrad" or self.opt_method == "adagrad":
@@ -310,21 +617,152 @@ class Config(object):
 		predict = self.sess.run(self.trainModel.predict, feed_dict)
 		return predict
 
+	def rank_scores(self, sampled = False):
+		r'''
+		the [head, tail] batch scores of the model, built in its graph when first asked for
+		'''
+		with self.graph.as_default():
+			return self.trainModel.get_rank_scores(sampled)
+
+	def test_link_batches(self):
+		r'''
+		link prediction over all test triples: every unique (?, r, t) and
+		(h, r, ?) query is scored once, test_batch_size queries per run, and
+		each test triple asking it is ranked against those scores; the rank
+		workers are started once for the run and joined at its end
+		'''
+		total = self.lib.getTestTotal()
+		query_h = np.zeros(total, dtype = np.int64)
+		query_t = np.zeros(total, dtype = np.int64)
+		query_r = np.zeros(total, dtype = np.int64)
+		for side, scores in enumerate(self.rank_scores()):
+			queries = self.lib.groupLinkQueries(side, query_h.__array_interface__['data'][0], query_t.__array_interface__['data'][0], query_r.__array_interface__['data'][0])
+			if self.log_on:
+				print("%s: %d unique queries for %d test triples" % (["head", "tail"][side], queries, total))
+			for lef in range(0, queries, self.test_batch_size):
+				rig = min(lef + self.test_batch_size, queries)
+				feed_dict = {
+					self.trainModel.rank_h: query_h[lef:rig],
+					self.trainModel.rank_t: query_t[lef:rig],
+					self.trainModel.rank_r: query_r[lef:rig],
+				}
+				res = self.sess.run(scores, feed_dict)
+				self.lib.testLinkQueries(side, res.__array_interface__['data'][0], lef, rig - lef)
+				if self.log_on:
+					print(rig)
+		self.lib.stopRankPool()
+
+	def sample_validation(self):
+		r'''
+		the validation triples and candidates of fast_validation. Every relation
+		gets a share of valid_size proportional to its validation triples, and at
+		least one; the draw only depends on the seed and is kept while the
+		settings stay the same.
+		'''
+		key = (self.valid_size, self.valid_candidates, self.entTotal)
+		if self.valid_sample is not None and self.valid_sample[0] == key:
+			return self.valid_sample[1]
+		if self.lib.getValidTotal() == 0:
+			self.lib.importTestFiles()
+		total = self.lib.getValidTotal()
+		valid = [np.zeros(total, dtype = np.int64) for i in range(3)]
+		self.lib.getValidTriples(*[x.__array_interface__['data'][0] for x in valid])
+		rng = np.random.RandomState(self.seed)
+		if self.valid_size >= total:
+			chosen = np.arange(total)
+		else:
+			order = np.argsort(valid[2], kind = "mergesort")
+			relations, first, counts = np.unique(valid[2][order], return_index = True, return_counts = True)
+			share = np.minimum(counts, np.maximum(1, np.round(counts * float(self.valid_size) / total).astype(np.int64)))
+			chosen = np.sort(np.concatenate([order[lef + rng.choice(count, size, replace = False)] for lef, count, size in zip(first, counts, share)]))
+		candidates = None
+		if 0 < self.valid_candidates < self.entTotal:
+			candidates = np.sort(rng.choice(self.entTotal, self.valid_candidates, replace = False)).astype(np.int64)
+		sample = [np.ascontiguousarray(x[chosen]) for x in valid] + [candidates]
+		self.valid_sample = (key, sample)
+		return sample
+
+	def fast_validation(self):
+		r'''
+		filtered link prediction on a sample of the validation triples, see
+		set_fast_validation. Returns a dict with "MRR", "MR", "hit@10", "hit@3"
+		and "hit@1", each a (value, low, high) tuple whose bounds come from a
+		percentile bootstrap over the queries, and "queries", "candidates" and
+		"seconds". Against sampled candidates the ranks are among those
+		candidates only, so the values are higher than full-ranking ones.
+		'''
+		start = time.time()
+		valid_h, valid_t, valid_r, candidates = self.sample_validation()
+		total = len(valid_r)
+		batch = self.test_batch_size if self.test_batch_size > 0 else 64
+		cand_addr = candidates.__array_interface__['data'][0] if candidates is not None else None
+		ranks = np.zeros(2 * total, dtype = np.int64)
+		scores = self.rank_scores(candidates is not None)
+		for lef in range(0, total, batch):
+			rig = min(lef + batch, total)
+			query = [valid_h[lef:rig], valid_t[lef:rig], valid_r[lef:rig]]
+			feed_dict = {
+				self.trainModel.rank_h: query[0],
+				self.trainModel.rank_t: query[1],
+				self.trainModel.rank_r: query[2],
+			}
+			if candidates is not None:
+				feed_dict[self.trainModel.rank_candidates] = candidates
+			for side, res in enumerate(self.sess.run(scores, feed_dict)):
+				res = np.ascontiguousarray(res, dtype = np.float32)
+				out = ranks[side * total + lef:side * total + rig]
+				self.lib.rankQueries(side, *[x.__array_interface__['data'][0] for x in query], rig - lef, res.__array_interface__['data'][0], cand_addr, len(candidates) if candidates is not None else 0, out.__array_interface__['data'][0])
+		ranks += 1
+		rng = np.random.RandomState(self.seed)
+		resample = ranks[rng.randint(0, len(ranks), (self.valid_bootstrap, len(ranks)))]
+		tail = (1 - self.valid_confidence) / 2 * 100
+		result = {"queries": len(ranks), "candidates": len(candidates) if candidates is not None else self.entTotal}
+		for name, value in [("MRR", lambda x: np.mean(1.0 / x, -1)), ("MR", lambda x: np.mean(x, -1)),
+				("hit@10", lambda x: np.mean(x <= 10, -1)), ("hit@3", lambda x: np.mean(x <= 3, -1)), ("hit@1", lambda x: np.mean(x <= 1, -1))]:
+			low, high = np.percentile(value(resample), [tail, 100 - tail])
+			result[name] = (float(value(ranks)), float(low), float(high))
+		result["seconds"] = time.time() - start
+		return result
+
 	def run(self):
 		with self.graph.as_default():
 			with self.sess.as_default():
 				if self.importName != None:
 					self.restore_tensorflow()
+				if self.epoch_sampling:
+					buffers, steps = 1, self.nbatches
+				else:
+					buffers, steps = self.nbatches, 1
+				if self.prefetch > 0:
+					self.start_prefetch(self.train_times * buffers)
+				global_step = 0
 				for times in range(self.train_times):
 					res = 0.0
-					for batch in range(self.nbatches):
-						self.sampling()
-						res += self.train_step(self.batch_h, self.batch_t, self.batch_r, self.batch_y)
+					for batch in range(buffers):
+						batch_h, batch_t, batch_r, batch_y = buf = self.next_buffer()
+						for step in range(steps):
+							lef = step * self.batch_seq_size
+							rig = lef + self.batch_seq_size
+							res += self.train_step(batch_h[lef:rig], batch_t[lef:rig], batch_r[lef:rig], batch_y[lef:rig])
+							global_step += 1
+							if self.hard_ratio > 0 and global_step % self.hard_refresh_steps == 0:
+								pos = lef + self.batch_size
+								self.refresh_hard_negatives(batch_h[lef:pos], batch_t[lef:pos], batch_r[lef:pos])
+						self.release_buffer(buf)
 					if self.log_on:
 						print(times)
 						print(res)
+						if self.hard_ratio > 0:
+							print(self.get_hard_negative_stats())
+					if self.valid_epochs > 0 and (times + 1) % self.valid_epochs == 0:
+						res = self.fast_validation()
+						self.valid_history.append((times + 1, res))
+						if self.log_on:
+							print("validation: MRR %f [%f, %f] hit@10 %f [%f, %f] (%d queries, %.2fs)" % (res["MRR"] + res["hit@10"] + (res["queries"], res["seconds"])))
 					if self.exportName != None and (self.export_steps!=0 and times % self.export_steps == 0):
 						self.save_tensorflow()
+				if self.prefetch > 0:
+					self.stop_prefetch()
 				if self.exportName != None:
 					self.save_tensorflow()
 				if self.out_path != None:
@@ -336,17 +774,21 @@ class Config(object):
 				if self.importName != None:
 					self.restore_tensorflow()
 				if self.test_link_prediction:
-					total = self.lib.getTestTotal()
-					for times in range(total):
-						self.lib.getHeadBatch(self.test_h_addr, self.test_t_addr, self.test_r_addr)
-						res = self.test_step(self.test_h, self.test_t, self.test_r)
-						self.lib.testHead(res.__array_interface__['data'][0])
-
-						self.lib.getTailBatch(self.test_h_addr, self.test_t_addr, self.test_r_addr)
-						res = self.test_step(self.test_h, self.test_t, self.test_r)
-						self.lib.testTail(res.__array_interface__['data'][0])
-						if self.log_on:
-							print(times)
+					self.lib.resetLinkPrediction()
+					if self.test_batch_size > 0:
+						self.test_link_batches()
+					else:
+						total = self.lib.getTestTotal()
+						for times in range(total):
+							self.lib.getHeadBatch(self.test_h_addr, self.test_t_addr, self.test_r_addr)
+							res = self.test_step(self.test_h, self.test_t, self.test_r)
+							self.lib.testHead(res.__array_interface__['data'][0])
+
+							self.lib.getTailBatch(self.test_h_addr, self.test_t_addr, self.test_r_addr)
+							res = self.test_step(self.test_h, self.test_t, self.test_r)
+							self.lib.testTail(res.__array_interface__['data'][0])
+							if self.log_on:
+								print(times)
 					self.lib.test_link_prediction()
 				if self.test_triple_classification:
 					self.lib.getValidBatch(self.valid_pos_h_addr, self.valid_pos_t_addr, self.valid_pos_r_addr, self.valid_neg_h_addr, self.valid_neg_t_addr, self.valid_neg_r_addr)
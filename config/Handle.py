@@ -0,0 +1,148 @@
+#coding:utf-8
+import os
+import ctypes
+import functools
+import numpy as np
+
+class Handle(object):
+	r'''
+	one dataset, its samplers and its evaluation state inside release/Base.so.
+
+	Every exported C function takes the native handle as its first argument;
+	attributes of a Handle are those functions with the handle already bound,
+	so ``handle.sampling(...)`` calls ``sampling(handle, ...)``. Handles share
+	nothing, so several of them can load, sample and evaluate different
+	datasets in one process and from different threads.
+	'''
+	lib = None
+	argtypes = {
+		"setInPath": [ctypes.c_char_p],
+		"setOutPath": [ctypes.c_char_p],
+		"compileDataset": [ctypes.c_char_p],
+		"loadDataset": [ctypes.c_char_p],
+		"parseTextFile": [ctypes.c_char_p],
+		"ingestTriples": [ctypes.c_char_p, ctypes.c_char_p],
+		"writeIngestIds": [ctypes.c_char_p, ctypes.c_char_p],
+		"setWorkThreads": [ctypes.c_int64],
+		"setCompactStorage": [ctypes.c_int64],
+		"getMemoryReport": [ctypes.c_void_p],
+		"getBaselineMemoryReport": [ctypes.c_void_p],
+		"getGraphIndex": [ctypes.c_int64, ctypes.c_void_p, ctypes.c_void_p],
+		"appendTriples": [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int64, ctypes.c_int64, ctypes.c_int64],
+		"setRecentBias": [ctypes.c_float, ctypes.c_int64],
+		"setBern": [ctypes.c_int64],
+		"setSeed": [ctypes.c_uint64],
+		"setSampleMode": [ctypes.c_int64],
+		"setNegSampling": [ctypes.c_int64, ctypes.c_float],
+		"setTypeConstrain": [ctypes.c_float],
+		"setHardNegatives": [ctypes.c_float, ctypes.c_int64, ctypes.c_int64],
+		"getHardCandidates": [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int64, ctypes.c_int64, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p],
+		"updateHardCache": [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int64, ctypes.c_int64, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p],
+		"getHardCacheStats": [ctypes.c_void_p],
+		"sampling": [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int64, ctypes.c_int64, ctypes.c_int64],
+		"samplingEpoch": [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int64, ctypes.c_int64, ctypes.c_int64, ctypes.c_int64],
+		"getHeadBatch": [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p],
+		"getTailBatch": [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p],
+		"testHead": [ctypes.c_void_p],
+		"testTail": [ctypes.c_void_p],
+		"getTestTriples": [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p],
+		"testLinkBatch": [ctypes.c_int64, ctypes.c_void_p, ctypes.c_int64],
+		"getLinkStats": [ctypes.c_void_p],
+		"groupLinkQueries": [ctypes.c_int64, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p],
+		"testLinkQueries": [ctypes.c_int64, ctypes.c_void_p, ctypes.c_int64, ctypes.c_int64],
+		"getValidTriples": [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p],
+		"rankQueries": [ctypes.c_int64, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int64, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int64, ctypes.c_void_p],
+		"getTestBatch": [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p],
+		"getValidBatch": [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p],
+		"getBestThreshold": [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p],
+		"test_triple_classification": [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p],
+	}
+	restypes = {
+		"getWorkThreads": ctypes.c_int64,
+		"getEntityTotal": ctypes.c_int64,
+		"getRelationTotal": ctypes.c_int64,
+		"getTripleTotal": ctypes.c_int64,
+		"getTrainTotal": ctypes.c_int64,
+		"getTestTotal": ctypes.c_int64,
+		"getValidTotal": ctypes.c_int64,
+		"getSampleMode": ctypes.c_int64,
+		"getCompactStorage": ctypes.c_int64,
+		"getGraphIndex": ctypes.c_int64,
+		"appendTriples": ctypes.c_int64,
+		"groupLinkQueries": ctypes.c_int64,
+		"getRecentTotal": ctypes.c_int64,
+		"isSamplerRunning": ctypes.c_int64,
+		"compileDataset": ctypes.c_int64,
+		"loadDataset": ctypes.c_int64,
+		"parseTextFile": ctypes.c_int64,
+		"ingestTriples": ctypes.c_int64,
+		"writeIngestIds": ctypes.c_int64,
+	}
+	# exported functions that take no arguments besides the handle
+	plain = ["randReset", "importTrainFiles", "importTestFiles", "importTypeFiles", "startSampler", "stopSampler", "stopRankPool", "test_link_prediction", "resetLinkPrediction", "releaseDataset", "getNegTest", "getNegValid"]
+
+	@classmethod
+	def load(cls):
+		r'''
+		load release/Base.so once per process and declare the signatures of its functions.
+		'''
+		if cls.lib is None:
+			base_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../release/Base.so'))
+			lib = ctypes.cdll.LoadLibrary(base_file)
+			lib.createHandle.restype = ctypes.c_void_p
+			lib.createHandle.argtypes = []
+			lib.destroyHandle.argtypes = [ctypes.c_void_p]
+			for name in cls.plain:
+				getattr(lib, name).argtypes = [ctypes.c_void_p]
+			for name, types in cls.argtypes.items():
+				getattr(lib, name).argtypes = [ctypes.c_void_p] + types
+			for name, restype in cls.restypes.items():
+				if name not in cls.argtypes:
+					getattr(lib, name).argtypes = [ctypes.c_void_p]
+				getattr(lib, name).restype = restype
+			cls.lib = lib
+		return cls.lib
+
+	def __init__(self):
+		self.handle = ctypes.c_void_p(Handle.load().createHandle())
+
+	def __getattr__(self, name):
+		if name.startswith("__") or self.__dict__.get("handle") is None:
+			raise AttributeError(name)
+		func = functools.partial(getattr(Handle.load(), name), self.handle)
+		setattr(self, name, func)
+		return func
+
+	graph_indexes = ["head", "tail", "rel", "known", "known_tail"]
+
+	def graph_index(self, name):
+		r'''
+		numpy views of a CSR index of base/Graph.h without copying: name is
+		"head" (h -> r -> t), "tail" (t -> r -> h), "rel" (h -> t -> r) or
+		"known" (h -> r -> t over train, valid and test) or "known_tail"
+		(t -> r -> h over train, valid and test). Returns row_offset,
+		pair_key, pair_offset and neighbor; the keys of entity e are
+		pair_key[row_offset[e]:row_offset[e + 1]] and the neighbors of pair p
+		neighbor[pair_offset[p]:pair_offset[p + 1]]. The views are valid while
+		the handle is open and must not be written.
+		'''
+		sizes = np.zeros(3, dtype = np.int64)
+		arrays = (ctypes.c_void_p * 4)()
+		if self.getGraphIndex(Handle.graph_indexes.index(name), sizes.__array_interface__['data'][0], arrays) != 0:
+			raise ValueError("the %s index has not been built" % name)
+		rows, pairs, edges = sizes.tolist()
+		shapes = [(rows + 1, ctypes.c_int64), (pairs, ctypes.c_uint32), (pairs + 1, ctypes.c_int64), (edges, ctypes.c_uint32)]
+		return tuple(np.ctypeslib.as_array(ctypes.cast(arrays[i], ctypes.POINTER(ctype)), shape = (size,)) for i, (size, ctype) in enumerate(shapes))
+
+	def close(self):
+		r'''
+		stop the sampler threads of this handle and release it; the handle cannot be used afterwards.
+		'''
+		handle = self.__dict__.get("handle")
+		if handle is not None and Handle.lib is not None:
+			Handle.lib.destroyHandle(handle)
+		self.__dict__.clear()
+		self.handle = None
+
+	def __del__(self):
+		self.close()
@@ -0,0 +1,39 @@
+#coding:utf-8
+import os
+from .Handle import Handle
+
+def ingest_triples(out_path, train, valid = None, test = None, threads = 4, dataset_file = None):
+	r'''
+	number the raw "head<TAB>relation<TAB>tail" files train, valid and test with
+	the native ingestion of base/Ingest.h and write train2id.txt, valid2id.txt,
+	test2id.txt, entity2id.txt and relation2id.txt to out_path. Ids follow the
+	first occurrence of a name over train, valid and test, and repeated triples
+	are written once; the id triples are spilled to temporary files in out_path
+	meanwhile. With dataset_file the compiled dataset of out_path is
+	written as well (see Config.set_dataset_file). Returns the number of
+	triples written per file.
+	'''
+	if not os.path.exists(out_path):
+		os.makedirs(out_path)
+	lib = Handle()
+	lib.setWorkThreads(threads)
+	totals = {}
+	for name, path in [("train", train), ("valid", valid), ("test", test)]:
+		if path is None:
+			continue
+		total = lib.ingestTriples(path.encode(), os.path.join(out_path, name + "2id.txt").encode())
+		if total < 0:
+			raise IOError("cannot ingest %s" % path)
+		totals[name] = total
+	if lib.writeIngestIds(os.path.join(out_path, "entity2id.txt").encode(), os.path.join(out_path, "relation2id.txt").encode()) != 0:
+		raise IOError("cannot write the id files to %s" % out_path)
+	lib.close()
+	if dataset_file is not None:
+		lib = Handle()
+		lib.setWorkThreads(threads)
+		in_path = os.path.join(out_path, "")
+		lib.setInPath(in_path.encode())
+		if lib.compileDataset(dataset_file.encode()) != 0:
+			raise IOError("cannot write %s" % dataset_file)
+		lib.close()
+	return totals
@@ -1 +1,3 @@
-from .Config import Config
+from .Handle import Handle
+from .Ingest import ingest_triples
+from .Config import Config
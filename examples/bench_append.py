@@ -0,0 +1,38 @@
+#coding:utf-8
+#Time appending batches of new training triples against importing the training files again.
+#Run from the repository root after "bash make.sh":
+#	python -m examples.bench_append ./benchmarks/FB15K237/ ./benchmarks/WN18/
+import sys
+import time
+import ctypes
+import numpy as np
+from config import Handle
+
+paths = sys.argv[1:] if len(sys.argv) > 1 else ["./benchmarks/FB15K237/", "./benchmarks/WN18/"]
+deltas = [1, 100, 10000]
+
+def open_dataset(path):
+	lib = Handle()
+	lib.setInPath(ctypes.create_string_buffer(path.encode(), len(path) * 2))
+	lib.setBern(1)
+	start = time.time()
+	lib.importTrainFiles()
+	return lib, time.time() - start
+
+for path in paths:
+	lib, reload_time = open_dataset(path)
+	lib.close()
+	print("%s\nimportTrainFiles %10.2f ms" % (path, reload_time * 1e3))
+	for delta in deltas:
+		lib, _ = open_dataset(path)
+		ent, rel = lib.getEntityTotal(), lib.getRelationTotal()
+		rng = np.random.RandomState(delta)
+		# a tenth of the batch introduces new entities
+		h = rng.randint(0, ent + delta // 10 + 1, delta).astype(np.int64)
+		t = rng.randint(0, ent, delta).astype(np.int64)
+		r = rng.randint(0, rel, delta).astype(np.int64)
+		start = time.time()
+		added = lib.appendTriples(h.__array_interface__['data'][0], t.__array_interface__['data'][0], r.__array_interface__['data'][0], delta, 0, 0)
+		elapsed = time.time() - start
+		print("append %6d      %10.2f ms  (%d new triples, %d entities)" % (delta, elapsed * 1e3, added, lib.getEntityTotal()))
+		lib.close()
@@ -0,0 +1,74 @@
+#coding:utf-8
+#Count the unique (?, r, t) and (h, r, ?) link-prediction queries of the test triples and time a
+#full filtered evaluation scoring every test triple against scoring every unique query once.
+#Scores come from a random 20-dimensional DistMult; scoring and native ranking are timed apart,
+#since deduplication saves scoring while every test triple is still ranked. Both runs must give
+#the same metrics.
+#Run from the repository root after "bash make.sh":
+#	python -m examples.bench_dedup ./benchmarks/FB15K/ ./benchmarks/WN18/
+import os
+import sys
+import time
+import ctypes
+import numpy as np
+from config import Handle
+
+paths = sys.argv[1:] if len(sys.argv) > 1 else [os.path.join("./benchmarks", name, "") for name in ["FB13", "FB15K", "FB15K237", "WN11", "WN18", "WN18RR"]]
+batch = 256
+dim = 20
+
+def address(array):
+	return array.__array_interface__['data'][0]
+
+def scores(ent, rel, known, r, side):
+	# DistMult is symmetric, so head and tail candidates score alike
+	res = np.dot(ent[known] * rel[r], ent.T)
+	return np.ascontiguousarray(res, dtype = np.float32)
+
+def evaluate(lib, ent, rel, dedup):
+	total = lib.getTestTotal()
+	query = [np.zeros(total, dtype = np.int64) for i in range(3)]
+	lib.resetLinkPrediction()
+	scored = 0
+	score_time = rank_time = 0.0
+	for side in range(2):
+		if dedup:
+			queries = lib.groupLinkQueries(side, *[address(x) for x in query])
+		else:
+			lib.getTestTriples(*[address(x) for x in query])
+			queries = total
+		known = query[1] if side == 0 else query[0]
+		for lef in range(0, queries, batch):
+			rig = min(lef + batch, queries)
+			start = time.time()
+			res = scores(ent, rel, known[lef:rig], query[2][lef:rig], side)
+			score_time += time.time() - start
+			start = time.time()
+			if dedup:
+				lib.testLinkQueries(side, address(res), lef, rig - lef)
+			else:
+				lib.testLinkBatch(side, address(res), rig - lef)
+			rank_time += time.time() - start
+		scored += queries
+	stats = np.zeros(40, dtype = np.float32)
+	lib.getLinkStats(address(stats))
+	return scored, score_time, rank_time, stats
+
+print("%-24s%9s%8s%8s%7s%11s%11s%11s%11s%6s" % ("dataset", "triples", "heads", "tails", "ratio", "score all", "score uniq", "rank all", "rank uniq", "same"))
+for path in paths:
+	lib = Handle()
+	lib.setInPath(ctypes.create_string_buffer(path.encode(), len(path) * 2))
+	lib.importTrainFiles()
+	lib.importTestFiles()
+	lib.importTypeFiles()
+	rng = np.random.RandomState(0)
+	ent = rng.rand(lib.getEntityTotal(), dim).astype(np.float32)
+	rel = rng.rand(lib.getRelationTotal(), dim).astype(np.float32)
+	total = lib.getTestTotal()
+	query = [np.zeros(total, dtype = np.int64) for i in range(3)]
+	heads = lib.groupLinkQueries(0, *[address(x) for x in query])
+	tails = lib.groupLinkQueries(1, *[address(x) for x in query])
+	_, full_score, full_rank, full_stats = evaluate(lib, ent, rel, False)
+	scored, dedup_score, dedup_rank, dedup_stats = evaluate(lib, ent, rel, True)
+	print("%-24s%9d%8d%8d%7.3f%10.2fs%10.2fs%10.2fs%10.2fs%6s" % (path, total, heads, tails, scored / (2.0 * total), full_score, dedup_score, full_rank, dedup_rank, np.array_equal(full_stats, dedup_stats)))
+	lib.close()
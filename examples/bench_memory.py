@@ -0,0 +1,35 @@
+#coding:utf-8
+#Compare the memory held by the triple storage in the original layout, the default and the compact mode.
+#Run from the repository root after "bash make.sh":
+#	python -m examples.bench_memory ./benchmarks/FB15K237/ ./benchmarks/WN18/
+import sys
+import ctypes
+import numpy as np
+from config import Handle
+
+paths = sys.argv[1:] if len(sys.argv) > 1 else ["./benchmarks/FB15K237/", "./benchmarks/WN18/"]
+rows = ["train triples", "graph indexes", "triple set", "filter indexes", "total"]
+
+def ratio(a, b):
+	return "%.2f" % (a / float(b)) if b > 0 else "-"
+
+for path in paths:
+	reports = []
+	for compact in [0, 1]:
+		lib = Handle()
+		lib.setInPath(ctypes.create_string_buffer(path.encode(), len(path) * 2))
+		lib.setCompactStorage(compact)
+		lib.importTrainFiles()
+		lib.importTestFiles()
+		if compact == 0:
+			report = np.zeros(len(rows), dtype = np.int64)
+			lib.getBaselineMemoryReport(report.__array_interface__['data'][0])
+			reports.append(report)
+		report = np.zeros(len(rows), dtype = np.int64)
+		lib.getMemoryReport(report.__array_interface__['data'][0])
+		reports.append(report)
+		lib.close()
+	baseline, default, compact = reports
+	print("%s\n%-16s%12s%12s%12s%10s%10s" % (path, "MB", "baseline", "default", "compact", "base/cmp", "def/cmp"))
+	for i, name in enumerate(rows):
+		print("%-16s%12.2f%12.2f%12.2f%10s%10s" % (name, baseline[i] / 1e6, default[i] / 1e6, compact[i] / 1e6, ratio(baseline[i], compact[i]), ratio(default[i], compact[i])))
@@ -0,0 +1,33 @@
+#coding:utf-8
+#Report the throughput of the native text parser on the *2id.txt and type_constrain.txt files.
+#Run from the repository root after "bash make.sh":
+#	python -m examples.bench_parse ./benchmarks/FB15K237/ ./benchmarks/WN18/
+import os
+import sys
+import time
+import ctypes
+from config import Handle
+
+paths = sys.argv[1:] if len(sys.argv) > 1 else ["./benchmarks/FB15K237/", "./benchmarks/WN18/"]
+files = ["train2id.txt", "valid2id.txt", "test2id.txt", "type_constrain.txt"]
+repeats = 5
+
+lib = Handle()
+print("file\tMB\tthreads\tintegers\tMB/s")
+for path in paths:
+	for name in files:
+		file_name = os.path.join(path, name)
+		if not os.path.exists(file_name):
+			print("%s\tmissing, skipped" % file_name)
+			continue
+		size = os.path.getsize(file_name) / 1e6
+		buf = ctypes.create_string_buffer(file_name.encode(), len(file_name) * 2)
+		for threads in [1, 2, 4, 8]:
+			lib.setWorkThreads(threads)
+			best = None
+			for i in range(repeats):
+				start = time.time()
+				total = lib.parseTextFile(buf)
+				cost = time.time() - start
+				best = cost if best is None or cost < best else best
+			print("%s\t%.2f\t%d\t%d\t%.1f" % (file_name, size, threads, total, size / best))
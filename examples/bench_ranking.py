@@ -0,0 +1,42 @@
+#coding:utf-8
+#Time the native link-prediction ranking of testLinkBatch with 1 to 8 threads on random scores
+#and check that every thread count gives the same metrics.
+#Run from the repository root after "bash make.sh":
+#	python -m examples.bench_ranking ./benchmarks/FB15K237/ 2000 256
+#A small batch size such as 8 shows the cost of handing every batch to the rank workers.
+import sys
+import time
+import ctypes
+import numpy as np
+from config import Handle
+
+path = sys.argv[1] if len(sys.argv) > 1 else "./benchmarks/FB15K237/"
+queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+batch = int(sys.argv[3]) if len(sys.argv) > 3 else 256
+
+lib = Handle()
+lib.setInPath(ctypes.create_string_buffer(path.encode(), len(path) * 2))
+lib.importTrainFiles()
+lib.importTestFiles()
+lib.importTypeFiles()
+ent = lib.getEntityTotal()
+queries = min(queries, lib.getTestTotal())
+scores = np.random.RandomState(0).rand(batch, ent).astype(np.float32)
+scores_addr = scores.__array_interface__['data'][0]
+stats = np.zeros(40, dtype = np.float32)
+
+reference = None
+for threads in [1, 2, 4, 8]:
+	lib.setWorkThreads(threads)
+	lib.resetLinkPrediction()
+	start = time.time()
+	for lef in range(0, queries, batch):
+		size = min(batch, queries - lef)
+		lib.testLinkBatch(0, scores_addr, size)
+		lib.testLinkBatch(1, scores_addr, size)
+	elapsed = time.time() - start
+	lib.getLinkStats(stats.__array_interface__['data'][0])
+	if reference is None:
+		reference = stats.copy()
+	print("threads %d  %8.2f ms  %8.0f queries/s  same metrics: %s" % (threads, elapsed * 1e3, 2 * queries / elapsed, np.array_equal(stats, reference)))
+lib.close()
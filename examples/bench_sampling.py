@@ -0,0 +1,46 @@
+#coding:utf-8
+#Compare batches/sec of the per-call pthread sampler and the persistent sampler pool.
+#Run from the repository root after "bash make.sh":
+#	python -m examples.bench_sampling ./benchmarks/FB15K237/ 100
+import sys
+import time
+import ctypes
+import numpy as np
+from config import Handle
+
+in_path = sys.argv[1] if len(sys.argv) > 1 else "./benchmarks/FB15K237/"
+nbatches = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+rounds = 500
+negative_ent = 1
+negative_rel = 0
+
+lib = Handle()
+lib.setInPath(ctypes.create_string_buffer(in_path.encode(), len(in_path) * 2))
+lib.randReset()
+lib.importTrainFiles()
+
+batch_size = int(lib.getTrainTotal() / nbatches)
+batch_seq_size = batch_size * (1 + negative_ent + negative_rel)
+batch_h = np.zeros(batch_seq_size, dtype = np.int64)
+batch_t = np.zeros(batch_seq_size, dtype = np.int64)
+batch_r = np.zeros(batch_seq_size, dtype = np.int64)
+batch_y = np.zeros(batch_seq_size, dtype = np.float32)
+addr = [x.__array_interface__['data'][0] for x in (batch_h, batch_t, batch_r, batch_y)]
+
+def measure():
+	start = time.time()
+	for i in range(rounds):
+		lib.sampling(addr[0], addr[1], addr[2], addr[3], batch_size, negative_ent, negative_rel)
+	return rounds / (time.time() - start)
+
+print("batch size: %d" % batch_size)
+print("threads\tper-call (batches/s)\tpool (batches/s)\tspeedup")
+for threads in [1, 2, 4, 8, 16]:
+	lib.setWorkThreads(threads)
+	lib.randReset()
+	lib.stopSampler()
+	spawn = measure()
+	lib.startSampler()
+	pool = measure()
+	lib.stopSampler()
+	print("%d\t%f\t%f\t%.2fx" % (threads, spawn, pool, pool / spawn))
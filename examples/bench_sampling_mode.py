@@ -0,0 +1,36 @@
+#coding:utf-8
+#Report TransE training loss against wall-clock time for each positive sampling mode.
+#Run from the repository root after "bash make.sh":
+#	python -m examples.bench_sampling_mode ./benchmarks/FB15K237/ 20
+import sys
+import time
+import config
+import models
+
+in_path = sys.argv[1] if len(sys.argv) > 1 else "./benchmarks/FB15K237/"
+epochs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+for mode in ["uniform", "shuffle", "locality"]:
+	con = config.Config()
+	con.set_in_path(in_path)
+	con.set_work_threads(4)
+	con.set_nbatches(100)
+	con.set_alpha(0.001)
+	con.set_margin(1.0)
+	con.set_dimension(50)
+	con.set_ent_neg_rate(1)
+	con.set_rel_neg_rate(0)
+	con.set_opt_method("SGD")
+	con.set_sampling_mode(mode)
+	con.init()
+	con.set_model(models.TransE)
+	print("mode: %s" % mode)
+	print("epoch\tseconds\tloss")
+	start = time.time()
+	for times in range(epochs):
+		res = 0.0
+		for batch in range(con.nbatches):
+			batch_h, batch_t, batch_r, batch_y = con.next_buffer()
+			res += con.train_step(batch_h, batch_t, batch_r, batch_y)
+		print("%d\t%f\t%f" % (times, time.time() - start, res))
+	con.stop_sampler()
@@ -0,0 +1,27 @@
+#coding:utf-8
+#Compile the text files of a benchmark into the binary file read by Config.set_dataset_file,
+#then report how long parsing and mapping take.
+#Run from the repository root after "bash make.sh":
+#	python -m examples.compile_dataset ./benchmarks/FB15K237/ ./benchmarks/FB15K237/dataset.bin
+import sys
+import time
+import ctypes
+from config import Handle
+
+in_path = sys.argv[1] if len(sys.argv) > 1 else "./benchmarks/FB15K237/"
+out_file = sys.argv[2] if len(sys.argv) > 2 else in_path + "dataset.bin"
+
+lib = Handle()
+lib.setInPath(ctypes.create_string_buffer(in_path.encode(), len(in_path) * 2))
+start = time.time()
+if lib.compileDataset(ctypes.create_string_buffer(out_file.encode(), len(out_file) * 2)) != 0:
+	sys.exit(1)
+parse = time.time() - start
+lib.close()
+
+lib = Handle()
+start = time.time()
+lib.loadDataset(ctypes.create_string_buffer(out_file.encode(), len(out_file) * 2))
+load = time.time() - start
+print("parse and compile: %f s" % parse)
+print("map compiled file: %f s" % load)
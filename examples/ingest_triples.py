@@ -0,0 +1,20 @@
+#coding:utf-8
+#Number raw "head<TAB>relation<TAB>tail" files into the *2id.txt layout of the benchmarks.
+#Run from the repository root after "bash make.sh":
+#	python -m examples.ingest_triples ./raw/ ./benchmarks/MyData/ train.txt valid.txt test.txt 8
+import os
+import sys
+import time
+from config import ingest_triples
+
+raw_path = sys.argv[1]
+out_path = sys.argv[2]
+names = sys.argv[3:6] if len(sys.argv) > 5 else ["train.txt", "valid.txt", "test.txt"]
+threads = int(sys.argv[6]) if len(sys.argv) > 6 else 4
+
+files = [os.path.join(raw_path, name) for name in names]
+start = time.time()
+totals = ingest_triples(out_path, *[path if os.path.exists(path) else None for path in files], threads = threads)
+cost = time.time() - start
+size = sum(os.path.getsize(path) for path in files if os.path.exists(path)) / 1e6
+print("%s: %s in %.2f s (%.1f MB/s)" % (out_path, totals, cost, size / cost))
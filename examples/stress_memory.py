@@ -0,0 +1,94 @@
+#coding:utf-8
+#Check that the resident memory of a long-lived evaluation process stays flat.
+#Every cycle ranks a few test triples, runs triple classification and resets the random
+#state; every 100 cycles the dataset is imported again and a second handle is created,
+#loaded from a compiled dataset and destroyed. Exits with 1 if the memory grows.
+#Run from the repository root after "bash make.sh":
+#	python -m examples.stress_memory ./benchmarks/FB15K237/ 2000
+import os
+import sys
+import shutil
+import ctypes
+import tempfile
+import numpy as np
+from config import Handle
+
+source = sys.argv[1] if len(sys.argv) > 1 else "./benchmarks/FB15K237/"
+cycles = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+queries = 4
+# allowed growth after the warm-up cycles, in MB
+tolerance = 8
+
+def rss():
+	with open("/proc/self/statm", "r") as f:
+		return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+def address(array):
+	return array.__array_interface__['data'][0]
+
+# getTestBatch writes test_neg.txt next to the test files, so work on a copy
+path = tempfile.mkdtemp() + "/"
+for name in ["entity2id.txt", "relation2id.txt", "train2id.txt", "valid2id.txt", "test2id.txt", "type_constrain.txt"]:
+	shutil.copy(os.path.join(source, name), path)
+dataset = path + "dataset.bin"
+
+def open_handle(load):
+	lib = Handle()
+	lib.setInPath(ctypes.create_string_buffer(path.encode(), len(path) * 2))
+	lib.randReset()
+	if load:
+		if lib.loadDataset(ctypes.create_string_buffer(dataset.encode(), len(dataset) * 2)) != 0:
+			lib.compileDataset(ctypes.create_string_buffer(dataset.encode(), len(dataset) * 2))
+	else:
+		lib.importTrainFiles()
+		lib.importTestFiles()
+		lib.importTypeFiles()
+	return lib
+
+# the native functions print every query; keep the terminal for the report
+stdout = os.dup(1)
+os.dup2(os.open(os.devnull, os.O_WRONLY), 1)
+lib = open_handle(False)
+ent, rel = lib.getEntityTotal(), lib.getRelationTotal()
+test, valid = lib.getTestTotal(), lib.getValidTotal()
+batch = [np.zeros(ent, dtype = np.int64) for i in range(3)]
+test_batch = [np.zeros(test, dtype = np.int64) for i in range(6)]
+valid_batch = [np.zeros(valid, dtype = np.int64) for i in range(6)]
+thresh = np.zeros(rel, dtype = np.float32)
+rng = np.random.RandomState(0)
+samples = []
+for cycle in range(cycles):
+	lib.resetLinkPrediction()
+	for i in range(queries):
+		score = rng.rand(ent).astype(np.float32)
+		lib.getHeadBatch(*[address(x) for x in batch])
+		lib.testHead(address(score))
+		lib.getTailBatch(*[address(x) for x in batch])
+		lib.testTail(address(score))
+	lib.test_link_prediction()
+	lib.getValidBatch(*[address(x) for x in valid_batch])
+	pos, neg = rng.rand(valid).astype(np.float32), rng.rand(valid).astype(np.float32)
+	lib.getBestThreshold(address(thresh), address(pos), address(neg))
+	lib.getTestBatch(*[address(x) for x in test_batch])
+	pos, neg = rng.rand(test).astype(np.float32), rng.rand(test).astype(np.float32)
+	lib.test_triple_classification(address(thresh), address(pos), address(neg))
+	lib.randReset()
+	if cycle % 100 == 99:
+		lib.importTrainFiles()
+		lib.importTestFiles()
+		other = open_handle(True)
+		other.close()
+	samples.append(rss())
+lib.close()
+os.dup2(stdout, 1)
+shutil.rmtree(path)
+
+# the first quarter lets the allocator reach its working set; then the median must not move
+warm, window = cycles // 4, max(1, cycles // 10)
+before = np.median(samples[warm:warm + window])
+after = np.median(samples[-window:])
+growth = after - before
+print("resident MB every %d cycles: %s" % (window, " ".join("%.1f" % x for x in samples[window - 1::window])))
+print("%d cycles: %.1f MB after the warm-up, %.1f MB at the end, %.1f MB peak" % (cycles, before, after, max(samples)))
+print("memory growth %.2f MB: %s" % (growth, "ok" if growth <= tolerance else "LEAK"))
+sys.exit(0 if growth <= tolerance else 1)
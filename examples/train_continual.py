@@ -0,0 +1,45 @@
+#coding:utf-8
+#Continue training a model on triples that arrived after it was trained, instead of retraining it.
+#The new triples are a file in the *2id.txt layout and may use new entity and relation ids.
+#Run from the repository root after "bash make.sh":
+#	python -m examples.train_continual ./benchmarks/FB15K/ ./new2id.txt ./res/model.vec.tf
+import sys
+import numpy as np
+import config
+import models
+
+in_path = sys.argv[1]
+new_path = sys.argv[2]
+model_path = sys.argv[3]
+
+con = config.Config()
+con.set_in_path(in_path)
+con.set_work_threads(4)
+con.set_train_times(500)
+con.set_nbatches(100)
+con.set_alpha(0.001)
+con.set_margin(1.0)
+con.set_bern(0)
+con.set_dimension(100)
+con.set_ent_neg_rate(1)
+con.set_rel_neg_rate(0)
+con.set_opt_method("Adam")
+con.init()
+con.set_model(models.TransE)
+#Train on the dataset, or restore the model trained on it before.
+if len(sys.argv) > 4 and sys.argv[4] == "restore":
+	con.import_variables(model_path)
+else:
+	con.run()
+	con.export_variables(model_path)
+
+with open(new_path, "r") as f:
+	total = int(f.readline())
+new = np.loadtxt(new_path, dtype = np.int64, skiprows = 1, max_rows = total, ndmin = 2).reshape(-1, 3)
+#Half of the positives of the first 20 epochs come from the new triples.
+con.set_recent_bias(0.5, 20 * con.nbatches)
+#The embeddings and the Adam slots grow with the new ids and keep their trained values.
+print("%d new triples" % (con.append_triples(new[:, 0], new[:, 1], new[:, 2])))
+con.set_train_times(50)
+con.run()
+con.export_variables(model_path + ".continual")
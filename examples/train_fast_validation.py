@@ -0,0 +1,33 @@
+#coding:utf-8
+#Train TransE and follow its learning curve with sampled filtered validation every 10 epochs,
+#then evaluate the full test set in batches of 64 unique queries.
+#Run from the repository root after "bash make.sh":
+#	python -m examples.train_fast_validation ./benchmarks/FB15K237/
+import sys
+import config
+import models
+
+con = config.Config()
+con.set_in_path(sys.argv[1] if len(sys.argv) > 1 else "./benchmarks/FB15K237/")
+con.set_test_link_prediction(True)
+con.set_test_batch_size(64)
+con.set_work_threads(4)
+con.set_seed(1)
+con.set_train_times(200)
+con.set_nbatches(100)
+con.set_alpha(0.001)
+con.set_margin(1.0)
+con.set_bern(1)
+con.set_dimension(100)
+con.set_ent_neg_rate(1)
+con.set_rel_neg_rate(0)
+con.set_opt_method("Adam")
+#1000 validation triples drawn by relation, ranked against all entities every 10 epochs,
+#with 95% bootstrap intervals; set candidates to rank against a sampled entity set instead.
+con.set_fast_validation(size = 1000, candidates = 0, epochs = 10)
+con.init()
+con.set_model(models.TransE)
+con.run()
+for epoch, res in con.valid_history:
+	print("epoch %4d  MRR %.4f [%.4f, %.4f]  hit@10 %.4f [%.4f, %.4f]" % ((epoch,) + res["MRR"] + res["hit@10"]))
+con.test()
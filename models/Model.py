@@ -55,6 +55,11 @@ class Model(object):
 		self.predict_h = tf.placeholder(tf.int64, [None])
 		self.predict_t = tf.placeholder(tf.int64, [None])
 		self.predict_r = tf.placeholder(tf.int64, [None])
+		self.rank_h = tf.placeholder(tf.int64, [None])
+		self.rank_t = tf.placeholder(tf.int64, [None])
+		self.rank_r = tf.placeholder(tf.int64, [None])
+		self.rank_candidates = tf.placeholder(tf.int64, [None])
+		self.rank_scores = {}
 		self.parameter_lists = []
 
 	def embedding_def(self):
@@ -66,6 +71,55 @@ class Model(object):
 	def predict_def(self):
 		pass
 
+	def score_candidates(self, candidates, side, truth = False):
+		r'''
+		scores of the candidate entity ids as the head (side 0) or the tail
+		(side 1) of each query (rank_h, rank_t, rank_r), one row per query;
+		with truth the first column scores the query's own entity
+		'''
+		query = tf.shape(self.rank_r)[0]
+		every = tf.tile(tf.expand_dims(candidates, 0), [query, 1])
+		if truth:
+			every = tf.concat([tf.expand_dims([self.rank_h, self.rank_t][side], 1), every], 1)
+		count = tf.shape(every)[1]
+		every = tf.reshape(every, [-1])
+		repeat = lambda ids: tf.reshape(tf.tile(tf.expand_dims(ids, 1), [1, count]), [-1])
+		saved = [self.predict_h, self.predict_t, self.predict_r, self.predict]
+		if side == 0:
+			self.predict_h, self.predict_t = every, repeat(self.rank_t)
+		else:
+			self.predict_h, self.predict_t = repeat(self.rank_h), every
+		self.predict_r = repeat(self.rank_r)
+		self.predict_def()
+		scores = tf.reshape(self.predict, [-1, count])
+		self.predict_h, self.predict_t, self.predict_r, self.predict = saved
+		return scores
+
+	def rank_def(self, sampled = False):
+		r'''
+		head and tail scores of a batch of queries: row i of the head scores
+		rates (e, rank_t[i], rank_r[i]) and row i of the tail scores
+		(rank_h[i], e, rank_r[i]) for all entities e, or, when sampled, for the
+		true entity followed by the entities of rank_candidates. The candidate
+		ids are built in the graph and scored by predict_def.
+		'''
+		if sampled:
+			candidates = self.rank_candidates
+		else:
+			candidates = tf.range(self.config.entTotal, dtype = tf.int64)
+		return [self.score_candidates(candidates, 0, sampled), self.score_candidates(candidates, 1, sampled)]
+
+	def get_rank_scores(self, sampled = False):
+		r'''
+		the [head, tail] scores of rank_def, added to the graph on first use;
+		they tile every query over all candidates, so models that are never
+		ranked in batches do not build them
+		'''
+		if sampled not in self.rank_scores:
+			with tf.name_scope("rank"):
+				self.rank_scores[sampled] = self.rank_def(sampled)
+		return self.rank_scores[sampled]
+
 	def __init__(self, config):
 		self.config = config
 